@@ -0,0 +1,142 @@
+"""
+asyncio interface to the data registry.
+
+Loading an artifact reads files and deserializes them, which would block the event
+loop of an asyncio service for the whole duration of the load. AsyncAutoData runs
+every registry operation of AutoData in an executor, so a slow load only occupies a
+worker thread while other requests keep being served. The number of concurrent
+operations is bounded, further calls wait for a free slot without blocking the loop.
+
+Usage:
+    data = AsyncAutoData(root, max_concurrency=16)
+    features = await data.get_data_from_registry("features", branch="small")
+
+Tracked coroutine functions (async def decorated with versioned_auto_save) save
+their outputs off the loop as well, see versioned_auto_save.
+"""
+
+import asyncio
+from concurrent.futures import Executor
+import contextvars
+import functools
+from pathlib import Path
+from typing import Callable
+import weakref
+
+import numpy as np
+
+from auto_track.auto_data import AutoData
+
+
+class AsyncAutoData(object):
+    """
+    Args:
+        root: Root directory of the data registry (local cache root with storage)
+        storage: Storage backend of a remote registry, see auto_track.storage
+        shared_cache: Host wide shared memory cache, see auto_track.shm_cache
+        max_concurrency: Maximum number of registry operations running at once
+        executor: Thread pool the operations run in, defaults to the default
+            executor of the event loop
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        storage=None,
+        shared_cache=None,
+        max_concurrency: int = 8,
+        executor: Executor | None = None,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be positive, got {max_concurrency}")
+        self.data = AutoData(root, storage=storage, shared_cache=shared_cache)
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        # semaphores are bound to the event loop they are used in
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    async def get_data_from_registry(
+        self,
+        dataset: str,
+        branch: str = "main",
+        version: str = "latest",
+        outputs: list[str | int] | str | int | None = None,
+        rows: slice | list[int] | np.ndarray | None = None,
+        columns: list[str] | None = None,
+        keys: list[str | int] | None = None,
+        lazy: bool = False,
+    ):
+        """
+        Loads outputs of a tracked function, see AutoData.get_data_from_registry.
+        """
+        return await self._run(
+            self.data.get_data_from_registry,
+            dataset,
+            branch,
+            version,
+            outputs=outputs,
+            rows=rows,
+            columns=columns,
+            keys=keys,
+            lazy=lazy,
+        )
+
+    async def get_version_path(
+        self, dataset: str, branch: str = "main", version: str = "latest"
+    ) -> Path:
+        """
+        Resolves a version to its local directory, see AutoData.get_version_path.
+        """
+        return await self._run(self.data.get_version_path, dataset, branch, version)
+
+    async def get_bulk_from_registry(
+        self,
+        dataset: str,
+        branches: list[str] | list[tuple[str, str]] | None = None,
+        version: str = "latest",
+        config_filter: dict | Callable[[dict], bool] | None = None,
+        output: str | int | None = None,
+        max_workers: int = 8,
+    ):
+        """
+        Loads one output of many branches, see AutoData.get_bulk_from_registry.
+        The bulk load takes a single slot of max_concurrency.
+        """
+        return await self._run(
+            self.data.get_bulk_from_registry,
+            dataset,
+            branches=branches,
+            version=version,
+            config_filter=config_filter,
+            output=output,
+            max_workers=max_workers,
+        )
+
+    async def list_branches(self, dataset: str) -> list[str]:
+        """
+        Branches of a dataset in alphabetical order, see AutoData.list_branches.
+        """
+        return await self._run(self.data.list_branches, dataset)
+
+    async def list_versions(self, dataset: str, branch: str = "main") -> list[str]:
+        """
+        Versions of a branch oldest first, see AutoData.list_versions.
+        """
+        return await self._run(self.data.list_versions, dataset, branch)
+
+    async def _run(self, func: callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop, None)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+
+        await semaphore.acquire()
+        # the context carries the lineage of an enclosing tracked call
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(
+            self.executor, functools.partial(context.run, func, *args, **kwargs)
+        )
+        # the slot is freed when the operation finished, not when the awaiting task
+        # is cancelled, since the executor cannot interrupt a running load
+        future.add_done_callback(lambda _: semaphore.release())
+        return await asyncio.shield(future)
@@ -1,45 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+import itertools
 from pathlib import Path
+from typing import Callable
 
+from loguru import logger
 import pandas as pd
 import numpy as np
-import torch
 import json
 
+from auto_track.fingerprint import flatten_config
+from auto_track.chunks import ChunkStore
+from auto_track.helpers import (
+    CHUNKS_SUFFIX,
+    PARTS_SUFFIX,
+    SPARSE_COMPONENTS,
+    SPARSE_SUFFIX,
+    _row_indices,
+    _torch_index,
+    loads_json,
+    read_manifest,
+    version_key,
+)
+from auto_track.index import RegistryIndex, index_path
+from auto_track.instrumentation import artifact_stats, span
+from auto_track.lineage import record_read
+
 
 class AutoData:
-    def __init__(self, root: Path):
-        self.root = root
+    def __init__(self, root: Path, storage=None, shared_cache=None):
+        """
+        Args:
+            root: Root directory of the data registry. If a storage backend is
+                given, it is used as local read-through cache of the remote registry.
+            storage: Storage backend of a remote registry, see auto_track.storage
+            shared_cache: Host wide shared memory cache arrays and tensors are loaded
+                through, see auto_track.shm_cache. Arrays loaded through it are
+                read-only.
+        """
+        self.root = Path(root)
+        self.storage = storage
+        self.shared_cache = shared_cache
+        self.index = RegistryIndex(self.root)
 
     def get_data_from_registry(
-        self, dataset: str, branch: str = "main", version: str = "latest"
+        self,
+        dataset: str,
+        branch: str = "main",
+        version: str = "latest",
+        outputs: list[str | int] | str | int | None = None,
+        rows: slice | list[int] | np.ndarray | None = None,
+        columns: list[str] | None = None,
+        keys: list[str | int] | None = None,
+        lazy: bool = False,
     ):
         """
         Searches for outputs of a tracked function in the data registry and returns the data.
 
+        Subsets can be selected at load time, in which case only the selected parts
+        are read: rows of arrays are read from a memory map, rows and columns of
+        tables are skipped while parsing and unselected outputs and dictionary keys
+        are not opened at all. JSON outputs are always parsed completely.
+
         Args:
             dataset: Name of the dataset
             branch: Branch of the dataset
             version: Version of the dataset
+            outputs: Names or positions of the outputs to load, defaults to all
+            rows: Slice or indices of the rows of arrays, tensors, tables and lists
+            columns: Columns of tables to load
+            keys: Keys of dictionary outputs or indices of list outputs stored as
+                one file per item to load
+            lazy: Return read-only memory mapped arrays and sparse matrices and
+                AnnData objects backed by their file instead of reading them into
+                memory
         """
-        if not self.root.exists():
-            raise FileNotFoundError(f"Root not found at {self.root}")
+        with span("load.registry", func=dataset, branch=branch) as s:
+            data_path = self.get_version_path(dataset, branch, version)
+            s.set(version=data_path.name)
 
-        if not (self.root / dataset).exists():
-            raise FileNotFoundError(f"Dataset not found at {self.root / dataset}")
+            paths = output_paths(data_path)
+            if outputs is not None:
+                selected = outputs if isinstance(outputs, list) else [outputs]
+                paths = [self._select_output(data_path, o) for o in selected]
 
-        if not (self.root / dataset / branch).exists():
-            raise FileNotFoundError(
-                f"Branch not found at {self.root / dataset / branch}. Consider using one of {[(self.root / dataset).iterdir()]} as branch."
+            outputs = tuple(
+                self._load_path(p, rows=rows, columns=columns, keys=keys, lazy=lazy)
+                for p in paths
             )
 
-        available_versions = list((self.root / dataset / branch).iterdir())
+            if len(outputs) == 1:
+                # retruning single files
+                return outputs[0]
+            else:
+                return outputs
+
+    def get_version_path(
+        self, dataset: str, branch: str = "main", version: str = "latest"
+    ) -> Path:
+        """
+        Resolves a version of a dataset to its local directory. With a storage backend
+        the version is resolved in the remote registry and fetched into the local
+        cache root unless it is already cached.
+
+        Args:
+            dataset: Name of the dataset
+            branch: Branch of the dataset
+            version: Version of the dataset, "latest" or a pattern like "1.*.*"
 
+        Returns:
+            Path of the version directory
+        """
+        # versions are resolved from the index, only unindexed branches are listed
+        available_versions = self._list_versions(dataset, {branch}).get(branch, [])
         if not available_versions:
+            if self.storage is None:
+                self._check_branch_exists(dataset, branch)
             raise FileNotFoundError(
                 f"No versions found for dataset {dataset} on branch {branch}"
             )
 
-        version = self._resolve_version(version, available_versions)
+        with span("load.resolve_version", requested=version):
+            version = self._resolve_version(version, available_versions)
+
+        if self.storage is not None:
+            from auto_track.storage import fetch_version
+
+            record_read(self.root, dataset, branch, version)
+            return fetch_version(self.storage, self.root, dataset, branch, version)
 
         data_path = self.root / dataset / branch / version
 
@@ -47,31 +134,257 @@ class AutoData:
             raise FileNotFoundError(
                 f"Data not found at {data_path}, make sure your root and branch are correct."
             )
+        record_read(self.root, dataset, branch, version)
+        return data_path
 
-        outputs = self._load_from_tuple(data_path)
+    def list_branches(self, dataset: str) -> list[str]:
+        """
+        Branches of a dataset in alphabetical order.
+        """
+        return sorted(self._list_branches(dataset))
 
-        if len(outputs) == 1:
-            # retruning single files
-            return outputs[0]
-        else:
-            return outputs
+    def list_versions(self, dataset: str, branch: str = "main") -> list[str]:
+        """
+        Versions of a branch, oldest first.
+        """
+        versions = self._list_versions(dataset, {branch})
+        return sorted(versions.get(branch, []), key=version_key)
+
+    def get_bulk_from_registry(
+        self,
+        dataset: str,
+        branches: list[str] | list[tuple[str, str]] | None = None,
+        version: str = "latest",
+        config_filter: dict | Callable[[dict], bool] | None = None,
+        output: str | int | None = None,
+        max_workers: int = 8,
+    ):
+        """
+        Loads one output of many branches at once, e.g. of a parameter sweep.
+
+        Versions are listed once from the index journal (or the branch directories if
+        there is no index) and loaded concurrently. Array and tensor outputs of the
+        same shape and dtype are copied into a preallocated stacked result, tabular
+        outputs into preallocated columns of one DataFrame.
+
+        Args:
+            dataset: Name of the dataset
+            branches: Branch names, or (branch, version) pairs, to load. Defaults to
+                all branches of the dataset.
+            version: Version to load of each branch, "latest" or a pattern like
+                "1.*.*", ignored for (branch, version) pairs
+            config_filter: Only load branches whose config matches. Either a
+                dictionary of (dotted) config keys and values, or a function
+                receiving the config and returning whether to load the branch.
+            output: Name or position of the output to load, required if versions
+                have multiple outputs
+            max_workers: Number of threads loading versions
+
+        Returns:
+            For arrays and tensors a tuple of (stacked outputs, index), where row i of
+            the index DataFrame holds branch, version and config of stacked[i]. For
+            DataFrames and Series a single DataFrame with additional branch, version
+            and config columns.
+        """
+        with span("load.bulk", func=dataset) as s:
+            configs = self._branch_configs(dataset)
+
+            if branches is None:
+                branches = self._list_branches(dataset)
+            pairs = [b if isinstance(b, tuple) else (b, version) for b in branches]
+
+            if config_filter is not None:
+                pairs = [
+                    (b, v)
+                    for b, v in pairs
+                    if _matches(configs.get(b, {}), config_filter)
+                ]
+            if not pairs:
+                raise FileNotFoundError(f"No branches of {dataset} match the query")
+
+            available = self._list_versions(dataset, {b for b, _ in pairs})
+            keys = []
+            for branch, requested in pairs:
+                if not available.get(branch, None):
+                    raise FileNotFoundError(
+                        f"No versions found for dataset {dataset} on branch {branch}"
+                    )
+                keys.append(
+                    (branch, self._resolve_version(requested, available[branch]))
+                )
+                record_read(self.root, dataset, *keys[-1])
+
+            if self.storage is not None:
+                from auto_track.storage import fetch_version
+
+                with ThreadPoolExecutor(max_workers) as pool:
+                    list(
+                        pool.map(
+                            lambda k: fetch_version(
+                                self.storage, self.root, dataset, *k
+                            ),
+                            keys,
+                        )
+                    )
+
+            paths = [
+                self._select_output(self.root / dataset / b / v, output)
+                for b, v in keys
+            ]
+            index = pd.DataFrame(
+                {
+                    "branch": [b for b, _ in keys],
+                    "version": [v for _, v in keys],
+                    **_config_columns([configs.get(b, {}) for b, _ in keys]),
+                }
+            )
+            s.set(branches=len(keys))
+
+            suffixes = {p.suffix for p in paths}
+            if suffixes == {".npy"}:
+                return _stack_arrays(paths, max_workers), index
+            elif suffixes == {".pt"}:
+                return _stack_tensors(paths, max_workers), index
+            elif suffixes == {".csv"}:
+                return _concat_frames(paths, index, max_workers)
+            raise ValueError(
+                f"Bulk loading requires array, tensor or tabular outputs of the same "
+                f"type, got {sorted(suffixes)}"
+            )
+
+    def _list_branches(self, dataset: str) -> list[str]:
+        if self.storage is not None:
+            return self.storage.list_dirs(f"{dataset}/")
+        if not (self.root / dataset).is_dir():
+            raise FileNotFoundError(f"Dataset not found at {self.root / dataset}")
+        return sorted(
+            p.name
+            for p in (self.root / dataset).iterdir()
+            if p.is_dir() and not p.name.startswith(".")
+        )
+
+    def _check_branch_exists(self, dataset: str, branch: str) -> None:
+        if not self.root.exists():
+            raise FileNotFoundError(f"Root not found at {self.root}")
+
+        if not (self.root / dataset).exists():
+            raise FileNotFoundError(f"Dataset not found at {self.root / dataset}")
+
+        if not (self.root / dataset / branch).exists():
+            raise FileNotFoundError(
+                f"Branch not found at {self.root / dataset / branch}. Consider using one of {[(self.root / dataset).iterdir()]} as branch."
+            )
+
+    def _list_versions(self, dataset: str, branches: set[str]) -> dict[str, list[str]]:
+        """
+        Versions of the branches of a dataset from the in-memory index, which is
+        updated incrementally from the index journal if one exists. Branches
+        without indexed versions, e.g. written before the journal existed, are
+        listed from their directory.
+        """
+        if self.storage is not None:
+            return {b: self.storage.list_dirs(f"{dataset}/{b}/") for b in branches}
+
+        versions = {}
+        if index_path(self.root).is_file():
+            # only the records appended since the last listing are read
+            self.index.refresh()
+            for ds, branch, version in list(self.index.versions):
+                if ds == dataset and branch in branches:
+                    versions.setdefault(branch, []).append(version)
+
+        for b in branches - versions.keys():
+            branch_path = self.root / dataset / b
+            if not branch_path.is_dir():
+                continue
+            versions[b] = [
+                p.name
+                for p in branch_path.iterdir()
+                if p.is_dir() and not p.name.startswith(".")
+            ]
+            if versions[b] and index_path(self.root).is_file():
+                logger.warning(
+                    f"Versions of {dataset}/{b} are missing in the registry index, "
+                    "run `auto-track reindex` to add them."
+                )
+        return versions
+
+    def _branch_configs(self, dataset: str) -> dict[str, dict]:
+        """
+        Readable configs of the branches of a dataset from data_branches.json. Only
+        the configs of the functions writing the dataset are used, since functions
+        may use the same branch names.
+        """
+        db_path = self.root / ".auto-track" / "data_branches.json"
+        if self.storage is not None or not db_path.is_file():
+            return {}
+        with open(db_path, "r") as f:
+            lookup = json.load(f)
+
+        configs = {}
+        for func_name in self._dataset_functions(dataset):
+            for entry in lookup.get(func_name, {}).values():
+                if (
+                    isinstance(entry, dict)
+                    and (self.root / dataset / entry["branch"]).is_dir()
+                ):
+                    configs[entry["branch"]] = entry["config"]
+        return configs
+
+    def _dataset_functions(self, dataset: str) -> set[str]:
+        """
+        Names of the functions that wrote versions of a dataset, from the index or
+        the version manifests. Defaults to the name of the dataset.
+        """
+        functions = set()
+        if index_path(self.root).is_file():
+            self.index.refresh()
+            functions = {
+                record.get("function", None)
+                for key, record in list(self.index.versions.items())
+                if key[0] == dataset
+            }
+        if not functions - {None}:
+            for branch in self._list_branches(dataset):
+                for version_path in (self.root / dataset / branch).iterdir():
+                    manifest = read_manifest(version_path)
+                    if manifest is not None:
+                        functions.add(manifest.get("function", None))
+                        break
+        functions.discard(None)
+        return functions or {dataset}
+
+    def _select_output(self, data_path: Path, output: str | int | None) -> Path:
+        paths = output_paths(data_path)
+        if output is None:
+            if len(paths) != 1:
+                raise ValueError(
+                    f"{data_path} has {len(paths)} outputs, select one with output"
+                )
+            return paths[0]
+        if isinstance(output, int):
+            return paths[output]
+        for p in paths:
+            if _output_name(p) == output:
+                return p
+        raise FileNotFoundError(f"Output {output} not found in {data_path}")
 
     def _resolve_version(self, version: str, available_versions: list[str]) -> str:
         if version == "latest":
-            return sorted(available_versions)[-1]
+            return max(available_versions, key=version_key)
 
         if "*" in version:
             major, minor, patch = version.split(".")
             version_tree = self._build_version_tree(available_versions)
 
             if major == "*":
-                major = sorted(version_tree.keys())[-1]
+                major = max(version_tree.keys(), key=int)
 
             if minor == "*":
-                minor = sorted(version_tree[major].keys())[-1]
+                minor = max(version_tree[major].keys(), key=int)
 
             if patch == "*":
-                patch = sorted(version_tree[major][minor])[-1]
+                patch = max(version_tree[major][minor], key=int)
 
             if minor not in version_tree[major]:
                 raise FileNotFoundError(
@@ -110,54 +423,432 @@ class AutoData:
         Args:
             data_path: Path to the data files
         """
-        output = []
-        for p in data_path.iterdir():
-            if p.is_dir():
-                output.append(self._load_iterable_types(p))
-            else:
-                output.append(self._load_object(p))
-        return tuple(output)
+        return tuple(self._load_path(p) for p in output_paths(data_path))
 
-    def _load_object(self, path: Path):
+    def _load_path(self, path: Path, rows=None, columns=None, keys=None, lazy=False):
+        if path.suffix == PARTS_SUFFIX:
+            return self._load_parts(path, rows=rows, columns=columns)
+        if path.suffix == SPARSE_SUFFIX:
+            return self._load_object(path, rows=rows, lazy=lazy)
+        if path.is_dir():
+            return self._load_iterable_types(
+                path, rows=rows, columns=columns, keys=keys, lazy=lazy
+            )
+        return self._load_object(path, rows=rows, columns=columns, lazy=lazy)
+
+    def _load_object(self, path: Path, rows=None, columns=None, lazy=False):
         """
         Loads python objects from a predefined path
 
         Args:
             path: Path to load the object from
+            rows: Slice or indices of the rows to load
+            columns: Columns of tables to load
+            lazy: Memory map arrays and sparse matrices and open AnnData objects
+                backed, see get_data_from_registry
         """
-        suffix = path.suffix
-        if suffix == ".json":
-            with open(path, "r") as f:
-                json_obj = json.load(f)
-            return json_obj
-        elif suffix == ".npy":
-            return np.load(path)
-        elif suffix == ".csv":
-            return pd.read_csv(path)
-        elif suffix == ".pt":
-            return torch.load(path)
-        else:
+        with span("load.object", path=path) as s:
+            suffix = path.suffix
+            if suffix == ".json":
+                with open(path, "rb") as f:
+                    obj = loads_json(f.read())
+                if rows is not None:
+                    obj = _take(obj, rows)
+            elif suffix == ".jsonl":
+                obj = _read_json_lines(path, rows)
+            elif suffix in (".npy", ".pt") and self.shared_cache is not None:
+                obj = self.shared_cache.load(path, _manifest_checksum(path))
+                if rows is not None:
+                    obj = obj[rows if suffix == ".npy" else _torch_index(rows)]
+            elif suffix == ".npy" and lazy:
+                obj = np.load(path, mmap_mode="r")
+                if rows is not None:
+                    obj = obj[rows]
+            elif suffix == ".npy":
+                if rows is None:
+                    obj = np.load(path)
+                else:
+                    # the memory map only reads the pages holding the selected rows
+                    obj = np.array(np.load(path, mmap_mode="r")[rows])
+            elif suffix == ".csv":
+                obj = _read_csv(path, rows, columns)
+            elif suffix == ".pt":
+                import torch
+
+                if rows is None:
+                    obj = torch.load(path)
+                else:
+                    obj = torch.load(path, mmap=True)[_torch_index(rows)].clone()
+            elif suffix == CHUNKS_SUFFIX:
+                # chunks are separate files, so chunked arrays are never memory mapped
+                obj = ChunkStore(self.root).load(path, rows)
+            elif suffix == SPARSE_SUFFIX:
+                obj = _load_sparse(path, rows, lazy)
+            elif suffix == ".h5ad":
+                import anndata
+
+                if rows is None and not lazy:
+                    obj = anndata.read_h5ad(path)
+                else:
+                    obj = anndata.read_h5ad(path, backed="r")
+                    if rows is not None:
+                        # a backed view reads only the selected observations
+                        obj = obj[rows].to_memory()
+            else:
+                raise ValueError(f"Unsupported file type: {suffix}")
+
+            if s:
+                partial = rows is not None or columns is not None
+                size = getattr(obj, "nbytes", None) if partial else None
+                if size is None and path.is_dir():
+                    files, size = artifact_stats(path)
+                    s.set(files=files, bytes_read=size)
+                else:
+                    s.set(files=1, bytes_read=size or path.stat().st_size)
+            return obj
+
+    def _load_parts(self, path: Path, rows=None, columns=None):
+        """
+        Loads the concatenation of the parts of an appendable output.
+
+        Array parts are copied into a preallocated result, with a row selection only
+        the parts holding selected rows are read.
+
+        Args:
+            path: Path to the parts directory
+            rows: Slice or indices of the rows to load
+            columns: Columns of tables to load
+        """
+        parts = sorted(p for p in path.iterdir() if p.name.startswith("part_"))
+        if not parts:
+            raise FileNotFoundError(f"No parts found at {path}")
+
+        with span("load.parts", path=path, parts=len(parts)):
+            suffix = parts[0].suffix
+            if suffix == ".npy":
+                return _gather_rows(
+                    [np.load(p, mmap_mode="r") for p in parts], rows, np.empty
+                )
+            elif suffix == ".pt":
+                import torch
+
+                return _gather_rows(
+                    [torch.load(p, mmap=True) for p in parts],
+                    rows,
+                    lambda shape, dtype: torch.empty(shape, dtype=dtype),
+                )
+            elif suffix == ".csv":
+                frame = pd.concat(
+                    [pd.read_csv(p, usecols=columns) for p in parts],
+                    ignore_index=True,
+                )
+                if rows is None:
+                    return frame
+                return frame.iloc[_row_indices(rows, len(frame))].reset_index(drop=True)
+            elif suffix == ".jsonl":
+                records = []
+                for p in parts:
+                    records.extend(_read_json_lines(p))
+                return records if rows is None else _take(records, rows)
             raise ValueError(f"Unsupported file type: {suffix}")
 
-    def _load_iterable_types(self, path: Path):
+    def _load_iterable_types(
+        self, path: Path, rows=None, columns=None, keys=None, lazy=False
+    ):
         """
         Loads a iterable from a predefined path and checks for types contained in the dictionary.
 
         Args:
             path: Path to load the dictionary from
+            rows: Slice or indices of the rows to load of every value
+            columns: Columns of tables to load
+            keys: Keys or list indices of the values to load
+            lazy: Memory map arrays, see get_data_from_registry
         """
-        files = list(path.iterdir())
+        files = [p for p in path.iterdir() if not p.name.startswith(".")]
 
         if files[0].name.startswith("item_"):
-            outputs = []
-            for p in files:
-                outputs.append(self._load_object(p))
-            named_outputs = zip(outputs, [p.stem.split("_")[1] for p in files])
-            sorted_outputs = sorted(named_outputs, key=lambda x: int(x[1]))
-            return [x[0] for x in sorted_outputs]
+            files.sort(key=lambda p: int(p.stem.split("_")[1]))
+            if keys is not None:
+                files = [files[int(k)] for k in keys]
+            return [
+                self._load_object(p, rows=rows, columns=columns, lazy=lazy)
+                for p in files
+            ]
         else:
-            outputs = {}
-            for p in files:
-                key = p.stem.split("_")[0]
-                outputs[key] = self._load_object(p)
-            return outputs
+            if keys is not None:
+                by_key = {p.stem: p for p in files}
+                missing = [k for k in keys if str(k) not in by_key]
+                if missing:
+                    raise KeyError(f"Keys {missing} not found in {path}")
+                files = [by_key[str(k)] for k in keys]
+            return {
+                p.stem: self._load_object(p, rows=rows, columns=columns, lazy=lazy)
+                for p in files
+            }
+
+
+def _output_name(path: Path) -> str:
+    """
+    Name of the output stored at path, i.e. the file name without suffix.
+    """
+    if path.is_file() or path.suffix in (PARTS_SUFFIX, SPARSE_SUFFIX):
+        return path.stem
+    return path.name
+
+
+def output_paths(data_path: Path) -> list[Path]:
+    """
+    Paths of the outputs stored in a version directory in the order in which the
+    tracked function returned them.
+    """
+    paths = [p for p in sorted(data_path.iterdir()) if not p.name.startswith(".")]
+
+    manifest = read_manifest(data_path)
+    if manifest is not None:
+        # restore the order in which the outputs were returned
+        order = {name: i for i, name in enumerate(manifest["outputs"])}
+        paths.sort(key=lambda p: order.get(_output_name(p), len(order)))
+    return paths
+
+
+def _manifest_checksum(path: Path) -> str | None:
+    """
+    Checksum of a stored file from the manifest of its version, None if unknown.
+    """
+    for version_path in list(path.parents)[:3]:
+        manifest = read_manifest(version_path)
+        if manifest is not None:
+            entry = manifest.get("files", {}).get(
+                path.relative_to(version_path).as_posix(), None
+            )
+            return None if entry is None else entry["checksum"]
+    return None
+
+
+def _gather_rows(chunks: list, rows, empty):
+    """
+    Copies the selected rows of memory mapped chunks into one preallocated result,
+    reading only chunks that hold selected rows.
+
+    Args:
+        chunks: Arrays or tensors with equal trailing dimensions
+        rows: Slice or indices of the rows of the concatenation, None for all rows
+        empty: Function allocating the result from shape and dtype
+    """
+    lengths = [len(c) for c in chunks]
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    shape, dtype = tuple(chunks[0].shape[1:]), chunks[0].dtype
+
+    if rows is None:
+        result = empty((int(offsets[-1]), *shape), dtype)
+        for chunk, start, stop in zip(chunks, offsets[:-1], offsets[1:]):
+            result[start:stop] = chunk
+        return result
+
+    indices = _row_indices(rows, int(offsets[-1]))
+    if indices.size and (indices.min() < 0 or indices.max() >= offsets[-1]):
+        raise IndexError(f"Row indices out of range for {offsets[-1]} rows")
+    result = empty((len(indices), *shape), dtype)
+    for chunk, start, stop in zip(chunks, offsets[:-1], offsets[1:]):
+        selected = np.nonzero((indices >= start) & (indices < stop))[0]
+        if selected.size:
+            local = indices[selected] - start
+            if isinstance(chunk, np.ndarray):
+                result[selected] = chunk[local]
+            else:
+                result[_torch_index(selected)] = chunk[_torch_index(local)]
+    return result
+
+
+def _load_sparse(path: Path, rows=None, lazy: bool = False):
+    """
+    Loads a sparse matrix stored by save_sparse. The component arrays are memory
+    mapped, so selecting a slice of rows of a CSR matrix only reads the data of the
+    selected rows.
+
+    Args:
+        path: Path of the .sparse directory
+        rows: Slice or indices of the rows to load
+        lazy: Return a matrix backed by the read-only memory maps
+    """
+    import scipy.sparse
+
+    with open(path / "format.json", "r") as f:
+        meta = json.load(f)
+    fmt, shape = meta["format"], tuple(meta["shape"])
+    mmap_mode = "r" if lazy or rows is not None else None
+    data, first, second = (
+        np.load(path / f"{name}.npy", mmap_mode=mmap_mode)
+        for name in SPARSE_COMPONENTS[fmt]
+    )
+    kind = "matrix" if meta["matrix"] else "array"
+    cls = getattr(scipy.sparse, f"{fmt}_{kind}")
+
+    if rows is None:
+        if fmt == "coo":
+            return cls((data, (first, second)), shape=shape, copy=False)
+        return cls((data, first, second), shape=shape, copy=False)
+
+    if fmt == "csr" and isinstance(rows, slice) and rows.step in (None, 1):
+        start, stop, _ = rows.indices(shape[0])
+        stop = max(start, stop)
+        indptr = np.array(second[start : stop + 1])
+        begin, end = indptr[0], indptr[-1]
+        return cls(
+            (np.array(data[begin:end]), np.array(first[begin:end]), indptr - begin),
+            shape=(stop - start, shape[1]),
+        )
+
+    if fmt == "coo":
+        matrix = cls((data, (first, second)), shape=shape).tocsr()
+    else:
+        matrix = cls((data, first, second), shape=shape, copy=False)
+    selected = matrix.tocsr()[_row_indices(rows, shape[0])]
+    return selected.asformat(fmt)
+
+
+def _read_json_lines(path: Path, rows=None) -> list:
+    """
+    Parses a JSON lines file record by record. Reading stops after the last record
+    of a slice with non negative bounds.
+    """
+    with open(path, "rb") as f:
+        lines = (line for line in f if line.strip())
+        if rows is None:
+            return [loads_json(line) for line in lines]
+        if isinstance(rows, slice) and all(
+            v is None or v >= 0 for v in (rows.start, rows.stop, rows.step)
+        ):
+            selected = itertools.islice(lines, rows.start, rows.stop, rows.step)
+            return [loads_json(line) for line in selected]
+        return _take([loads_json(line) for line in lines], rows)
+
+
+def _take(values: list, rows):
+    if isinstance(rows, slice):
+        return values[rows]
+    return [values[i] for i in rows]
+
+
+def _read_csv(path: Path, rows=None, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Reads the selected rows and columns of a csv file, skipping all other rows
+    while parsing.
+    """
+    if rows is None:
+        return pd.read_csv(path, usecols=columns)
+
+    if isinstance(rows, slice) and (rows.step or 1) == 1 and (rows.start or 0) >= 0:
+        start = rows.start or 0
+        if rows.stop is not None and rows.stop >= 0:
+            nrows = max(rows.stop - start, 0)
+            return pd.read_csv(
+                path, usecols=columns, skiprows=range(1, start + 1), nrows=nrows
+            )
+        if rows.stop is None:
+            return pd.read_csv(path, usecols=columns, skiprows=range(1, start + 1))
+
+    if isinstance(rows, slice):
+        # negative bounds or steps need the number of rows
+        with open(path, "rb") as f:
+            n_rows = sum(1 for _ in f) - 1
+        rows = range(n_rows)[rows]
+
+    rows = np.asarray(rows)
+    if rows.size and rows.min() < 0:
+        raise ValueError("Negative row indices are only supported in slices")
+    wanted = set(rows.tolist())
+    frame = pd.read_csv(
+        path, usecols=columns, skiprows=lambda i: i > 0 and (i - 1) not in wanted
+    )
+    # restore the requested order (and duplicates) of the rows
+    positions = np.searchsorted(np.unique(rows), rows)
+    return frame.iloc[positions].reset_index(drop=True)
+
+
+def _matches(config: dict, config_filter: dict | Callable[[dict], bool]) -> bool:
+    if callable(config_filter):
+        return bool(config_filter(config))
+    flat = flatten_config(config)
+    return all(flat.get(key, None) == value for key, value in config_filter.items())
+
+
+def _config_columns(configs: list[dict]) -> dict[str, list]:
+    flat = [flatten_config(c) if c else {} for c in configs]
+    keys = sorted({key for f in flat for key in f})
+    return {f"config.{key}": [f.get(key, None) for f in flat] for key in keys}
+
+
+def _stack_arrays(paths: list[Path], max_workers: int) -> np.ndarray:
+    """
+    Copies same shaped arrays into one preallocated array of shape (n, *shape).
+    """
+    headers = [np.load(p, mmap_mode="r") for p in paths]
+    shapes = {(a.shape, a.dtype) for a in headers}
+    if len(shapes) != 1:
+        raise ValueError(f"Arrays can not be stacked, found {shapes}")
+    shape, dtype = shapes.pop()
+
+    stacked = np.empty((len(paths), *shape), dtype=dtype)
+
+    def load(i):
+        stacked[i] = headers[i]
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        list(pool.map(load, range(len(paths))))
+    return stacked
+
+
+def _stack_tensors(paths: list[Path], max_workers: int):
+    import torch
+
+    tensors = [torch.load(p, mmap=True) for p in paths]
+    shapes = {(tuple(t.shape), t.dtype) for t in tensors}
+    if len(shapes) != 1:
+        raise ValueError(f"Tensors can not be stacked, found {shapes}")
+    shape, dtype = shapes.pop()
+
+    stacked = torch.empty((len(paths), *shape), dtype=dtype)
+
+    def load(i):
+        stacked[i].copy_(tensors[i])
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        list(pool.map(load, range(len(paths))))
+    return stacked
+
+
+def _concat_frames(
+    paths: list[Path], index: pd.DataFrame, max_workers: int
+) -> pd.DataFrame:
+    """
+    Reads frames concurrently and copies them into preallocated columns, prefixed
+    by the branch, version and config columns of index.
+    """
+    with ThreadPoolExecutor(max_workers) as pool:
+        frames = list(pool.map(pd.read_csv, paths))
+
+    lengths = np.array([len(f) for f in frames])
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    columns = {}
+    for name in index.columns:
+        columns[name] = np.repeat(index[name].to_numpy(), lengths)
+
+    names = list(dict.fromkeys(c for f in frames for c in f.columns))
+    for name in names:
+        dtypes = [f[name].dtype for f in frames if name in f.columns]
+        missing = any(name not in f.columns for f in frames)
+        if missing or any(d == object for d in dtypes):
+            dtype = np.dtype(object)
+        else:
+            dtype = np.result_type(*dtypes)
+
+        column = np.empty(offsets[-1], dtype=dtype)
+        for i, f in enumerate(frames):
+            values = f[name].to_numpy() if name in f.columns else None
+            column[offsets[i] : offsets[i + 1]] = values
+        columns[name] = column
+
+    return pd.DataFrame(columns)
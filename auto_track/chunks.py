@@ -0,0 +1,339 @@
+"""
+Content addressed chunk store deduplicating large arrays and tensors across versions.
+
+Successive versions of a function often return large outputs that only differ in a
+small part. With chunking enabled (see the chunk_size argument of
+versioned_auto_save), .npy and .pt outputs of at least one chunk are split into
+fixed-size chunks that are stored once in root/.auto-track/chunks, named after their
+checksum. The version directory only keeps a chunk list ({name}.chunks):
+
+    {"suffix": ".npy", "bytes": 400000128, "chunk_size": 4194304,
+     "chunks": ["3f2a...", "9b01...", ...]}
+
+Writing a version only writes the chunks that are not stored yet, and reading rows of
+an array only reads the chunks holding them. Fixed-size chunks are used since
+outputs of successive versions usually keep their shape, so unchanged regions stay
+aligned to the same chunks.
+
+Chunks are shared between versions, so they are only removed by garbage collection
+once no stored version references them, see collect_chunks.
+"""
+
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+import uuid
+
+import numpy as np
+
+from auto_track.helpers import CHUNKS_SUFFIX, _is_tensor, _row_indices, _torch_index
+from auto_track.instrumentation import span
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+# chunks are stored below this directory of the root, also used as their storage key
+CHUNKS_DIRECTORY = ".auto-track/chunks"
+# headers of .npy files are padded to a multiple of 64 bytes and rarely exceed 4KiB
+NPY_HEADER_MAX_BYTES = 64 * 1024
+
+
+class ChunkStore(object):
+    """
+    Args:
+        root: Root directory of the data registry
+        chunk_size: Number of bytes per chunk, artifacts smaller than one chunk are
+            not chunked
+    """
+
+    def __init__(self, root: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        if chunk_size < 4096:
+            raise ValueError(
+                f"chunk_size must be at least 4096 bytes, got {chunk_size}"
+            )
+        self.root = Path(root)
+        self.chunk_size = chunk_size
+        self.directory = self.root / CHUNKS_DIRECTORY
+
+    def chunk_path(self, digest: str) -> Path:
+        return self.root / chunk_key(digest)
+
+    def accepts(self, obj) -> bool:
+        """
+        Whether an object is an array or tensor large enough to be chunked.
+        """
+        if isinstance(obj, np.ndarray):
+            return not obj.dtype.hasobject and obj.nbytes >= self.chunk_size
+        return _is_tensor(obj) and obj.element_size() * obj.nelement() >= (
+            self.chunk_size
+        )
+
+    def save(self, obj, path: Path) -> Path:
+        """
+        Stores an array or tensor as chunks and writes its chunk list.
+
+        Args:
+            obj: Array (stored as .npy) or tensor (stored as .pt)
+            path: Path of the output, the suffix is replaced by .chunks
+
+        Returns:
+            Path of the chunk list
+        """
+        if isinstance(obj, np.ndarray):
+            suffix = ".npy"
+            array = obj
+            if not (array.flags.c_contiguous or array.flags.f_contiguous):
+                array = np.ascontiguousarray(array)
+            header = io.BytesIO()
+            _write_npy_header(header, array)
+            # like np.save, arrays are written in fortran order if only that is
+            # contiguous, which avoids a copy
+            fortran = array.flags.f_contiguous and not array.flags.c_contiguous
+            buffers = [header.getbuffer(), _byte_view(array, "F" if fortran else "C")]
+        else:
+            import torch
+
+            suffix = ".pt"
+            buffer = io.BytesIO()
+            torch.save(obj, buffer)
+            buffers = [buffer.getbuffer()]
+
+        list_path = path.with_suffix(CHUNKS_SUFFIX)
+        list_path.parent.mkdir(parents=True, exist_ok=True)
+        with span("save.chunks", path=list_path) as s:
+            digests, written = self._write_chunks(buffers)
+            size = sum(len(b) for b in buffers)
+            meta = {
+                "suffix": suffix,
+                "bytes": size,
+                "chunk_size": self.chunk_size,
+                "chunks": digests,
+            }
+            tmp_path = list_path.with_name(f".{list_path.name}.{uuid.uuid4().hex}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, list_path)
+            # an earlier run of the same version may have stored the output unchunked
+            path.with_suffix(suffix).unlink(missing_ok=True)
+            s.set(bytes_written=written, files=1, chunks=len(digests))
+        return list_path
+
+    def _write_chunks(self, buffers: list[memoryview]) -> tuple[list[str], int]:
+        """
+        Splits the concatenation of buffers into chunks and writes the missing ones.
+
+        Returns:
+            Tuple of (digests of the chunks, number of written bytes)
+        """
+        digests, written = [], 0
+        for pieces in _split(buffers, self.chunk_size):
+            h = hashlib.blake2b(digest_size=16)
+            for piece in pieces:
+                h.update(piece)
+            digest = h.hexdigest()
+            digests.append(digest)
+
+            chunk_path = self.chunk_path(digest)
+            if chunk_path.is_file():
+                continue
+            chunk_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = chunk_path.with_name(f".{digest}.{uuid.uuid4().hex}.tmp")
+            with open(tmp_path, "wb") as f:
+                for piece in pieces:
+                    f.write(piece)
+            os.replace(tmp_path, chunk_path)
+            written += sum(len(p) for p in pieces)
+        return digests, written
+
+    def load(self, list_path: Path, rows=None):
+        """
+        Reassembles a chunked array or tensor.
+
+        Args:
+            list_path: Path of the chunk list
+            rows: Slice or indices of the rows to load, only the chunks holding
+                them are read for C ordered arrays
+        """
+        with open(list_path, "r") as f:
+            meta = json.load(f)
+        reader = _ChunkReader(self, meta)
+
+        if meta["suffix"] == ".pt":
+            import torch
+
+            tensor = torch.load(io.BytesIO(reader.read(0, meta["bytes"])))
+            return tensor if rows is None else tensor[_torch_index(rows)].clone()
+
+        header = io.BytesIO(reader.read(0, min(meta["bytes"], NPY_HEADER_MAX_BYTES)))
+        major, _ = np.lib.format.read_magic(header)
+        read_header = (
+            np.lib.format.read_array_header_1_0
+            if major == 1
+            else np.lib.format.read_array_header_2_0
+        )
+        shape, fortran_order, dtype = read_header(header)
+        offset = header.tell()
+        order = "F" if fortran_order else "C"
+
+        if rows is None or fortran_order or not shape:
+            array = _from_bytes(reader.read(offset, meta["bytes"]), shape, dtype, order)
+            return array if rows is None else array[rows]
+
+        row_bytes = int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize
+        if isinstance(rows, slice) and rows.step in (None, 1):
+            start, stop, _ = rows.indices(shape[0])
+            stop = max(start, stop)
+            data = reader.read(offset + start * row_bytes, offset + stop * row_bytes)
+            return _from_bytes(data, (stop - start, *shape[1:]), dtype, order)
+
+        indices = _row_indices(rows, shape[0])
+        if indices.size and (indices.min() < 0 or indices.max() >= shape[0]):
+            raise IndexError(f"Row indices out of range for {shape[0]} rows")
+        array = np.empty((len(indices), *shape[1:]), dtype)
+        flat = array.reshape(len(indices), -1).view(np.uint8)
+        for i, row in enumerate(indices):
+            start = offset + int(row) * row_bytes
+            reader.read_into(flat[i], start)
+        return array
+
+
+class _ChunkReader(object):
+    """
+    Reads byte ranges of a chunked artifact, opening only the chunks covering them.
+    """
+
+    def __init__(self, store: ChunkStore, meta: dict) -> None:
+        self.store = store
+        self.chunks = meta["chunks"]
+        self.chunk_size = meta["chunk_size"]
+
+    def read(self, start: int, stop: int) -> bytearray:
+        buffer = bytearray(max(0, stop - start))
+        self.read_into(memoryview(buffer), start)
+        return buffer
+
+    def read_into(self, buffer, start: int) -> None:
+        buffer = memoryview(buffer).cast("B")
+        position = 0
+        while position < len(buffer):
+            index, within = divmod(start + position, self.chunk_size)
+            n = min(self.chunk_size - within, len(buffer) - position)
+            with open(self.store.chunk_path(self.chunks[index]), "rb") as f:
+                f.seek(within)
+                if f.readinto(buffer[position : position + n]) != n:
+                    raise ValueError(f"Chunk {self.chunks[index]} is truncated")
+            position += n
+
+
+def chunk_key(digest: str) -> str:
+    """
+    Path of a chunk relative to the registry root, with "/" separators.
+    """
+    return f"{CHUNKS_DIRECTORY}/{digest[:2]}/{digest}"
+
+
+def missing_chunks(root: Path, version_path: Path) -> list[str]:
+    """
+    Digests of the chunks referenced by the chunk lists of a version that are not
+    stored in the chunk store of root.
+    """
+    store = ChunkStore(root)
+    missing = set()
+    for list_path in Path(version_path).rglob(f"*{CHUNKS_SUFFIX}"):
+        with open(list_path, "r") as f:
+            digests = json.load(f)["chunks"]
+        missing.update(d for d in digests if not store.chunk_path(d).is_file())
+    return sorted(missing)
+
+
+def load_chunked(path: Path, rows=None):
+    """
+    Loads a chunked artifact from its chunk list, see ChunkStore.load. The chunk
+    store of the registry containing the chunk list is used.
+    """
+    for parent in Path(path).absolute().parents:
+        if (parent / ".auto-track" / "chunks").is_dir():
+            return ChunkStore(parent).load(path, rows=rows)
+    raise FileNotFoundError(f"No chunk store found for {path}")
+
+
+def collect_chunks(
+    root: Path, exclude: list[Path] = (), dry_run: bool = True
+) -> tuple[int, int]:
+    """
+    Removes chunks that no chunk list of a stored version references. Must be
+    called while holding the registry lock exclusively, see collect_garbage.
+
+    Args:
+        root: Root directory of the data registry
+        exclude: Version directories whose chunk lists are ignored, e.g. versions
+            that are about to be deleted
+        dry_run: Only count the chunks that would be removed
+
+    Returns:
+        Tuple of (number of unreferenced chunks, their bytes)
+    """
+    root = Path(root)
+    store = ChunkStore(root)
+    if not store.directory.is_dir():
+        return 0, 0
+
+    exclude = {Path(p).resolve() for p in exclude}
+    referenced = set()
+    for dataset_path in root.iterdir():
+        if not dataset_path.is_dir() or dataset_path.name.startswith("."):
+            continue
+        for list_path in dataset_path.rglob(f"*{CHUNKS_SUFFIX}"):
+            if exclude.intersection(list_path.resolve().parents):
+                continue
+            with open(list_path, "r") as f:
+                referenced.update(json.load(f)["chunks"])
+
+    removed, size = 0, 0
+    for chunk_path in store.directory.glob("*/*"):
+        if chunk_path.name in referenced or chunk_path.name.startswith("."):
+            continue
+        removed += 1
+        size += chunk_path.stat().st_size
+        if not dry_run:
+            chunk_path.unlink()
+    return removed, size
+
+
+def _write_npy_header(f, array: np.ndarray) -> None:
+    header = np.lib.format.header_data_from_array_1_0(array)
+    try:
+        np.lib.format.write_array_header_1_0(f, header)
+    except ValueError:
+        # the header of arrays with many fields or dimensions needs format 2.0
+        f.seek(0)
+        f.truncate()
+        np.lib.format.write_array_header_2_0(f, header)
+
+
+def _byte_view(array: np.ndarray, order: str) -> memoryview:
+    return memoryview(array.reshape(-1, order=order).view(np.uint8))
+
+
+def _split(buffers: list[memoryview], chunk_size: int):
+    """
+    Yields the chunks of the concatenation of buffers as lists of buffer slices.
+    """
+    pieces, size = [], 0
+    for buffer in buffers:
+        buffer = memoryview(buffer).cast("B")
+        position = 0
+        while position < len(buffer):
+            n = min(chunk_size - size, len(buffer) - position)
+            pieces.append(buffer[position : position + n])
+            size += n
+            position += n
+            if size == chunk_size:
+                yield pieces
+                pieces, size = [], 0
+    if pieces:
+        yield pieces
+
+
+def _from_bytes(data: bytearray, shape: tuple, dtype: np.dtype, order: str):
+    return np.frombuffer(data, dtype=dtype).reshape(shape, order=order)
@@ -0,0 +1,436 @@
+"""
+Command line interface of auto-track.
+
+Usage:
+    auto-track --root <root> list [dataset] [branch]
+    auto-track --root <root> history <function>
+    auto-track --root <root> diff <function> <branch> <other_branch>
+    auto-track --root <root> verify [dataset] [branch] [version]
+    auto-track --root <root> tag <dataset> <branch> <version> <tag>
+    auto-track --root <root> gc [--keep-last N] [--max-bytes B] [--max-age S] [--apply]
+    auto-track --root <root> compact
+    auto-track --root <root> reindex
+    auto-track --root <root> migrate
+    auto-track --root <root> annotate [function] [version] [-m MESSAGE] [--list]
+    auto-track --root <root> serve [--host HOST] [--port PORT]
+
+Listing commands read the index journal (see auto_track.index) instead of walking
+the registry. Heavy dependencies are imported lazily by the commands needing them,
+torch is never imported.
+"""
+
+import argparse
+from datetime import datetime
+import json
+from pathlib import Path
+import sys
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="auto-track",
+        description="Inspect and maintain an auto-track data registry.",
+    )
+    parser.add_argument(
+        "--root", type=Path, default=Path("."), help="Root of the data registry"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_ = commands.add_parser(
+        "list", help="List datasets, branches of a dataset or versions of a branch"
+    )
+    list_.add_argument("dataset", nargs="?")
+    list_.add_argument("branch", nargs="?")
+    list_.set_defaults(handler=_list)
+
+    history = commands.add_parser(
+        "history", help="Show the version history of a function"
+    )
+    history.add_argument("function")
+    history.set_defaults(handler=_history)
+
+    diff = commands.add_parser(
+        "diff", help="Show the config differences between two branches"
+    )
+    diff.add_argument("function")
+    diff.add_argument("branch")
+    diff.add_argument("other_branch")
+    diff.set_defaults(handler=_diff)
+
+    verify = commands.add_parser(
+        "verify", help="Verify stored files against the checksums of their manifests"
+    )
+    verify.add_argument("dataset", nargs="?")
+    verify.add_argument("branch", nargs="?")
+    verify.add_argument("version", nargs="?")
+    verify.set_defaults(handler=_verify)
+
+    tag = commands.add_parser("tag", help="Tag a version to protect it from gc")
+    tag.add_argument("dataset")
+    tag.add_argument("branch")
+    tag.add_argument("version")
+    tag.add_argument("tag")
+    tag.add_argument("--remove", action="store_true", help="Remove the tag instead")
+    tag.set_defaults(handler=_tag)
+
+    gc = commands.add_parser(
+        "gc", help="Delete versions according to a retention policy"
+    )
+    gc.add_argument("--dataset", action="append", help="Only collect this dataset")
+    gc.add_argument("--keep-last", type=int, help="Versions to keep per branch")
+    gc.add_argument("--max-bytes", type=int, help="Maximum bytes per dataset")
+    gc.add_argument("--max-age", type=float, help="Maximum age in seconds")
+    gc.add_argument(
+        "--tagged-only", action="store_true", help="Delete all untagged versions"
+    )
+    gc.add_argument(
+        "--no-keep-latest",
+        action="store_true",
+        help="Allow deleting the newest version of a branch",
+    )
+    gc.add_argument(
+        "--apply", action="store_true", help="Delete versions instead of a dry run"
+    )
+    gc.set_defaults(handler=_gc)
+
+    compact = commands.add_parser(
+        "compact", help="Drop superseded and deleted records from the index"
+    )
+    compact.set_defaults(handler=_compact)
+
+    reindex = commands.add_parser(
+        "reindex", help="Rebuild the index from the version manifests"
+    )
+    reindex.set_defaults(handler=_reindex)
+
+    migrate = commands.add_parser(
+        "migrate", help="Upgrade metadata written by older versions of auto-track"
+    )
+    migrate.set_defaults(handler=_migrate)
+
+    annotate = commands.add_parser(
+        "annotate",
+        help="Describe version changes that were recorded non-interactively",
+    )
+    annotate.add_argument("function", nargs="?", help="Name of the function")
+    annotate.add_argument("version", nargs="?", help="Version to annotate")
+    annotate.add_argument("-m", "--message", help="Change message")
+    annotate.add_argument(
+        "--list", action="store_true", help="Only list versions pending annotation"
+    )
+    annotate.set_defaults(handler=_annotate)
+
+    serve = commands.add_parser(
+        "serve", help="Serve the registry read-only over HTTP, see auto_track.server"
+    )
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    serve.add_argument("--port", type=int, default=8150, help="Port to listen on")
+    serve.set_defaults(handler=_serve)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+def _list(args) -> int:
+    from auto_track.index import index_path, read_index
+
+    if not index_path(args.root).is_file():
+        print(f"No index found at {index_path(args.root)}, run `auto-track reindex`.")
+        return 1
+
+    versions = read_index(args.root)
+    if args.dataset is None:
+        level, rows = "dataset", _aggregate(versions.values(), ("dataset",))
+    elif args.branch is None:
+        level, rows = "branch", _aggregate(
+            (r for r in versions.values() if r["dataset"] == args.dataset),
+            ("branch",),
+        )
+    else:
+        level, rows = "version", _aggregate(
+            (
+                r
+                for r in versions.values()
+                if r["dataset"] == args.dataset and r["branch"] == args.branch
+            ),
+            ("version",),
+        )
+
+    if not rows:
+        print("Nothing found.")
+        return 1
+
+    print(f"{level:<40} {'versions':>8} {'files':>8} {'size':>10}  last modified")
+    for name, row in rows.items():
+        print(
+            f"{name:<40} {row['versions']:>8} {row['files']:>8} "
+            f"{_format_bytes(row['bytes']):>10}  {_format_time(row['created'])}"
+        )
+    return 0
+
+
+def _aggregate(records, keys: tuple[str]) -> dict:
+    rows = {}
+    for r in records:
+        name = "/".join(r[k] for k in keys)
+        row = rows.setdefault(
+            name, {"versions": 0, "files": 0, "bytes": 0, "created": 0.0}
+        )
+        row["versions"] += 1
+        row["files"] += r.get("files", 0) or 0
+        row["bytes"] += r.get("bytes", 0) or 0
+        row["created"] = max(row["created"], r.get("created", 0) or 0)
+    return dict(sorted(rows.items()))
+
+
+def _history(args) -> int:
+    from auto_track.helpers import version_key
+    from auto_track.track import FunctionDatabase
+
+    with FunctionDatabase(args.root, read_only=True) as db:
+        if args.function not in db.lookup:
+            print(f"Function {args.function} not found.")
+            return 1
+        entries = db.get_version_entries(args.function)
+
+    for entry in sorted(entries, key=lambda e: version_key(e["version"])):
+        pending = " (pending annotation)" if entry.get("pending_annotation") else ""
+        print(f"{entry['version']}{pending}")
+        for line in str(entry.get("change_msg", "")).splitlines():
+            print(f"    {line}")
+    return 0
+
+
+def _diff(args) -> int:
+    from auto_track.fingerprint import flatten_config
+
+    db_path = args.root / ".auto-track" / "data_branches.json"
+    if not db_path.is_file():
+        print(f"No data_branches.json found at {db_path}.")
+        return 1
+    with open(db_path, "r") as f:
+        func_db = json.load(f).get(args.function, {})
+
+    configs = {}
+    for key, entry in func_db.items():
+        if isinstance(entry, dict):
+            configs[entry["branch"]] = entry["config"]
+        else:
+            # legacy entries only store the config as a string
+            configs[entry] = {"config": key}
+
+    missing = [b for b in (args.branch, args.other_branch) if b not in configs]
+    if missing:
+        print(f"Branches {missing} not found for function {args.function}.")
+        return 1
+
+    left = flatten_config(configs[args.branch])
+    right = flatten_config(configs[args.other_branch])
+    differences = 0
+    for key in sorted(set(left) | set(right)):
+        if left.get(key, None) != right.get(key, None):
+            differences += 1
+            print(f"{key}:")
+            print(f"  - {args.branch}: {left.get(key, '<missing>')}")
+            print(f"  + {args.other_branch}: {right.get(key, '<missing>')}")
+
+    if differences == 0:
+        print("Configs are identical.")
+    return 0
+
+
+def _verify(args) -> int:
+    from auto_track.index import read_index, verify_version
+
+    versions = [
+        key
+        for key in read_index(args.root)
+        if all(
+            want is None or want == got
+            for want, got in zip((args.dataset, args.branch, args.version), key)
+        )
+    ]
+    if not versions:
+        print("Nothing to verify.")
+        return 1
+
+    problems = []
+    for dataset, branch, version in sorted(versions):
+        problems += verify_version(args.root / dataset / branch / version)
+
+    for problem in problems:
+        print(problem)
+    print(f"Verified {len(versions)} versions, {len(problems)} problems found.")
+    return 1 if problems else 0
+
+
+def _tag(args) -> int:
+    from auto_track.retention import tag_version, untag_version
+
+    if not _root_exists(args):
+        return 1
+
+    if args.remove:
+        untag_version(args.root, args.dataset, args.branch, args.version, args.tag)
+    else:
+        tag_version(args.root, args.dataset, args.branch, args.version, args.tag)
+    return 0
+
+
+def _gc(args) -> int:
+    from auto_track.retention import RetentionPolicy, collect_garbage
+
+    if not _root_exists(args):
+        return 1
+
+    policy = RetentionPolicy(
+        keep_last=args.keep_last,
+        tagged_only=args.tagged_only,
+        max_bytes=args.max_bytes,
+        max_age=args.max_age,
+        keep_latest=not args.no_keep_latest,
+    )
+    report = collect_garbage(
+        args.root, policy, datasets=args.dataset, dry_run=not args.apply
+    )
+    print(report)
+    return 0
+
+
+def _compact(args) -> int:
+    from auto_track.index import compact_index, registry_lock
+
+    if not _root_exists(args):
+        return 1
+
+    with registry_lock(args.root, exclusive=True):
+        n_before, n_after = compact_index(args.root)
+    print(f"Compacted index from {n_before} to {n_after} records.")
+    return 0
+
+
+def _reindex(args) -> int:
+    from auto_track.index import rebuild_index, registry_lock
+
+    if not _root_exists(args):
+        return 1
+
+    with registry_lock(args.root, exclusive=True):
+        n = rebuild_index(args.root)
+    print(f"Indexed {n} versions.")
+    return 0
+
+
+def _serve(args) -> int:
+    from auto_track.server import RegistryServer
+
+    server = RegistryServer(args.root, host=args.host, port=args.port)
+    print(f"Serving {args.root} at {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def _migrate(args) -> int:
+    import ast
+
+    from auto_track.fingerprint import config_fingerprint, readable_config
+    from auto_track.helpers import JsonDatabase
+    from auto_track.track import FunctionDatabase, build_version_index
+
+    if not _root_exists(args):
+        return 1
+
+    with FunctionDatabase(args.root) as db:
+        n_functions = 0
+        for func_db in db.lookup.values():
+            if "__next_major" not in func_db:
+                build_version_index(func_db)
+                n_functions += 1
+    print(f"Indexed versions of {n_functions} functions.")
+
+    db_path = args.root / ".auto-track" / "data_branches.json"
+    if db_path.is_file():
+        n_configs = 0
+        with JsonDatabase(db_path) as db:
+            for func_name, func_db in db.lookup.items():
+                for key, entry in list(func_db.items()):
+                    if isinstance(entry, dict):
+                        continue
+                    try:
+                        config = ast.literal_eval(key)
+                    except (ValueError, SyntaxError):
+                        print(f"Could not migrate config {key} of {func_name}.")
+                        continue
+                    del func_db[key]
+                    func_db[config_fingerprint(config)] = {
+                        "branch": entry,
+                        "config": readable_config(config),
+                    }
+                    n_configs += 1
+        print(f"Migrated {n_configs} branch configs.")
+
+    return 0
+
+
+def _annotate(args) -> int:
+    from auto_track.track import FunctionDatabase
+
+    if args.version is not None:
+        if args.function is None:
+            print("A function name is required to annotate a version.")
+            return 1
+        message = args.message
+        if message is None:
+            message = input(f"Describe the changes of {args.version}: ")
+        with FunctionDatabase(args.root) as db:
+            db.annotate(args.function, args.version, message)
+        return 0
+
+    # prompt outside of the database lock to not block running writers
+    with FunctionDatabase(args.root, read_only=True) as db:
+        pending = db.get_pending_annotations(args.function)
+
+    if not pending:
+        print("No versions pending annotation.")
+        return 0
+
+    for func_name, entry in pending:
+        print(f"{func_name} {entry['version']}:\n  {entry['change_msg']}")
+        if args.list:
+            continue
+        message = args.message or input("Describe the changes (empty to skip): ")
+        if message:
+            with FunctionDatabase(args.root) as db:
+                db.annotate(func_name, entry["version"], message)
+
+    return 0
+
+
+def _root_exists(args) -> bool:
+    # commands writing metadata would otherwise create .auto-track at a mistyped root
+    if not args.root.is_dir():
+        print(f"Registry root {args.root} does not exist.")
+        return False
+    return True
+
+
+def _format_bytes(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if n < 1024 or unit == "TB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def _format_time(timestamp: float) -> str:
+    if not timestamp:
+        return "-"
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,368 @@
+"""
+Canonical fingerprints of configurations and function inputs.
+
+A fingerprint is a hex digest that is independent of dictionary ordering but
+sensitive to types, i.e. {"a": 1, "b": 2} and {"b": 2, "a": 1} share a fingerprint
+while 1, 1.0, "1" and True do not. NumPy scalars are treated like the corresponding
+Python scalars, NumPy arrays are hashed by dtype, shape and their full content and
+dataclasses by their class name and fields. Other objects are hashed by their repr,
+or by their attributes if the repr contains a memory address.
+
+Input fingerprints (see input_fingerprint) additionally support tensors and pandas
+objects and only hash a sample of blocks of large arrays.
+"""
+
+import dataclasses
+import enum
+import hashlib
+from pathlib import PurePath
+import re
+import struct
+import sys
+import types
+import weakref
+
+import numpy as np
+import pandas as pd
+
+DIGEST_SIZE = 16
+
+# arrays up to this size are stored as lists in readable configs
+READABLE_ARRAY_SIZE = 32
+
+# arrays and frames larger than this are hashed from a sample of blocks / rows
+SAMPLE_THRESHOLD = 64 * 1024 * 1024
+SAMPLE_BLOCKS = 256
+SAMPLE_BLOCK_SIZE = 64 * 1024
+
+# memory address in default reprs such as <Model object at 0x7f3a2c1b5e80>
+_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+# id(obj) -> (weak reference to obj, modification token, digest) of large inputs
+_input_cache: dict[int, tuple] = {}
+
+
+def config_fingerprint(config) -> str:
+    """
+    Computes a canonical, order independent and type aware fingerprint of a config.
+
+    Args:
+        config: Config to fingerprint, may contain dicts, lists, tuples, sets, scalars,
+            strings, bytes, NumPy scalars and arrays, dataclasses, enums and paths
+
+    Returns:
+        Hex digest of the config
+
+    Raises:
+        TypeError: If the config contains an object that has neither a stable repr
+            nor attributes to hash
+    """
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    _update(h, config)
+    return h.hexdigest()
+
+
+def _digest(obj) -> bytes:
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    _update(h, obj)
+    return h.digest()
+
+
+def _update(h, obj) -> None:
+    """
+    Feeds a type tagged, canonical encoding of obj into the hash object h.
+    """
+    if isinstance(obj, np.generic) and not isinstance(obj, np.void):
+        obj = obj.item()
+
+    if obj is None:
+        h.update(b"N")
+    elif isinstance(obj, bool):
+        h.update(b"T" if obj else b"F")
+    elif isinstance(obj, enum.Enum):
+        h.update(b"E")
+        _update_str(h, f"{type(obj).__qualname__}.{obj.name}")
+    elif isinstance(obj, int):
+        h.update(b"I")
+        _update_str(h, str(obj))
+    elif isinstance(obj, float):
+        h.update(b"D")
+        h.update(struct.pack("<d", obj))
+    elif isinstance(obj, complex):
+        h.update(b"C")
+        h.update(struct.pack("<dd", obj.real, obj.imag))
+    elif isinstance(obj, str):
+        h.update(b"S")
+        _update_str(h, obj)
+    elif isinstance(obj, (bytes, bytearray)):
+        h.update(b"B")
+        h.update(struct.pack("<Q", len(obj)))
+        h.update(obj)
+    elif isinstance(obj, PurePath):
+        h.update(b"P")
+        _update_str(h, obj.as_posix())
+    elif isinstance(obj, dict):
+        # hash key value pairs separately and sort the digests to be order independent
+        h.update(b"{")
+        h.update(struct.pack("<Q", len(obj)))
+        for pair in sorted(_digest(k) + _digest(v) for k, v in obj.items()):
+            h.update(pair)
+    elif isinstance(obj, (set, frozenset)):
+        h.update(b"<")
+        h.update(struct.pack("<Q", len(obj)))
+        for item in sorted(_digest(v) for v in obj):
+            h.update(item)
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"[" if isinstance(obj, list) else b"(")
+        h.update(struct.pack("<Q", len(obj)))
+        for value in obj:
+            _update(h, value)
+    elif isinstance(obj, np.ndarray):
+        _update_array(h, obj)
+    elif dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        h.update(b"@")
+        _update_str(h, type(obj).__qualname__)
+        _update(h, {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj)})
+    elif isinstance(obj, (type, types.FunctionType, types.BuiltinFunctionType)):
+        name = f"{obj.__module__}.{obj.__qualname__}"
+        if "<" in obj.__qualname__:
+            raise TypeError(
+                f"Can not fingerprint {name}, lambdas and local functions or classes "
+                "are not identified by their name"
+            )
+        h.update(b"R")
+        _update_str(h, name)
+    else:
+        # unknown objects are identified by their type and representation, the
+        # default repr contains the memory address and differs between runs
+        type_name = f"{type(obj).__module__}.{type(obj).__qualname__}"
+        representation = repr(obj)
+        if _ADDRESS.search(representation) is None:
+            h.update(b"?")
+            _update_str(h, type_name)
+            _update_str(h, representation)
+        elif hasattr(obj, "__dict__"):
+            h.update(b"O")
+            _update_str(h, type_name)
+            _update(h, vars(obj))
+        else:
+            raise TypeError(
+                f"Can not fingerprint {type_name}, its repr {representation} is not "
+                "stable between runs. Define __repr__ or use a dataclass."
+            )
+
+
+def _update_str(h, s: str) -> None:
+    data = s.encode("utf-8")
+    h.update(struct.pack("<Q", len(data)))
+    h.update(data)
+
+
+def _update_array(h, arr: np.ndarray) -> None:
+    h.update(b"A")
+    _update_str(h, arr.dtype.str)
+    h.update(struct.pack("<Q", arr.ndim))
+    h.update(struct.pack(f"<{arr.ndim}Q", *arr.shape))
+
+    if arr.dtype.hasobject:
+        for value in arr.flat:
+            _update(h, value)
+    else:
+        h.update(memoryview(np.ascontiguousarray(arr)).cast("B"))
+
+
+def readable_config(config):
+    """
+    Converts a config to a JSON serializable representation for display purposes.
+
+    Small arrays are converted to lists, larger arrays are summarized by dtype,
+    shape and fingerprint.
+    """
+    if isinstance(config, np.generic) and not isinstance(config, np.void):
+        return config.item()
+    if isinstance(config, enum.Enum):
+        return f"{type(config).__qualname__}.{config.name}"
+    if config is None or isinstance(config, (bool, int, float, str)):
+        return config
+    if isinstance(config, dict):
+        return {str(k): readable_config(v) for k, v in config.items()}
+    if isinstance(config, (list, tuple)):
+        return [readable_config(v) for v in config]
+    if isinstance(config, (set, frozenset)):
+        return sorted((readable_config(v) for v in config), key=str)
+    if isinstance(config, np.ndarray):
+        if config.size <= READABLE_ARRAY_SIZE and not config.dtype.hasobject:
+            return config.tolist()
+        return {
+            "__ndarray__": {
+                "dtype": config.dtype.str,
+                "shape": list(config.shape),
+                "fingerprint": config_fingerprint(config),
+            }
+        }
+    if dataclasses.is_dataclass(config) and not isinstance(config, type):
+        return {
+            "__dataclass__": type(config).__qualname__,
+            **{
+                f.name: readable_config(getattr(config, f.name))
+                for f in dataclasses.fields(config)
+            },
+        }
+    return repr(config)
+
+
+def flatten_config(config, prefix: str = "") -> dict:
+    """
+    Flattens a nested (readable) config to {"dotted.key": value}.
+    """
+    if not isinstance(config, dict) or not config:
+        return {prefix or ".": config}
+    flat = {}
+    for key, value in config.items():
+        flat.update(flatten_config(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def input_fingerprint(args: tuple, kwargs: dict, exclude: tuple[str] = ()) -> str:
+    """
+    Computes a fingerprint of the arguments of a function call.
+
+    NumPy arrays, tensors and pandas objects larger than SAMPLE_THRESHOLD bytes are
+    hashed by their metadata and an evenly spaced sample of SAMPLE_BLOCKS blocks,
+    which keeps fingerprinting large inputs cheap at the cost of missing changes
+    outside of the sampled blocks. Digests of large tensors and of large read-only
+    arrays are cached by object id for as long as the object is alive. Cached
+    digests of tensors are invalidated by in place operations (through the version
+    counter of the tensor), writable arrays and pandas objects are hashed on every
+    call since in place modifications of them cannot be detected.
+
+    Args:
+        args: Positional arguments of the call
+        kwargs: Keyword arguments of the call
+        exclude: Names of keyword arguments to ignore, e.g. "at_config"
+
+    Returns:
+        Hex digest of the call arguments
+    """
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    h.update(struct.pack("<Q", len(args)))
+    for value in args:
+        h.update(data_fingerprint(value))
+    for key in sorted(k for k in kwargs if k not in exclude):
+        _update_str(h, key)
+        h.update(data_fingerprint(kwargs[key]))
+    return h.hexdigest()
+
+
+def data_fingerprint(obj) -> bytes:
+    """
+    Computes the digest of a single function input, see input_fingerprint.
+    """
+    torch = sys.modules.get("torch", None)
+    is_tensor = torch is not None and isinstance(obj, torch.Tensor)
+
+    if not (is_tensor or isinstance(obj, (np.ndarray, pd.DataFrame, pd.Series))):
+        if isinstance(obj, (list, tuple)):
+            h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+            h.update(b"[" if isinstance(obj, list) else b"(")
+            h.update(struct.pack("<Q", len(obj)))
+            for value in obj:
+                h.update(data_fingerprint(value))
+            return h.digest()
+        if isinstance(obj, dict):
+            h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+            h.update(b"{")
+            h.update(struct.pack("<Q", len(obj)))
+            for pair in sorted(
+                _digest(k) + data_fingerprint(v) for k, v in obj.items()
+            ):
+                h.update(pair)
+            return h.digest()
+        return _digest(obj)
+
+    token = _cache_token(obj, is_tensor)
+    cached = _input_cache.get(id(obj), None)
+    if token is not None and cached is not None and cached[0]() is obj:
+        if cached[1] == token:
+            return cached[2]
+
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    if is_tensor:
+        h.update(b"tensor")
+        _update_str(h, str(obj.dtype))
+        _update_str(h, str(tuple(obj.shape)))
+        # numpy has no bfloat16 and float8 dtypes, so the raw bytes are hashed
+        flat = obj.detach().contiguous().reshape(-1)
+        _update_sampled_array(h, flat.view(torch.uint8).cpu().numpy())
+    elif isinstance(obj, np.ndarray):
+        _update_sampled_array(h, obj)
+    else:
+        _update_sampled_frame(h, obj)
+    digest = h.digest()
+
+    if token is None:
+        return digest
+    try:
+        ref = weakref.ref(obj, lambda _, key=id(obj): _input_cache.pop(key, None))
+    except TypeError:
+        return digest
+    _input_cache[id(obj)] = (ref, token, digest)
+    return digest
+
+
+def _cache_token(obj, is_tensor: bool):
+    """
+    Token that changes whenever obj is modified in place, None if the digest of obj
+    must not be cached.
+    """
+    if is_tensor:
+        if obj.element_size() * obj.nelement() <= SAMPLE_THRESHOLD:
+            return None
+        # shared with all views of the tensor and bumped by every in place operation
+        return obj._version
+    if not isinstance(obj, np.ndarray) or obj.nbytes <= SAMPLE_THRESHOLD:
+        return None
+    # a read-only array can still be modified through a writable base
+    base = obj
+    while isinstance(base, np.ndarray):
+        if base.flags.writeable:
+            return None
+        base = base.base
+    return 0
+
+
+def clear_input_cache() -> None:
+    _input_cache.clear()
+
+
+def _update_sampled_array(h, arr: np.ndarray) -> None:
+    if arr.dtype.hasobject or arr.nbytes <= SAMPLE_THRESHOLD:
+        _update_array(h, arr)
+        return
+
+    h.update(b"a")
+    _update_str(h, arr.dtype.str)
+    h.update(struct.pack("<Q", arr.ndim))
+    h.update(struct.pack(f"<{arr.ndim}Q", *arr.shape))
+
+    flat = np.ascontiguousarray(arr).reshape(-1).view(np.uint8)
+    block_size = min(SAMPLE_BLOCK_SIZE, flat.size)
+    starts = np.linspace(0, flat.size - block_size, SAMPLE_BLOCKS, dtype=np.int64)
+    for start in starts:
+        h.update(memoryview(flat[start : start + block_size]))
+
+
+def _update_sampled_frame(h, obj: pd.DataFrame | pd.Series) -> None:
+    h.update(b"frame" if isinstance(obj, pd.DataFrame) else b"series")
+    if isinstance(obj, pd.DataFrame):
+        _update(h, [str(c) for c in obj.columns])
+        _update(h, [str(d) for d in obj.dtypes])
+    else:
+        _update(h, [str(obj.name), str(obj.dtype)])
+    h.update(struct.pack("<Q", len(obj)))
+
+    rows = obj
+    if np.sum(obj.memory_usage(deep=False)) > SAMPLE_THRESHOLD:
+        step = max(len(obj) // (SAMPLE_BLOCKS * 64), 1)
+        rows = obj.iloc[::step]
+    h.update(memoryview(pd.util.hash_pandas_object(rows, index=True).to_numpy()))
@@ -1,16 +1,47 @@
-"""DEV TODOs:
-- [] add support for AnnData
-"""
-
 from pathlib import Path
 import json
+import os
+import pickle
+import re
+import shutil
+import sys
+import uuid
 
 import numpy as np
 import pandas as pd
-import torch
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on windows
+    fcntl = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+from auto_track.index import MANIFEST_NAME, registry_lock
+from auto_track.instrumentation import artifact_stats, span
+
+# appendable outputs are stored as directories of immutable parts
+PARTS_SUFFIX = ".parts"
+
+# sparse matrices are stored as directories of their component arrays
+SPARSE_SUFFIX = ".sparse"
+SPARSE_COMPONENTS = {
+    "csr": ("data", "indices", "indptr"),
+    "csc": ("data", "indices", "indptr"),
+    "coo": ("data", "row", "col"),
+}
 
-def save_object(obj, path: Path):
+# large arrays and tensors may be stored as chunk lists, see auto_track.chunks
+CHUNKS_SUFFIX = ".chunks"
+
+# lists of at least this many records are stored as JSON lines
+JSON_LINES_MIN_RECORDS = 1000
+
+
+def save_object(obj, path: Path, chunks=None):
     """
     Saves python objects to a predefined path
 
@@ -22,39 +53,317 @@ def save_object(obj, path: Path):
             - pd.DataFrame
             - pd.Series
             - torch.Tensor
+            - scipy.sparse matrix or array, see save_sparse
+            - anndata.AnnData, stored as .h5ad
         path: Path to save the object
+        chunks: Chunk store large arrays and tensors are stored in, see
+            auto_track.chunks
     """
-    path.parent.mkdir(parents=True, exist_ok=True)
-
-    # infer correct suffix based on object type
-    if isinstance(obj, (list, tuple, dict)):
-        path = path.with_suffix(".json")
-    elif isinstance(obj, np.ndarray):
-        path = path.with_suffix(".npy")
-    elif isinstance(obj, (pd.DataFrame, pd.Series)):
-        path = path.with_suffix(".csv")
-    elif isinstance(obj, torch.Tensor):
-        path = path.with_suffix(".pt")
-
-    # save object
-    if isinstance(obj, (list, tuple, dict)):
-        save_iterable_types(obj, path)
-    elif isinstance(obj, np.ndarray):
-        np.save(path, obj)
-    elif isinstance(obj, (pd.DataFrame, pd.Series)):
-        obj.to_csv(path, index=False)
-    elif isinstance(obj, torch.Tensor):
-        torch.save(obj, path)
-    else:
-        raise ValueError(f"Unsupported object type: {type(obj)}")
+    if chunks is not None and chunks.accepts(obj):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        chunks.save(obj, path)
+        return
+
+    with span("save.object", type=type(obj).__name__) as s:
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # infer correct suffix based on object type
+        if isinstance(obj, (list, tuple, dict)):
+            path = path.with_suffix(".json")
+        elif isinstance(obj, np.ndarray):
+            path = path.with_suffix(".npy")
+        elif isinstance(obj, (pd.DataFrame, pd.Series)):
+            path = path.with_suffix(".csv")
+        elif _is_tensor(obj):
+            path = path.with_suffix(".pt")
+        elif _is_sparse(obj):
+            path = path.with_suffix(SPARSE_SUFFIX)
+        elif _is_anndata(obj):
+            path = path.with_suffix(".h5ad")
+
+        if path.suffix in (".npy", ".pt"):
+            # an earlier run of the same version may have stored the output chunked
+            path.with_suffix(CHUNKS_SUFFIX).unlink(missing_ok=True)
+
+        # save object
+        if isinstance(obj, (list, tuple, dict)):
+            save_iterable_types(obj, path)
+        elif isinstance(obj, np.ndarray):
+            np.save(path, obj)
+        elif isinstance(obj, (pd.DataFrame, pd.Series)):
+            obj.to_csv(path, index=False)
+        elif _is_tensor(obj):
+            import torch
+
+            torch.save(obj, path)
+        elif _is_sparse(obj):
+            save_sparse(obj, path)
+        elif _is_anndata(obj):
+            # sparse X and layers stay sparse, h5ad files can be read backed
+            obj.write_h5ad(path)
+        else:
+            raise ValueError(f"Unsupported object type: {type(obj)}")
+
+        if s:
+            # records may be stored as JSON lines, nested objects in a directory
+            # named after the file stem, sparse matrices in a .sparse directory
+            written = next(
+                (p for p in (path, path.with_suffix(".jsonl")) if p.exists()),
+                path.parent / path.stem,
+            )
+            files, size = artifact_stats(written)
+            s.set(path=written, files=files, bytes_written=size)
+
+
+def save_sparse(matrix, path: Path) -> None:
+    """
+    Saves a scipy sparse matrix or array as directory of its component arrays
+    (data.npy, indices.npy, indptr.npy for CSR/CSC, data.npy, row.npy, col.npy for
+    COO) and a format.json describing format and shape. The components can be memory
+    mapped individually when loading. Other formats are stored as CSR.
+
+    Args:
+        matrix: Sparse matrix or array
+        path: Path of the directory, usually ending with .sparse
+    """
+    fmt = matrix.format
+    if fmt not in SPARSE_COMPONENTS:
+        matrix, fmt = matrix.tocsr(), "csr"
+
+    # write into a temporary directory so readers never see a partial matrix
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.mkdir(parents=True)
+    try:
+        for name in SPARSE_COMPONENTS[fmt]:
+            np.save(tmp_path / f"{name}.npy", getattr(matrix, name))
+        with open(tmp_path / "format.json", "w") as f:
+            json.dump(
+                {
+                    "format": fmt,
+                    "shape": list(matrix.shape),
+                    "matrix": _sparse_module().isspmatrix(matrix),
+                },
+                f,
+            )
+        if path.is_dir():
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            shutil.rmtree(tmp_path)
+
+
+def append_object(obj, path: Path) -> Path:
+    """
+    Appends an object to an appendable output stored at path.parts as immutable
+    parts part_{i:06d}, so the cost of an append only depends on the size of obj.
+    Readers see the concatenation of all parts.
+
+    Args:
+        obj: Object to append, can be any of the following types:
+            - np.ndarray, concatenated along axis 0
+            - torch.Tensor, concatenated along dimension 0
+            - pd.DataFrame or pd.Series, concatenated rows
+            - list of JSON serializable records, stored as JSON lines
+        path: Path of the output without suffix
+
+    Returns:
+        Path of the written part
+    """
+    with span("save.append", type=type(obj).__name__) as s:
+        parts_dir = path.with_suffix(PARTS_SUFFIX)
+        stored = [
+            p
+            for p in path.parent.glob(f"{path.name}*")
+            if p.name != parts_dir.name and p.stem == path.name
+        ]
+        if stored:
+            raise ValueError(
+                f"Output {path.name} is already stored at {stored[0]} and can not be "
+                "appended to."
+            )
+
+        if isinstance(obj, np.ndarray):
+            suffix = ".npy"
+            if obj.ndim == 0:
+                raise ValueError(
+                    "Only arrays with at least one dimension can be appended"
+                )
+        elif _is_tensor(obj):
+            suffix = ".pt"
+            if obj.dim() == 0:
+                raise ValueError(
+                    "Only tensors with at least one dimension can be appended"
+                )
+        elif isinstance(obj, (pd.DataFrame, pd.Series)):
+            suffix = ".csv"
+        elif isinstance(obj, (list, tuple)) and dumps_json(obj) is not None:
+            suffix = ".jsonl"
+        else:
+            raise ValueError(f"Objects of type {type(obj)} can not be appended")
+
+        parts_dir.mkdir(parents=True, exist_ok=True)
+        parts = sorted(p for p in parts_dir.iterdir() if p.name.startswith("part_"))
+        if parts:
+            _check_appendable(obj, parts[0], suffix)
+
+        tmp_path = parts_dir / f".{uuid.uuid4().hex}{suffix}"
+        if suffix == ".npy":
+            np.save(tmp_path, obj)
+        elif suffix == ".pt":
+            import torch
+
+            torch.save(obj, tmp_path)
+        elif suffix == ".csv":
+            obj.to_csv(tmp_path, index=False)
+        else:
+            with open(tmp_path, "wb") as f:
+                f.write(dumps_json_lines(obj))
+
+        # linking fails if the part exists, so concurrent appends never collide
+        i = len(parts)
+        while True:
+            part_path = parts_dir / f"part_{i:06d}{suffix}"
+            try:
+                os.link(tmp_path, part_path)
+                break
+            except FileExistsError:
+                i += 1
+        tmp_path.unlink()
+
+        s.set(path=part_path, files=1, bytes_written=part_path.stat().st_size)
+        return part_path
+
+
+def _check_appendable(obj, first_part: Path, suffix: str) -> None:
+    if first_part.suffix != suffix:
+        raise ValueError(
+            f"Can not append {type(obj).__name__} to parts of type {first_part.suffix}"
+        )
+    if suffix == ".npy":
+        stored = np.load(first_part, mmap_mode="r")
+        if stored.shape[1:] != obj.shape[1:] or stored.dtype != obj.dtype:
+            raise ValueError(
+                f"Can not append array of shape {obj.shape} and dtype {obj.dtype} to "
+                f"arrays of shape (n, {', '.join(map(str, stored.shape[1:]))}) and "
+                f"dtype {stored.dtype}"
+            )
+    elif suffix == ".csv":
+        columns = list(pd.read_csv(first_part, nrows=0).columns)
+        new_columns = [str(c) for c in pd.DataFrame(obj).columns]
+        if columns != new_columns:
+            raise ValueError(f"Can not append columns {new_columns} to {columns}")
+
+
+def write_manifest(version_path: Path, manifest: dict) -> None:
+    """
+    Writes the manifest of a version directory. The manifest is written last and
+    atomically, so its presence marks a completely written version.
+
+    Args:
+        version_path: Path to the version directory
+        manifest: JSON serializable manifest
+    """
+    version_path.mkdir(parents=True, exist_ok=True)
+    tmp_path = version_path / f"{MANIFEST_NAME}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    tmp_path.replace(version_path / MANIFEST_NAME)
+
+
+def read_manifest(version_path: Path) -> dict | None:
+    """
+    Reads the manifest of a version directory.
+
+    Returns:
+        The manifest or None if the version has no manifest
+    """
+    path = version_path / MANIFEST_NAME
+    if not path.is_file():
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def version_key(version: str) -> tuple[int, ...]:
+    """
+    Sort key comparing versions numerically, so that 0.0.10 is newer than 0.0.9.
+    """
+    return tuple(int(v) for v in version.split("."))
+
+
+class JsonDatabase(object):
+    """
+    JSON file of the registry metadata that is read and written back as a whole.
+
+    While the database is entered, a flock on a sidecar lock file ({name}.lock)
+    serializes the read-modify-write cycles of concurrent processes. The file is
+    replaced atomically on exit, so readers that do not take the lock never see a
+    partially written file. Changes are discarded if the block raised.
+
+    Usage:
+        with JsonDatabase(root / ".auto-track" / "data_branches.json") as db:
+            db.lookup["func"] = {}
+
+    Args:
+        path: Path of the JSON file, a missing file is created on exit
+        read_only: Hold the lock shared and never write the file back, a missing
+            file is read as empty database and not created
+    """
+
+    def __init__(self, path: Path, read_only: bool = False) -> None:
+        self.path = Path(path)
+        self.read_only = read_only
+        self.lookup = None
+        self._lock = None
+
+    def __enter__(self):
+        if self.read_only and not self.path.is_file():
+            self.lookup = {}
+            return self
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if fcntl is not None:
+            self._lock = open(self.path.with_suffix(".lock"), "a")
+            fcntl.flock(self._lock, fcntl.LOCK_SH if self.read_only else fcntl.LOCK_EX)
+
+        try:
+            with open(self.path, "r") as f:
+                self.lookup = json.load(f)
+        except FileNotFoundError:
+            self.lookup = {}
+        except BaseException:
+            self._unlock()
+            raise
+        return self
+
+    def __exit__(self, exc_type, *args):
+        try:
+            if exc_type is None and not self.read_only:
+                tmp_path = self.path.with_name(
+                    f".{self.path.name}.{uuid.uuid4().hex}.tmp"
+                )
+                with open(tmp_path, "w") as f:
+                    json.dump(self.lookup, f)
+                os.replace(tmp_path, self.path)
+        finally:
+            self.lookup = None
+            self._unlock()
+
+    def _unlock(self) -> None:
+        if self._lock is not None:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+            self._lock.close()
+            self._lock = None
 
 
 def save_iterable_types(obj: list | dict | tuple, path: Path):
     """
     Saves a iterable to a predefined path and checks for types contained in the dictionary.
 
-    Iterables only consisting of internal python types (str, int, float, bool, list, dict, tuple)
-        are stored as json files.
+    Iterables only consisting of internal python types (str, int, float, bool, None, list, dict, tuple)
+        are stored as json files, lists of at least JSON_LINES_MIN_RECORDS dictionaries
+        as JSON lines (.jsonl). The file is written completely or not at all.
 
     If the object contains external types (np.ndarray, pd.DataFrame, torch.Tensor) and only one type,
         the objects is stored in the corresponding format in a subdirectory. With each file named after
@@ -70,14 +379,28 @@ def save_iterable_types(obj: list | dict | tuple, path: Path):
     if not isinstance(obj, iterable_types):
         raise ValueError(f"Unsupported object type: {type(obj)}")
 
-    if _python_internal_types_only(obj):
-        with open(path, "w") as f:
-            json.dump(obj, f)
+    data = None
+    if isinstance(obj, list) and len(obj) >= JSON_LINES_MIN_RECORDS:
+        if all(isinstance(record, dict) for record in obj):
+            data = dumps_json_lines(obj)
+            if data is not None:
+                path = path.with_suffix(".jsonl")
+    if data is None:
+        data = dumps_json(obj)
+
+    if data is not None:
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        # an earlier run of the same version may have stored the output with the
+        # other suffix, e.g. before it reached JSON_LINES_MIN_RECORDS records
+        stale = ".json" if path.suffix == ".jsonl" else ".jsonl"
+        path.with_suffix(stale).unlink(missing_ok=True)
+        os.replace(tmp_path, path)
     elif isinstance(obj, dict):
         value_types = {type(value) for value in obj.values()}
         contains_external_types = any(
-            value_type in [np.ndarray, pd.DataFrame, pd.Series, torch.Tensor]
-            for value_type in value_types
+            value_type in _external_types() for value_type in value_types
         )
         if len(value_types) != 1 and contains_external_types:
             raise ValueError(
@@ -92,15 +415,22 @@ def save_iterable_types(obj: list | dict | tuple, path: Path):
             for key, value in obj.items():
                 p = _get_nested_obj_dir(path, key, "", ".csv")
                 value.to_csv(p, index=False)
-        elif value_type == torch.Tensor:
+        elif value_type is _tensor_type():
+            import torch
+
             for key, value in obj.items():
                 p = _get_nested_obj_dir(path, key, "", ".pt")
                 torch.save(value, p)
+        else:
+            raise ValueError(
+                f"Dictionary values of type {value_type} can not be saved, only JSON "
+                "serializable values or values of a single array, frame or tensor type "
+                "are supported."
+            )
     elif isinstance(obj, (list, tuple)):
         value_types = {type(value) for value in obj}
         contains_external_types = any(
-            value_type in [np.ndarray, pd.DataFrame, pd.Series, torch.Tensor]
-            for value_type in value_types
+            value_type in _external_types() for value_type in value_types
         )
         if len(value_types) != 1 and contains_external_types:
             raise ValueError(
@@ -115,16 +445,104 @@ def save_iterable_types(obj: list | dict | tuple, path: Path):
             for idx, value in enumerate(obj):
                 p = _get_nested_obj_dir(path, str(idx), "item_", ".csv")
                 value.to_csv(p, index=False)
-        elif value_type == torch.Tensor:
+        elif value_type is _tensor_type():
+            import torch
+
             for idx, value in enumerate(obj):
                 p = _get_nested_obj_dir(path, str(idx), "item_", ".pt")
                 torch.save(value, p)
+        else:
+            raise ValueError(
+                f"List items of type {value_type} can not be saved, only JSON "
+                "serializable items or items of a single array, frame or tensor type "
+                "are supported."
+            )
     else:
         raise ValueError(
             f"Object type {type(obj)} is currently not supported for automatic saving."
         )
 
 
+def dumps_json(obj) -> bytes | None:
+    """
+    Validates and serializes an object of internal python types (str, int, float,
+    bool, None, list, dict, tuple) in a single pass. Uses orjson if installed and
+    falls back to the standard library.
+
+    Returns:
+        The JSON document, None if obj contains other types
+    """
+    if orjson is not None:
+        try:
+            data = orjson.dumps(obj, option=_ORJSON_OPTIONS, default=_reject)
+            # orjson writes NaN and infinity as null, which the standard library
+            # keeps, so documents with non-finite floats are serialized by the latter
+            if b"null" not in data or not _has_non_finite(obj):
+                return data
+        except TypeError:
+            # e.g. integers above 64 bit or numpy scalars (float subclasses), which
+            # the standard library either supports or rejects as well
+            pass
+    try:
+        return json.dumps(obj, default=_reject).encode("utf-8")
+    except (TypeError, ValueError):
+        return None
+
+
+def dumps_json_lines(records: list | tuple) -> bytes | None:
+    """
+    Serializes records as JSON lines, None if a record is not JSON serializable.
+    """
+    lines = []
+    for record in records:
+        line = dumps_json(record)
+        if line is None:
+            return None
+        lines.append(line)
+    lines.append(b"")
+    return b"\n".join(lines)
+
+
+def loads_json(data: bytes | str):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # NaN and infinity written by the standard library are not valid JSON
+            pass
+    return json.loads(data)
+
+
+def _reject(obj):
+    raise TypeError(f"{type(obj)} is not an internal python type")
+
+
+# pickle stores floats as big endian doubles after the BINFLOAT opcode (G), NaN and
+# infinity are the doubles with all exponent bits set
+_NON_FINITE_FLOAT = re.compile(rb"G[\x7f\xff][\xf0-\xff]")
+
+
+def _has_non_finite(obj) -> bool:
+    """
+    Whether an object of internal python types may contain NaN or infinity.
+
+    The floats are found in the pickle of obj, which is several times faster than
+    walking obj in python. Matching bytes of strings only cause false positives.
+    """
+    return _NON_FINITE_FLOAT.search(pickle.dumps(obj, protocol=4)) is not None
+
+
+if orjson is not None:
+    # serialize exactly what the standard library serializes, everything else is
+    # handed to _reject
+    _ORJSON_OPTIONS = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_SUBCLASS
+    )
+
+
 def _python_internal_types_only(d: list | dict | tuple) -> bool:
     """
     Checks if all values in a dictionary are of internal Python types
@@ -135,23 +553,57 @@ def _python_internal_types_only(d: list | dict | tuple) -> bool:
     Returns:
         True if all values are of internal Python types, False otherwise
     """
-    iterable_types = (list, dict, tuple)
-    internal_types = (str, int, float, bool)
-
-    if isinstance(d, (list, tuple)):
-        for value in d:
-            if isinstance(value, iterable_types):
-                _ = _python_internal_types_only(value)
-            elif not isinstance(value, internal_types):
-                return False
-    elif isinstance(d, dict):
-        for value in d.values():
-            if isinstance(value, iterable_types):
-                _ = _python_internal_types_only(value)
-            elif not isinstance(value, internal_types):
-                return False
-
-    return True
+    return dumps_json(d) is not None
+
+
+def _tensor_type():
+    """
+    Returns torch.Tensor if torch is imported and None otherwise. Tensors can only
+    exist if torch was imported, so this avoids importing torch just for type checks.
+    """
+    torch = sys.modules.get("torch", None)
+    return None if torch is None else torch.Tensor
+
+
+def _is_tensor(obj) -> bool:
+    tensor_type = _tensor_type()
+    return tensor_type is not None and isinstance(obj, tensor_type)
+
+
+def _row_indices(rows, n: int) -> np.ndarray:
+    if isinstance(rows, slice):
+        return np.arange(n)[rows]
+    indices = np.asarray(rows, dtype=np.int64)
+    return np.where(indices < 0, indices + n, indices)
+
+
+def _torch_index(rows):
+    if isinstance(rows, slice):
+        return rows
+    import torch
+
+    return torch.as_tensor(np.asarray(rows), dtype=torch.long)
+
+
+def _sparse_module():
+    """
+    Returns scipy.sparse if it is imported and None otherwise, see _tensor_type.
+    """
+    return sys.modules.get("scipy.sparse", None)
+
+
+def _is_sparse(obj) -> bool:
+    sparse = _sparse_module()
+    return sparse is not None and sparse.issparse(obj)
+
+
+def _is_anndata(obj) -> bool:
+    anndata = sys.modules.get("anndata", None)
+    return anndata is not None and isinstance(obj, anndata.AnnData)
+
+
+def _external_types() -> list[type]:
+    return [np.ndarray, pd.DataFrame, pd.Series, _tensor_type()]
 
 
 def _get_nested_obj_dir(path: Path, idx: str, prefix: str, suffix: str) -> Path:
@@ -0,0 +1,341 @@
+"""
+Registry index of stored versions.
+
+Every committed or deleted version is appended as one JSON line to
+root/.auto-track/index.jsonl, so listing a registry only needs to replay the
+journal instead of walking the directory tree. `compact_index` rewrites the
+journal without superseded and deleted records, `rebuild_index` recreates it
+from the version manifests.
+
+This module only depends on the standard library, so it can be imported without
+loading numpy, pandas or torch.
+"""
+
+from contextlib import contextmanager
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on windows
+    fcntl = None
+
+INDEX_NAME = "index.jsonl"
+MANIFEST_NAME = ".manifest.json"
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def registry_lock(root: Path, exclusive: bool = False):
+    """
+    Holds the registry wide lock of a root. Writers of versions hold it shared,
+    maintenance operations such as garbage collection hold it exclusively.
+
+    Args:
+        root: Root directory of the data registry
+        exclusive: Whether to acquire the lock exclusively
+    """
+    if fcntl is None:
+        yield
+        return
+
+    lock_path = Path(root) / ".auto-track" / "registry.lock"
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def index_path(root: Path) -> Path:
+    return Path(root) / ".auto-track" / INDEX_NAME
+
+
+def append_index(root: Path, record: dict) -> None:
+    """
+    Appends a record to the index journal.
+
+    Records are written with a single write on a file opened in append mode, so
+    concurrent writers do not interleave their lines.
+
+    Args:
+        root: Root directory of the data registry
+        record: Record with at least "op" ("add" or "delete"), "dataset", "branch"
+            and "version"
+    """
+    path = index_path(root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = (json.dumps(record) + "\n").encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def read_index(root: Path, offset: int = 0) -> dict[tuple[str, str, str], dict]:
+    """
+    Replays the index journal.
+
+    Args:
+        root: Root directory of the data registry
+        offset: Byte offset to start reading the journal from
+
+    Returns:
+        Dictionary mapping (dataset, branch, version) to the latest "add" record
+    """
+    versions = {}
+    for record in iter_index(root, offset):
+        _apply(versions, record)
+    return versions
+
+
+def iter_index(root: Path, offset: int = 0):
+    """
+    Yields the records of the index journal starting at a byte offset. An incomplete
+    last line (a record that is being written) is skipped.
+    """
+    path = index_path(root)
+    if not path.is_file():
+        return
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            yield json.loads(line)
+
+
+class RegistryIndex(object):
+    """
+    In-memory replay of the index journal that is kept up to date incrementally.
+
+    `refresh` only reads the records appended since the last refresh. If the
+    journal was rewritten in the meantime (compaction or rebuild), it is replayed
+    completely and compared with the previous state.
+
+    Args:
+        root: Root directory of the data registry
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+        self.versions: dict[tuple[str, str, str], dict] = {}
+        self.offset = 0
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def refresh(self) -> list[tuple[str, dict]]:
+        """
+        Applies the records written since the last refresh.
+
+        Returns:
+            Changes in journal order as (op, record) pairs, op is "add" for new
+            versions, "update" for versions written again (e.g. appended to) and
+            "delete" for deleted versions
+        """
+        with self._lock:
+            try:
+                st = os.stat(index_path(self.root))
+            except FileNotFoundError:
+                return self._replace({}, None, 0)
+
+            if st.st_ino != self._inode or st.st_size < self.offset:
+                versions, offset = {}, 0
+                for record, offset in _read_records(self.root, 0):
+                    _apply(versions, record)
+                return self._replace(versions, st.st_ino, offset)
+
+            if st.st_size == self.offset:
+                return []
+            changes = []
+            for record, self.offset in _read_records(self.root, self.offset):
+                key = (record["dataset"], record["branch"], record["version"])
+                op = record["op"]
+                if op == "add" and key in self.versions:
+                    op = "update"
+                _apply(self.versions, record)
+                changes.append((op, record))
+            return changes
+
+    def _replace(self, versions: dict, inode, offset: int) -> list[tuple[str, dict]]:
+        changes = [
+            ("delete", record)
+            for key, record in self.versions.items()
+            if key not in versions
+        ]
+        changes += [
+            ("add" if key not in self.versions else "update", record)
+            for key, record in versions.items()
+            if self.versions.get(key, None) != record
+        ]
+        self.versions, self._inode, self.offset = versions, inode, offset
+        return changes
+
+
+def _read_records(root: Path, offset: int):
+    """
+    Yields the complete records after a byte offset with the offset following each.
+    """
+    with open(index_path(root), "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            yield json.loads(line), offset
+
+
+def _apply(versions: dict, record: dict) -> None:
+    key = (record["dataset"], record["branch"], record["version"])
+    if record["op"] == "delete":
+        versions.pop(key, None)
+    else:
+        versions[key] = record
+
+
+def compact_index(root: Path) -> tuple[int, int]:
+    """
+    Rewrites the index journal keeping only the latest record of existing versions.
+
+    Returns:
+        Tuple of (number of records before, number of records after)
+    """
+    n_before = sum(1 for _ in iter_index(root))
+    versions = read_index(root)
+    _write_index(root, versions.values())
+    return n_before, len(versions)
+
+
+def rebuild_index(root: Path) -> int:
+    """
+    Recreates the index journal from the manifests of all stored versions.
+
+    Returns:
+        Number of indexed versions
+    """
+    root = Path(root)
+    records = []
+    for dataset_path in _subdirs(root):
+        for branch_path in _subdirs(dataset_path):
+            for version_path in _subdirs(branch_path):
+                manifest_path = version_path / MANIFEST_NAME
+                if not manifest_path.is_file():
+                    continue
+                with open(manifest_path, "r") as f:
+                    manifest = json.load(f)
+                records.append(
+                    index_record(
+                        manifest,
+                        dataset_path.name,
+                        branch_path.name,
+                        version_path.name,
+                    )
+                )
+    _write_index(root, records)
+    return len(records)
+
+
+def index_record(manifest: dict, dataset: str, branch: str, version: str) -> dict:
+    """
+    Creates the "add" record of a version from its manifest.
+    """
+    files = manifest.get("files", {})
+    return {
+        "op": "add",
+        "dataset": dataset,
+        "branch": branch,
+        "version": version,
+        "function": manifest.get("function", None),
+        "created": manifest.get("created", None),
+        "bytes": manifest.get("bytes", 0),
+        "files": len(files) if isinstance(files, dict) else files,
+    }
+
+
+def file_entries(version_path: Path, previous: dict | None = None) -> dict[str, dict]:
+    """
+    Computes size and checksum of all files of a version directory except metadata.
+
+    Args:
+        version_path: Path to the version directory
+        previous: Entries of an earlier call, reused for files of unchanged size.
+            Only pass them if the files are never modified in place.
+
+    Returns:
+        Dictionary mapping the path relative to the version directory to
+        {"bytes": size, "checksum": blake2b hex digest}
+    """
+    entries = {}
+    for p in sorted(version_path.rglob("*")):
+        rel = p.relative_to(version_path)
+        if any(part.startswith(".") for part in rel.parts) or not p.is_file():
+            continue
+        known = (previous or {}).get(rel.as_posix(), None)
+        if known is not None and known["bytes"] == p.stat().st_size:
+            entries[rel.as_posix()] = known
+            continue
+        entries[rel.as_posix()] = {
+            "bytes": p.stat().st_size,
+            "checksum": file_checksum(p),
+        }
+    return entries
+
+
+def file_checksum(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(CHECKSUM_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def verify_version(version_path: Path) -> list[str]:
+    """
+    Verifies the files of a version against the checksums of its manifest.
+
+    Returns:
+        List of problems, empty if the version is intact
+    """
+    manifest_path = version_path / MANIFEST_NAME
+    if not manifest_path.is_file():
+        return [f"{version_path}: no manifest"]
+    with open(manifest_path, "r") as f:
+        files = json.load(f).get("files", None)
+    if not isinstance(files, dict):
+        return [f"{version_path}: manifest has no checksums"]
+
+    problems = []
+    for rel, entry in files.items():
+        p = version_path / rel
+        if not p.is_file():
+            problems.append(f"{p}: missing")
+        elif p.stat().st_size != entry["bytes"]:
+            problems.append(f"{p}: size {p.stat().st_size} != {entry['bytes']}")
+        elif file_checksum(p) != entry["checksum"]:
+            problems.append(f"{p}: checksum mismatch")
+    return problems
+
+
+def _write_index(root: Path, records) -> None:
+    path = index_path(root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{INDEX_NAME}.tmp")
+    with open(tmp_path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _subdirs(path: Path) -> list[Path]:
+    if not path.is_dir():
+        return []
+    return sorted(
+        p for p in path.iterdir() if p.is_dir() and not p.name.startswith(".")
+    )
@@ -0,0 +1,343 @@
+"""
+Instrumentation hooks for the tracking and loading code paths.
+
+Instrumented code opens spans around the interesting steps (function execution,
+branch resolution, version resolution, serialization of each output, loading of
+each artifact). A finished span is turned into an `Event` and handed to every
+registered sink. When no sink is registered `span` returns a shared no-op object,
+so disabled instrumentation only costs a list truthiness check.
+
+Usage:
+    summary = SummarySink()
+    with instrument(summary, JsonLinesSink("trace.jsonl")):
+        my_tracked_function(...)
+    print(summary.report())
+
+Setting the environment variable AUTO_TRACK_TRACE to a file path registers a
+`JsonLinesSink` for that file on import.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable
+
+from loguru import logger
+
+_sinks: list = []
+_current_func: ContextVar[str | None] = ContextVar("auto_track_func", default=None)
+
+
+@dataclass
+class Event:
+    """
+    A finished instrumentation span.
+
+    Attributes:
+        name: Name of the step, e.g. "track.execute" or "load.object"
+        func: Name of the tracked function or dataset the step belongs to
+        duration: Wall clock duration of the step in seconds
+        timestamp: Unix timestamp of the start of the step
+        bytes_written: Number of bytes written to disk during the step
+        bytes_read: Number of bytes read from disk during the step
+        files: Number of files written or read during the step
+        cache_hit: Whether the step could reuse existing state, None if not applicable
+        path: Path the step operated on, if any
+        extra: Any additional step specific fields
+    """
+
+    name: str
+    func: str | None
+    duration: float
+    timestamp: float
+    bytes_written: int = 0
+    bytes_read: int = 0
+    files: int = 0
+    cache_hit: bool | None = None
+    path: str | None = None
+    extra: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class _Span(object):
+    __slots__ = ("name", "func", "fields", "_start", "_wall", "_token")
+
+    def __init__(self, name: str, func: str | None, fields: dict) -> None:
+        self.name = name
+        self.func = func if func is not None else _current_func.get()
+        self.fields = fields
+        self._token = None
+
+    def __enter__(self):
+        if self.func is not None:
+            self._token = _current_func.set(self.func)
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *args):
+        duration = time.perf_counter() - self._start
+        if self._token is not None:
+            _current_func.reset(self._token)
+        if exc_type is not None:
+            self.fields.setdefault("error", exc_type.__name__)
+
+        known = {
+            k: self.fields.pop(k)
+            for k in ("bytes_written", "bytes_read", "files", "cache_hit", "path")
+            if k in self.fields
+        }
+        if "path" in known:
+            known["path"] = str(known["path"])
+        emit(
+            Event(
+                name=self.name,
+                func=self.func,
+                duration=duration,
+                timestamp=self._wall,
+                extra=self.fields,
+                **known,
+            )
+        )
+        return False
+
+    def set(self, **fields) -> None:
+        """Sets or overwrites fields of the span."""
+        self.fields.update(fields)
+
+    def add(self, **counters) -> None:
+        """Adds to numeric fields of the span, e.g. `span.add(bytes_written=42)`."""
+        for key, value in counters.items():
+            self.fields[key] = self.fields.get(key, 0) + value
+
+    def __bool__(self) -> bool:
+        return True
+
+
+class _NullSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def set(self, **fields) -> None:
+        pass
+
+    def add(self, **counters) -> None:
+        pass
+
+    def __bool__(self) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, func: str | None = None, **fields):
+    """
+    Opens an instrumentation span, to be used as a context manager.
+
+    The returned object is falsy if instrumentation is disabled, which allows
+    callers to skip computing expensive fields (e.g. file sizes).
+
+    Args:
+        name: Name of the step
+        func: Name of the tracked function, inherited from the enclosing span if None
+        **fields: Initial fields of the resulting event
+    """
+    if not _sinks:
+        return _NULL_SPAN
+    return _Span(name, func, fields)
+
+
+def enabled() -> bool:
+    return bool(_sinks)
+
+
+def emit(event: Event) -> None:
+    for sink in list(_sinks):
+        try:
+            sink(event)
+        except Exception as e:
+            logger.warning(f"Instrumentation sink {sink!r} failed: {e}")
+
+
+def add_sink(sink: Callable[[Event], None]):
+    """
+    Registers a sink. A sink is any callable accepting an `Event`.
+
+    Returns:
+        The registered sink, so it can be removed again with `remove_sink`
+    """
+    _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: Callable[[Event], None]) -> None:
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+
+def clear_sinks() -> None:
+    _sinks.clear()
+
+
+@contextmanager
+def instrument(*sinks: Callable[[Event], None]):
+    """
+    Registers sinks for the duration of a with block.
+    """
+    for sink in sinks:
+        add_sink(sink)
+    try:
+        yield sinks[0] if len(sinks) == 1 else sinks
+    finally:
+        for sink in sinks:
+            remove_sink(sink)
+
+
+def artifact_stats(path: Path) -> tuple[int, int]:
+    """
+    Counts files and bytes of an artifact, which is either a file or a directory.
+
+    Returns:
+        Tuple of (number of files, number of bytes)
+    """
+    if path.is_file():
+        return 1, path.stat().st_size
+
+    files, size = 0, 0
+    if path.is_dir():
+        for p in path.rglob("*"):
+            if p.is_file():
+                files += 1
+                size += p.stat().st_size
+    return files, size
+
+
+class CallbackSink(object):
+    """
+    Forwards every event to a callback, optionally only events matching a prefix.
+    """
+
+    def __init__(self, callback: Callable[[Event], None], prefix: str = "") -> None:
+        self.callback = callback
+        self.prefix = prefix
+
+    def __call__(self, event: Event) -> None:
+        if event.name.startswith(self.prefix):
+            self.callback(event)
+
+
+class LoguruSink(object):
+    """
+    Logs every event as a structured loguru record. The event fields are available
+    in `record["extra"]` for loguru handlers using `serialize=True` or custom formats.
+    """
+
+    def __init__(self, level: str = "DEBUG") -> None:
+        self.level = level
+
+    def __call__(self, event: Event) -> None:
+        logger.bind(**event.to_dict()).log(
+            self.level,
+            f"{event.name} [{event.func}] took {event.duration * 1000:.2f} ms",
+        )
+
+
+class JsonLinesSink(object):
+    """
+    Appends every event as a JSON object to a trace file, one event per line.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Event) -> None:
+        line = json.dumps(event.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+class SummarySink(object):
+    """
+    Aggregates events per tracked function and step.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def __call__(self, event: Event) -> None:
+        with self._lock:
+            func_stats = self.stats.setdefault(event.func, {})
+            s = func_stats.get(event.name, None)
+            if s is None:
+                s = func_stats[event.name] = {
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                    "bytes_written": 0,
+                    "bytes_read": 0,
+                    "files": 0,
+                    "cache_hits": 0,
+                }
+            s["count"] += 1
+            s["total"] += event.duration
+            s["max"] = max(s["max"], event.duration)
+            s["bytes_written"] += event.bytes_written
+            s["bytes_read"] += event.bytes_read
+            s["files"] += event.files
+            s["cache_hits"] += bool(event.cache_hit)
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            Dictionary of the form {func: {step: {count, total, mean, max, ...}}}
+        """
+        with self._lock:
+            return {
+                func: {
+                    name: {**s, "mean": s["total"] / s["count"]}
+                    for name, s in steps.items()
+                }
+                for func, steps in self.stats.items()
+            }
+
+    def report(self) -> str:
+        """
+        Returns:
+            Human readable table of the summary, slowest steps first
+        """
+        lines = []
+        for func, steps in self.summary().items():
+            lines.append(f"{func}:")
+            for name, s in sorted(steps.items(), key=lambda x: -x[1]["total"]):
+                lines.append(
+                    f"  {name:<24} n={s['count']:<6} total={s['total']:.4f}s "
+                    f"mean={s['mean']:.4f}s max={s['max']:.4f}s "
+                    f"written={s['bytes_written']}B read={s['bytes_read']}B "
+                    f"files={s['files']} hits={s['cache_hits']}"
+                )
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stats = {}
+
+
+if os.environ.get("AUTO_TRACK_TRACE"):
+    add_sink(JsonLinesSink(os.environ["AUTO_TRACK_TRACE"]))
@@ -0,0 +1,74 @@
+"""
+Lineage of tracked versions.
+
+While a tracked function runs, every version it reads through AutoData, and every
+version returned to it by another tracked function, is recorded. The recorded
+versions are stored in the "lineage" entry of the manifest of the written version:
+
+    "lineage": [{"dataset": "features", "branch": "main", "version": "0.2.0"}]
+
+Versions read from another registry additionally store its "root".
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import os
+from pathlib import Path
+
+from auto_track.helpers import read_manifest
+
+# (root, dataset, branch, version) of the versions read by the running tracked call
+_reads: ContextVar[list | None] = ContextVar("auto_track_reads", default=None)
+
+
+def record_read(root: Path, dataset: str, branch: str, version: str) -> None:
+    """
+    Records that the running tracked call read a version, no-op outside of calls.
+    """
+    reads = _reads.get()
+    if reads is None:
+        return
+    read = (os.path.abspath(root), dataset, branch, version)
+    if read not in reads:
+        reads.append(read)
+
+
+@contextmanager
+def track_reads():
+    """
+    Collects the versions read within the context, nested contexts collect their
+    reads separately.
+    """
+    reads = []
+    token = _reads.set(reads)
+    try:
+        yield reads
+    finally:
+        _reads.reset(token)
+
+
+def lineage_entries(root: Path, reads: list[tuple]) -> list[dict]:
+    """
+    Converts recorded reads to manifest entries, omitting the root of reads from
+    the registry at root.
+    """
+    root = os.path.abspath(root)
+    entries = []
+    for read_root, dataset, branch, version in reads:
+        entry = {"dataset": dataset, "branch": branch, "version": version}
+        if read_root != root:
+            entry["root"] = read_root
+        entries.append(entry)
+    return entries
+
+
+def upstream_versions(
+    root: Path, dataset: str, branch: str, version: str
+) -> list[dict]:
+    """
+    Versions read while a version was written, empty if it has no lineage.
+    """
+    manifest = read_manifest(Path(root) / dataset / branch / version)
+    if manifest is None:
+        return []
+    return manifest.get("lineage", [])
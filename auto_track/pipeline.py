@@ -0,0 +1,304 @@
+"""
+Make-like incremental execution of tracked functions.
+
+Steps are calls of functions decorated with versioned_auto_save. A step depends on
+the steps listed in `after` and on the steps whose outputs it read the last time it
+ran (see auto_track.lineage). Running a target only reruns the stale steps it
+depends on, independent steps run in parallel in a process pool.
+
+A step is stale if
+    - it never ran, i.e. no branch is assigned to its config or nothing is stored
+      on its branch yet
+    - its function changed since the last run (a new version would be created)
+    - no outputs are stored for its branch and version
+    - a step it depends on is stale
+    - it read a version that is no longer the current version of that branch
+    - a step it depends on was written after it
+
+Usage:
+    pipeline = Pipeline(max_workers=8)
+    pipeline.add(load_raw)
+    pipeline.add(features, at_config={"at_branch": "small"}, after=["load_raw"])
+    pipeline.add(train, after=["features"])
+    pipeline.run("train")
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+import os
+from pathlib import Path
+
+from loguru import logger
+
+from auto_track.helpers import read_manifest, version_key
+from auto_track.lineage import upstream_versions
+from auto_track.track import lookup_data_branch
+
+
+@dataclass
+class Step:
+    name: str
+    func: callable
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    after: tuple[str, ...] = ()
+
+
+@dataclass
+class StepStatus:
+    name: str
+    dataset: str
+    branch: str | None
+    version: str | None
+    stale: bool
+    reason: str | None = None
+
+
+class Pipeline(object):
+    """
+    Args:
+        max_workers: Number of processes running steps in parallel
+        processes: Run steps in a process pool, otherwise one after another in the
+            current process
+        mp_context: Multiprocessing context of the process pool
+    """
+
+    def __init__(
+        self, max_workers: int | None = None, processes: bool = True, mp_context=None
+    ) -> None:
+        self.max_workers = max_workers
+        self.processes = processes
+        self.mp_context = mp_context
+        self.steps: dict[str, Step] = {}
+
+    def add(
+        self,
+        func: callable,
+        *args,
+        after: list[str] = (),
+        name: str | None = None,
+        **kwargs,
+    ) -> str:
+        """
+        Adds a call of a tracked function as step.
+
+        Args:
+            func: Function decorated with versioned_auto_save
+            *args: Positional arguments of the call
+            after: Names of steps that have to run before this step
+            name: Name of the step, defaults to the dataset of the function
+            **kwargs: Keyword arguments of the call, e.g. at_config
+
+        Returns:
+            Name of the step
+        """
+        info = getattr(func, "track_info", None)
+        if info is None:
+            raise ValueError(
+                f"{func.__name__} is not decorated with versioned_auto_save"
+            )
+        name = info.dataset if name is None else name
+        if name in self.steps:
+            raise ValueError(f"A step named {name} already exists")
+        self.steps[name] = Step(name, func, tuple(args), dict(kwargs), tuple(after))
+        return name
+
+    def status(self, target: str | None = None) -> dict[str, StepStatus]:
+        """
+        Determines which steps are stale.
+
+        Args:
+            target: Step to check together with the steps it depends on, defaults
+                to all steps
+
+        Returns:
+            Status of the steps in execution order
+        """
+        return self._plan(target)[0]
+
+    def _plan(self, target: str | None) -> tuple[dict[str, StepStatus], dict]:
+        targets = {name: self._target(step) for name, step in self.steps.items()}
+        dependencies = self._dependencies(targets)
+        order = self._order(dependencies, target)
+
+        producers = {
+            (root, dataset, branch): name
+            for name, (root, dataset, branch, _) in targets.items()
+            if branch is not None
+        }
+        statuses = {}
+        for name in order:
+            root, dataset, branch, version = targets[name]
+            status = StepStatus(name, dataset, branch, version, stale=False)
+            statuses[name] = status
+            status.reason = self._stale_reason(
+                name, targets, dependencies, statuses, producers
+            )
+            status.stale = status.reason is not None
+        return statuses, dependencies
+
+    def run(self, target: str | None = None, force: bool = False) -> dict:
+        """
+        Runs the stale steps a target depends on, and the target itself if stale.
+
+        Args:
+            target: Step to bring up to date, defaults to all steps
+            force: Rerun all steps regardless of their status
+
+        Returns:
+            Status of the steps before running them, see status
+        """
+        statuses, dependencies = self._plan(target)
+        to_run = [name for name, s in statuses.items() if force or s.stale]
+        for name in to_run:
+            logger.info(f"Running step {name} ({statuses[name].reason or 'forced'})")
+
+        if not self.processes:
+            for name in to_run:
+                self._call(name)
+            return statuses
+
+        remaining = set(to_run)
+        done = set()
+        running = {}
+        with ProcessPoolExecutor(self.max_workers, mp_context=self.mp_context) as pool:
+            while remaining or running:
+                for name in sorted(remaining):
+                    if dependencies[name] & set(to_run) <= done:
+                        step = self.steps[name]
+                        future = pool.submit(
+                            _run_step, step.func, step.args, step.kwargs
+                        )
+                        running[future] = name
+                remaining -= set(running.values())
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    # raises the exception of a failed step, pending steps are not run
+                    future.result()
+                    done.add(name)
+        return statuses
+
+    def _call(self, name: str) -> None:
+        step = self.steps[name]
+        _run_step(step.func, step.args, step.kwargs)
+
+    def _target(self, step: Step) -> tuple[str, str, str | None, str | None]:
+        info = step.func.track_info
+        # planning must not assign branches, a step that never ran has none yet
+        at_config, _ = info.config(step.args, step.kwargs)
+        branch = lookup_data_branch(at_config, info.root, info.func.__name__)
+        return os.path.abspath(info.root), info.dataset, branch, info.version()
+
+    def _dependencies(self, targets: dict) -> dict[str, set[str]]:
+        producers = {
+            (root, dataset, branch): name
+            for name, (root, dataset, branch, _) in targets.items()
+            if branch is not None
+        }
+        dependencies = {}
+        for name, step in self.steps.items():
+            unknown = [a for a in step.after if a not in self.steps]
+            if unknown:
+                raise ValueError(f"Step {name} depends on unknown steps {unknown}")
+            deps = set(step.after)
+            for read in self._lineage(targets[name]):
+                producer = producers.get(read[:3], None)
+                if producer is not None and producer != name:
+                    deps.add(producer)
+            dependencies[name] = deps
+        return dependencies
+
+    def _order(self, dependencies: dict, target: str | None) -> list[str]:
+        if target is not None and target not in self.steps:
+            raise ValueError(f"Unknown step {target}")
+
+        order, visiting, visited = [], set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Steps depend on each other in a cycle at {name}")
+            visiting.add(name)
+            for dep in sorted(dependencies[name]):
+                visit(dep)
+            visiting.remove(name)
+            visited.add(name)
+            order.append(name)
+
+        for name in [target] if target is not None else list(self.steps):
+            visit(name)
+        return order
+
+    def _stale_reason(
+        self, name: str, targets, dependencies, statuses, producers
+    ) -> str | None:
+        root, dataset, branch, version = targets[name]
+        if branch is None or not (Path(root) / dataset / branch).is_dir():
+            return "never run"
+        if version is None:
+            return "function changed"
+        manifest = read_manifest(Path(root) / dataset / branch / version)
+        if manifest is None:
+            return f"no outputs stored for {dataset}/{branch}/{version}"
+
+        for dep in sorted(dependencies[name]):
+            if statuses[dep].stale:
+                return f"upstream step {dep} is stale"
+            dep_root, dep_dataset, dep_branch, dep_version = targets[dep]
+            dep_manifest = read_manifest(
+                Path(dep_root) / dep_dataset / dep_branch / dep_version
+            )
+            if (
+                dep_manifest is not None
+                and dep_manifest["created"] > manifest["created"]
+            ):
+                return f"upstream step {dep} was written after {name}"
+
+        for read_root, read_dataset, read_branch, read_version in self._lineage(
+            targets[name]
+        ):
+            producer = producers.get((read_root, read_dataset, read_branch), None)
+            if producer is not None:
+                current = targets[producer][3]
+            else:
+                current = _latest_version(Path(read_root) / read_dataset / read_branch)
+            if current != read_version:
+                return (
+                    f"read {read_dataset}/{read_branch}/{read_version}, current "
+                    f"version is {current}"
+                )
+        return None
+
+    def _lineage(self, target: tuple) -> list[tuple[str, str, str, str]]:
+        root, dataset, branch, version = target
+        if branch is None or version is None:
+            return []
+        return [
+            (
+                os.path.abspath(entry.get("root", root)),
+                entry["dataset"],
+                entry["branch"],
+                entry["version"],
+            )
+            for entry in upstream_versions(root, dataset, branch, version)
+        ]
+
+
+def _run_step(func: callable, args: tuple, kwargs: dict) -> None:
+    # outputs are stored by the tracked function, returning them would only pickle
+    # them back to the scheduler
+    func(*args, **kwargs)
+
+
+def _latest_version(branch_path: Path) -> str | None:
+    if not branch_path.is_dir():
+        return None
+    versions = [
+        p.name
+        for p in branch_path.iterdir()
+        if p.is_dir() and not p.name.startswith(".")
+    ]
+    return max(versions, key=version_key, default=None)
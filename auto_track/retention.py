@@ -0,0 +1,379 @@
+"""
+Retention policies and garbage collection of stored versions.
+
+Usage:
+    policy = RetentionPolicy(keep_last=3, max_bytes=10 * 1024**3)
+    report = collect_garbage(root, policy)  # dry run
+    print(report)
+    collect_garbage(root, policy, dry_run=False)
+"""
+
+from dataclasses import dataclass, field
+import os
+from pathlib import Path
+import shutil
+import time
+import uuid
+
+from loguru import logger
+
+from auto_track.chunks import collect_chunks
+from auto_track.helpers import (
+    JsonDatabase,
+    read_manifest,
+    version_key,
+    write_manifest,
+)
+from auto_track.index import append_index, registry_lock
+from auto_track.instrumentation import artifact_stats
+
+# versions without a manifest that were modified more recently are assumed to be
+# written right now and are never collected
+IN_PROGRESS_GRACE_PERIOD = 60 * 60
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    Rules deciding which versions are deleted. A version is deleted if any rule
+    selects it, tagged versions are never deleted.
+
+    Attributes:
+        keep_last: Keep only the newest N versions of each branch
+        tagged_only: Delete all versions without a tag
+        max_bytes: Delete the oldest versions of a dataset until it uses at most
+            this many bytes
+        max_age: Delete versions older than this many seconds
+        keep_latest: Never delete the newest version of a branch
+    """
+
+    keep_last: int | None = None
+    tagged_only: bool = False
+    max_bytes: int | None = None
+    max_age: float | None = None
+    keep_latest: bool = True
+
+
+@dataclass
+class VersionInfo:
+    dataset: str
+    branch: str
+    version: str
+    path: Path
+    created: float
+    bytes: int
+    tags: list[str] = field(default_factory=list)
+    function: str | None = None
+    references: list[str] = field(default_factory=list)
+    reason: str | None = None
+
+
+@dataclass
+class GCReport:
+    dry_run: bool
+    deleted: list[VersionInfo] = field(default_factory=list)
+    kept: list[VersionInfo] = field(default_factory=list)
+    chunks_deleted: int = 0
+    chunk_bytes_freed: int = 0
+
+    @property
+    def bytes_freed(self) -> int:
+        return sum(v.bytes for v in self.deleted) + self.chunk_bytes_freed
+
+    def __str__(self) -> str:
+        verb = "Would delete" if self.dry_run else "Deleted"
+        lines = [
+            f"{verb} {len(self.deleted)} versions ({self.bytes_freed} bytes), "
+            f"kept {len(self.kept)} versions."
+        ]
+        if self.chunks_deleted:
+            lines.append(
+                f"{verb} {self.chunks_deleted} unreferenced chunks "
+                f"({self.chunk_bytes_freed} bytes)."
+            )
+        for v in self.deleted:
+            lines.append(
+                f"  - {v.dataset}/{v.branch}/{v.version} ({v.bytes} bytes): {v.reason}"
+            )
+        for v in self.kept:
+            if v.reason is not None:
+                lines.append(f"  + {v.dataset}/{v.branch}/{v.version}: {v.reason}")
+        return "\n".join(lines)
+
+
+def scan_versions(root: Path, datasets: list[str] | None = None) -> list[VersionInfo]:
+    """
+    Collects all stored versions of a registry.
+
+    Versions without a manifest that were modified within IN_PROGRESS_GRACE_PERIOD
+    are skipped, since they might still be written.
+
+    Args:
+        root: Root directory of the data registry
+        datasets: Datasets to scan, defaults to all datasets
+
+    Returns:
+        List of versions
+    """
+    root = Path(root)
+    if datasets is None:
+        datasets = [
+            p.name for p in root.iterdir() if p.is_dir() and not p.name.startswith(".")
+        ]
+
+    now = time.time()
+    versions = []
+    for dataset in datasets:
+        for branch_path in _subdirs(root / dataset):
+            for version_path in _subdirs(branch_path):
+                manifest = read_manifest(version_path)
+                if manifest is None:
+                    mtime = _latest_mtime(version_path)
+                    if now - mtime < IN_PROGRESS_GRACE_PERIOD:
+                        continue
+                    manifest = {"created": mtime}
+
+                size = manifest.get("bytes", None)
+                if size is None:
+                    size = artifact_stats(version_path)[1]
+
+                versions.append(
+                    VersionInfo(
+                        dataset=dataset,
+                        branch=branch_path.name,
+                        version=version_path.name,
+                        path=version_path,
+                        created=manifest["created"],
+                        bytes=size,
+                        tags=manifest.get("tags", []),
+                        function=manifest.get("function", None),
+                        references=manifest.get("references", []),
+                    )
+                )
+    return versions
+
+
+def select_garbage(
+    versions: list[VersionInfo], policy: RetentionPolicy, now: float | None = None
+) -> tuple[list[VersionInfo], list[VersionInfo]]:
+    """
+    Applies a retention policy to a list of versions.
+
+    Returns:
+        Tuple of (versions to delete, versions to keep)
+    """
+    now = time.time() if now is None else now
+
+    by_branch = {}
+    for v in versions:
+        by_branch.setdefault((v.dataset, v.branch), []).append(v)
+
+    delete = {}
+    for branch_versions in by_branch.values():
+        branch_versions.sort(key=lambda v: (v.created, version_key(v.version)))
+        candidates = branch_versions[:-1] if policy.keep_latest else branch_versions
+
+        for i, v in enumerate(candidates):
+            if v.tags:
+                continue
+            n_newer = len(branch_versions) - i - 1
+            if policy.keep_last is not None and n_newer >= policy.keep_last:
+                delete[id(v)] = f"more than {policy.keep_last} newer versions"
+            elif policy.max_age is not None and now - v.created > policy.max_age:
+                delete[id(v)] = f"older than {policy.max_age} seconds"
+            elif policy.tagged_only:
+                delete[id(v)] = "not tagged"
+
+    if policy.max_bytes is not None:
+        by_dataset = {}
+        for v in versions:
+            by_dataset.setdefault(v.dataset, []).append(v)
+
+        for dataset_versions in by_dataset.values():
+            size = sum(v.bytes for v in dataset_versions if id(v) not in delete)
+            protected = set()
+            if policy.keep_latest:
+                for (dataset, _), branch_versions in by_branch.items():
+                    if dataset == dataset_versions[0].dataset:
+                        protected.add(id(branch_versions[-1]))
+
+            for v in sorted(dataset_versions, key=lambda v: v.created):
+                if size <= policy.max_bytes:
+                    break
+                if id(v) in delete or id(v) in protected or v.tags:
+                    continue
+                delete[id(v)] = f"dataset exceeds {policy.max_bytes} bytes"
+                size -= v.bytes
+
+    deleted, kept = [], []
+    for v in versions:
+        if id(v) in delete:
+            v.reason = delete[id(v)]
+            deleted.append(v)
+        else:
+            kept.append(v)
+    return deleted, kept
+
+
+def collect_garbage(
+    root: Path,
+    policy: RetentionPolicy,
+    datasets: list[str] | None = None,
+    dry_run: bool = True,
+) -> GCReport:
+    """
+    Deletes versions according to a retention policy.
+
+    Versions whose files are referenced by kept versions (symlinks or "references"
+    entries of their manifest) are never deleted. While deleting, the registry lock
+    is held exclusively, so no version is written at the same time. Deleted versions
+    are first moved into root/.auto-track/trash, so readers never see partially
+    deleted versions. Chunks of chunked outputs (see auto_track.chunks) that no kept
+    version references are removed as well. Entries of data_branches.json whose
+    branch no longer exists are removed, function_versions.json is left untouched
+    since it determines future version numbers.
+
+    Args:
+        root: Root directory of the data registry
+        policy: Retention policy to apply
+        datasets: Datasets to collect, defaults to all datasets
+        dry_run: Only report what would be deleted
+
+    Returns:
+        Report of deleted and kept versions
+    """
+    root = Path(root)
+
+    with registry_lock(root, exclusive=not dry_run):
+        versions = scan_versions(root, datasets)
+        deleted, kept = select_garbage(versions, policy)
+
+        # never delete versions holding files that kept versions depend on, repeated
+        # until no newly kept version references another deletion candidate
+        referenced = set()
+        newly_kept = kept
+        while newly_kept:
+            for v in newly_kept:
+                referenced |= _referenced_paths(root, v)
+            newly_kept = [
+                v
+                for v in deleted
+                if any(_is_relative_to(p, v.path) for p in referenced)
+            ]
+            for v in newly_kept:
+                v.reason = "referenced by a kept version"
+                deleted.remove(v)
+                kept.append(v)
+
+        report = GCReport(dry_run=dry_run, deleted=deleted, kept=kept)
+        if dry_run:
+            report.chunks_deleted, report.chunk_bytes_freed = collect_chunks(
+                root, exclude=[v.path for v in deleted]
+            )
+            return report
+
+        trash = root / ".auto-track" / "trash"
+        trash.mkdir(parents=True, exist_ok=True)
+        for v in deleted:
+            target = trash / f"{v.dataset}-{v.branch}-{v.version}-{uuid.uuid4().hex}"
+            os.replace(v.path, target)
+            append_index(
+                root,
+                {
+                    "op": "delete",
+                    "dataset": v.dataset,
+                    "branch": v.branch,
+                    "version": v.version,
+                },
+            )
+            shutil.rmtree(target, ignore_errors=True)
+            logger.info(f"Deleted {v.dataset}/{v.branch}/{v.version} ({v.reason})")
+
+        _remove_empty_branches(root, deleted)
+        _prune_data_branches(root, deleted)
+        # chunks are shared by versions, only the ones no kept version uses are freed
+        report.chunks_deleted, report.chunk_bytes_freed = collect_chunks(
+            root, dry_run=False
+        )
+
+    return report
+
+
+def tag_version(root: Path, dataset: str, branch: str, version: str, tag: str) -> None:
+    """
+    Adds a tag to a version. Tagged versions are never garbage collected.
+    """
+    _update_tags(Path(root) / dataset / branch / version, add=tag)
+
+
+def untag_version(
+    root: Path, dataset: str, branch: str, version: str, tag: str
+) -> None:
+    _update_tags(Path(root) / dataset / branch / version, remove=tag)
+
+
+def _update_tags(version_path: Path, add: str | None = None, remove: str | None = None):
+    if not version_path.is_dir():
+        raise FileNotFoundError(f"Version not found at {version_path}")
+
+    manifest = read_manifest(version_path)
+    if manifest is None:
+        manifest = {"created": _latest_mtime(version_path)}
+
+    tags = [t for t in manifest.get("tags", []) if t != remove]
+    if add is not None and add not in tags:
+        tags.append(add)
+    manifest["tags"] = tags
+    write_manifest(version_path, manifest)
+
+
+def _referenced_paths(root: Path, v: VersionInfo) -> set[Path]:
+    paths = {(root / r).resolve() for r in v.references}
+    for p in v.path.rglob("*"):
+        if p.is_symlink():
+            paths.add(p.resolve())
+    return paths
+
+
+def _remove_empty_branches(root: Path, deleted: list[VersionInfo]) -> None:
+    for dataset, branch in {(v.dataset, v.branch) for v in deleted}:
+        branch_path = root / dataset / branch
+        if branch_path.is_dir() and not any(branch_path.iterdir()):
+            branch_path.rmdir()
+
+
+def _prune_data_branches(root: Path, deleted: list[VersionInfo]) -> None:
+    db_path = root / ".auto-track" / "data_branches.json"
+    if not db_path.is_file():
+        return
+
+    removed = {
+        (v.function, v.branch)
+        for v in deleted
+        if v.function is not None and not (root / v.dataset / v.branch).exists()
+    }
+    if not removed:
+        return
+
+    with JsonDatabase(db_path) as db:
+        for func_name, branch in removed:
+            func_db = db.lookup.get(func_name, {})
+            for key, entry in list(func_db.items()):
+                entry_branch = entry["branch"] if isinstance(entry, dict) else entry
+                if entry_branch == branch:
+                    del func_db[key]
+
+
+def _subdirs(path: Path) -> list[Path]:
+    if not path.is_dir():
+        return []
+    return [p for p in path.iterdir() if p.is_dir() and not p.name.startswith(".")]
+
+
+def _latest_mtime(path: Path) -> float:
+    mtimes = [p.stat().st_mtime for p in path.rglob("*")]
+    return max(mtimes, default=path.stat().st_mtime)
+
+
+def _is_relative_to(path: Path, parent: Path) -> bool:
+    return path.is_relative_to(parent.resolve())
@@ -0,0 +1,312 @@
+"""
+Read-only HTTP server exposing a registry root.
+
+Other machines read the registry through an HTTPBackend (see auto_track.storage)
+instead of copying version directories or mounting the root over NFS:
+
+    server = RegistryServer(root, host="0.0.0.0", port=8150)
+    server.serve_forever()  # or `auto-track --root <root> serve`
+
+    AutoData(cache_dir, storage=HTTPBackend("http://host:8150"))
+
+Endpoints (GET and HEAD):
+    /index/                          datasets, from the index journal
+    /index/{dataset}/                branches of a dataset
+    /index/{dataset}/{branch}/       versions of a branch
+    /objects/{dataset}/{branch}/{version}/
+                                     files of a version with size and ETag
+    /files/{dataset}/{branch}/{version}/{file}
+                                     bytes of a file or of the .manifest.json
+    /chunks/{digest}                 bytes of a chunk of a chunked output, see
+                                     auto_track.chunks
+
+Files are served with the checksum of their manifest entry as ETag (the manifest
+itself with its own checksum), support single range requests (Range: bytes=a-b)
+and conditional requests (If-None-Match). Only files listed in the manifest of a
+committed version and chunks are served, nothing else below .auto-track or outside
+of the root. Connections are kept alive (HTTP/1.1) and every request is handled in
+its own thread.
+"""
+
+import hashlib
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+from pathlib import Path
+import re
+import threading
+from urllib.parse import unquote, urlsplit
+
+from loguru import logger
+
+from auto_track.chunks import ChunkStore
+from auto_track.index import MANIFEST_NAME, RegistryIndex, index_path
+
+COPY_BUFFER_SIZE = 1024 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_DIGEST = re.compile(r"^[0-9a-f]{32}$")
+
+
+class RegistryServer(ThreadingHTTPServer):
+    """
+    Args:
+        root: Root directory of the data registry
+        host: Address to listen on
+        port: Port to listen on, 0 picks a free port (see url)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, root: Path, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.root = Path(root).resolve()
+        self.index = RegistryIndex(self.root)
+        self._manifests: dict[Path, tuple[int, dict, str]] = {}
+        self._manifests_lock = threading.Lock()
+        self._thread = None
+        super().__init__((host, port), _RegistryHandler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "RegistryServer":
+        """
+        Serves requests from a background thread until stop is called.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def list_dirs(self, parts: list[str]) -> list[str] | None:
+        """
+        Datasets, branches of a dataset or versions of a branch, None if unknown.
+        """
+        if index_path(self.root).is_file():
+            self.index.refresh()
+            keys = [
+                k for k in list(self.index.versions) if list(k[: len(parts)]) == parts
+            ]
+            if not keys and parts:
+                return None
+            return sorted({k[len(parts)] for k in keys})
+
+        path = self.root.joinpath(*parts)
+        if not path.is_dir():
+            return None
+        return sorted(
+            p.name for p in path.iterdir() if p.is_dir() and not p.name.startswith(".")
+        )
+
+    def manifest(self, version_path: Path) -> tuple[dict, str] | None:
+        """
+        Manifest of a committed version and its checksum, cached until it changes.
+        """
+        manifest_path = version_path / MANIFEST_NAME
+        try:
+            mtime = manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._manifests_lock:
+            cached = self._manifests.get(version_path, None)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        with open(manifest_path, "rb") as f:
+            data = f.read()
+        # same checksum as file_checksum, computed from the bytes that were parsed
+        manifest = json.loads(data)
+        etag = hashlib.blake2b(data, digest_size=16).hexdigest()
+        with self._manifests_lock:
+            self._manifests[version_path] = (mtime, manifest, etag)
+        return manifest, etag
+
+
+class _RegistryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: RegistryServer
+
+    def do_HEAD(self) -> None:
+        self._handle(send_body=False)
+
+    def do_GET(self) -> None:
+        self._handle(send_body=True)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _handle(self, send_body: bool) -> None:
+        path = unquote(urlsplit(self.path).path)
+        endpoint, _, rest = path.lstrip("/").partition("/")
+        parts = [p for p in rest.split("/") if p]
+        if any(p.startswith(".") and p != MANIFEST_NAME for p in parts):
+            return self._error(HTTPStatus.NOT_FOUND)
+
+        if endpoint == "index" and len(parts) <= 2:
+            names = self.server.list_dirs(parts)
+            if names is None:
+                return self._error(HTTPStatus.NOT_FOUND)
+            return self._json(names, send_body)
+        if endpoint == "objects" and len(parts) == 3:
+            return self._objects(parts, send_body)
+        if endpoint == "files" and len(parts) >= 4:
+            return self._file(parts, send_body)
+        if endpoint == "chunks" and len(parts) == 1:
+            return self._chunk(parts[0], send_body)
+        return self._error(HTTPStatus.NOT_FOUND)
+
+    def _objects(self, parts: list[str], send_body: bool) -> None:
+        found = self.server.manifest(self.server.root.joinpath(*parts))
+        if found is None:
+            return self._error(HTTPStatus.NOT_FOUND)
+        manifest, etag = found
+        prefix = "/".join(parts)
+        objects = [
+            {"key": f"{prefix}/{rel}", "size": e["bytes"], "etag": e["checksum"]}
+            for rel, e in manifest.get("files", {}).items()
+        ]
+        objects.append(
+            {
+                "key": f"{prefix}/{MANIFEST_NAME}",
+                "size": (self.server.root.joinpath(*parts, MANIFEST_NAME))
+                .stat()
+                .st_size,
+                "etag": etag,
+            }
+        )
+        self._json(objects, send_body)
+
+    def _file(self, parts: list[str], send_body: bool) -> None:
+        version_path = self.server.root.joinpath(*parts[:3])
+        found = self.server.manifest(version_path)
+        if found is None:
+            return self._error(HTTPStatus.NOT_FOUND)
+        manifest, manifest_etag = found
+
+        rel = "/".join(parts[3:])
+        if rel == MANIFEST_NAME:
+            etag = manifest_etag
+        elif rel in manifest.get("files", {}):
+            etag = manifest["files"][rel]["checksum"]
+        else:
+            return self._error(HTTPStatus.NOT_FOUND)
+
+        self._send_file(version_path / rel, etag, send_body)
+
+    def _chunk(self, digest: str, send_body: bool) -> None:
+        if _DIGEST.match(digest) is None:
+            return self._error(HTTPStatus.NOT_FOUND)
+        # chunks are content addressed, so their digest is a valid ETag
+        self._send_file(
+            ChunkStore(self.server.root).chunk_path(digest), digest, send_body
+        )
+
+    def _send_file(self, file_path: Path, etag: str, send_body: bool) -> None:
+        try:
+            f = open(file_path, "rb")
+        except FileNotFoundError:
+            return self._error(HTTPStatus.NOT_FOUND)
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if self._etag_matches(etag):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", f'"{etag}"')
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            byte_range = self._range(size)
+            if byte_range is False:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            start, end = (0, size) if byte_range is None else byte_range
+            self.send_response(
+                HTTPStatus.OK if byte_range is None else HTTPStatus.PARTIAL_CONTENT
+            )
+            if byte_range is not None:
+                self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(end - start))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", f'"{etag}"')
+            self.end_headers()
+            if send_body:
+                f.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    data = f.read(min(COPY_BUFFER_SIZE, remaining))
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    remaining -= len(data)
+
+    def _range(self, size: int) -> tuple[int, int] | None | bool:
+        """
+        Parses the Range header.
+
+        Returns:
+            (start, end) of a satisfiable single range, None to send the whole
+            file and False for an unsatisfiable range
+        """
+        header = self.headers.get("Range", None)
+        if header is None:
+            return None
+        match = _RANGE.match(header.strip())
+        if match is None:
+            # multiple or malformed ranges, the whole file is a valid response
+            return None
+        first, last = match.groups()
+        if first == "" and last == "":
+            return None
+        if first == "":
+            start, end = max(0, size - int(last)), size
+        else:
+            start = int(first)
+            end = size if last == "" else min(int(last) + 1, size)
+        if start >= size or start >= end:
+            return False
+        return start, end
+
+    def _etag_matches(self, etag: str) -> bool:
+        header = self.headers.get("If-None-Match", None)
+        if header is None:
+            return False
+        tags = [t.strip().removeprefix("W/").strip('"') for t in header.split(",")]
+        return "*" in tags or etag in tags
+
+    def _json(self, obj, send_body: bool) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _error(self, status: HTTPStatus) -> None:
+        body = json.dumps({"error": status.phrase}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
@@ -0,0 +1,265 @@
+"""
+Host wide cache of loaded arrays and tensors in shared memory.
+
+The first process loading an artifact copies it as .npy segment into a shared memory
+directory (/dev/shm), every other process on the host memory maps the same segment
+instead of reading and deserializing the artifact again. Segments are keyed by the
+artifact path and checksum, so a changed artifact never hits a stale segment.
+
+Processes hold a shared flock on each segment they have attached for as long as the
+returned array (or any view of it) is alive, which acts as reference count that is
+released automatically when a process dies. Segments without holders are evicted in
+least recently used order to stay within the memory budget.
+
+Usage:
+    cache = SharedArrayCache(budget=32 * 1024**3)
+    embeddings = AutoData(root, shared_cache=cache).get_data_from_registry("emb")
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+import hashlib
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import uuid
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on windows
+    fcntl = None
+
+from loguru import logger
+import numpy as np
+
+from auto_track.instrumentation import span
+
+SHM_CACHE_ENV = "AUTO_TRACK_SHM_DIR"
+
+
+def default_directory() -> Path:
+    if SHM_CACHE_ENV in os.environ:
+        return Path(os.environ[SHM_CACHE_ENV])
+    base = Path("/dev/shm")
+    if not base.is_dir():
+        base = Path(tempfile.gettempdir())
+    return base / "auto-track"
+
+
+@dataclass
+class CacheStats:
+    segments: int
+    bytes: int
+    in_use: int
+
+
+class SharedArrayCache(object):
+    """
+    Args:
+        budget: Maximum number of bytes of all segments, defaults to half of the
+            size of the shared memory file system
+        directory: Directory of the segments, defaults to /dev/shm/auto-track or the
+            directory in AUTO_TRACK_SHM_DIR
+    """
+
+    def __init__(self, budget: int | None = None, directory: Path | None = None):
+        if fcntl is None:  # pragma: no cover
+            raise RuntimeError("SharedArrayCache requires fcntl")
+
+        self.directory = (
+            Path(directory) if directory is not None else default_directory()
+        )
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if budget is None:
+            st = os.statvfs(self.directory)
+            budget = st.f_blocks * st.f_frsize // 2
+        self.budget = budget
+
+    def load(self, path: Path, checksum: str | None = None):
+        """
+        Returns the array (.npy, read-only) or tensor (.pt) stored at path backed by
+        a shared memory segment. Tensors are mapped copy-on-write since torch has no
+        read-only tensors, in-place operations copy the pages they modify into
+        private memory of the process. Artifacts larger than the budget, or that do
+        not fit next to segments in use, are loaded privately.
+
+        Args:
+            path: Path of the .npy or .pt artifact
+            checksum: Checksum of the artifact, defaults to its size and modification
+                time
+        """
+        path = Path(path)
+        if checksum is None:
+            st = path.stat()
+            checksum = f"{st.st_size}:{st.st_mtime_ns}:{st.st_ino}"
+        key = hashlib.blake2b(
+            f"{path.resolve()}:{checksum}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+        segment = self.directory / f"{key}.npy"
+
+        mode = "c" if path.suffix == ".pt" else "r"
+        with span("load.shm", path=path) as s:
+            array = self._attach(segment, mode)
+            if array is None:
+                with self._lock(self.directory / f"{key}.lock"):
+                    array = self._attach(segment, mode)
+                    if array is None:
+                        if not self._create(path, segment):
+                            s.set(cache_hit=False, shared=False)
+                            return _load_private(path)
+                        array = self._attach(segment, mode)
+                s.set(cache_hit=False)
+            else:
+                s.set(cache_hit=True)
+
+        if path.suffix == ".pt":
+            import torch
+
+            return torch.from_numpy(array)
+        return array
+
+    def stats(self) -> CacheStats:
+        segments, size, in_use = 0, 0, 0
+        for p in self.directory.glob("*.npy"):
+            try:
+                segments += 1
+                size += p.stat().st_size
+                with open(p, "rb") as f:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        in_use += 1
+            except FileNotFoundError:
+                continue
+        return CacheStats(segments=segments, bytes=size, in_use=in_use)
+
+    def clear(self) -> int:
+        """
+        Removes all segments that are not in use.
+
+        Returns:
+            Number of removed segments
+        """
+        with self._lock(self.directory / "cache.lock"):
+            return len(self._evict(float("inf")))
+
+    def _attach(self, segment: Path, mode: str = "r"):
+        while True:
+            try:
+                fd = os.open(segment, os.O_RDONLY)
+            except FileNotFoundError:
+                return None
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            if os.fstat(fd).st_nlink > 0:
+                break
+            # evicted between opening and locking
+            os.close(fd)
+
+        array = np.load(segment, mmap_mode=mode)
+        os.utime(segment)
+        # the shared lock is the reference of this process, it is released with the
+        # memory map, i.e. when the array and all views of it are garbage collected
+        weakref.finalize(array._mmap, os.close, fd)
+        return array
+
+    def _create(self, path: Path, segment: Path) -> bool:
+        if path.suffix == ".npy":
+            size = path.stat().st_size
+        elif path.suffix == ".pt":
+            import torch
+
+            tensor = torch.load(path)
+            try:
+                data = tensor.detach().cpu().numpy()
+            except TypeError:
+                return False  # dtypes without numpy equivalent, e.g. bfloat16
+            size = data.nbytes + 128
+        else:
+            raise ValueError(f"Only .npy and .pt artifacts can be shared, got {path}")
+
+        tmp_path = segment.with_name(f"{segment.stem}.{uuid.uuid4().hex}.tmp")
+        with self._lock(self.directory / "cache.lock"):
+            used = self._used_bytes()
+            if used + size > self.budget:
+                self._evict(used + size - self.budget)
+                used = self._used_bytes()
+            if used + size > self.budget:
+                logger.warning(
+                    f"{path} ({size} bytes) does not fit into the shared memory budget "
+                    f"of {self.budget} bytes, loading it privately."
+                )
+                return False
+            # reserve the space for other processes checking the budget
+            with open(tmp_path, "wb") as f:
+                f.truncate(size)
+
+        try:
+            if path.suffix == ".npy":
+                shutil.copyfile(path, tmp_path)
+            else:
+                with open(tmp_path, "wb") as f:
+                    np.save(f, data)
+            os.replace(tmp_path, segment)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return True
+
+    def _used_bytes(self) -> int:
+        """
+        Bytes of all segments, including segments other processes are writing.
+        """
+        used = 0
+        for p in self.directory.iterdir():
+            if p.suffix in (".npy", ".tmp"):
+                try:
+                    used += p.stat().st_size
+                except FileNotFoundError:
+                    continue
+        return used
+
+    def _evict(self, needed: float) -> list[Path]:
+        """
+        Removes least recently used segments without holders until needed bytes are
+        freed. Must be called while holding the cache lock.
+        """
+        segments = []
+        for p in self.directory.glob("*.npy"):
+            try:
+                segments.append((p.stat().st_mtime, p))
+            except FileNotFoundError:
+                continue
+
+        evicted, freed = [], 0
+        for _, p in sorted(segments):
+            if freed >= needed:
+                break
+            try:
+                with open(p, "rb") as f:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    freed += os.fstat(f.fileno()).st_size
+                    p.unlink()
+                    evicted.append(p)
+            except (BlockingIOError, FileNotFoundError):
+                continue
+        for p in evicted:
+            logger.debug(f"Evicted shared memory segment {p}")
+        return evicted
+
+    @contextmanager
+    def _lock(self, path: Path):
+        with open(path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _load_private(path: Path):
+    if path.suffix == ".pt":
+        import torch
+
+        return torch.load(path)
+    return np.load(path)
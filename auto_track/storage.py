@@ -0,0 +1,681 @@
+"""
+Storage backends of a data registry.
+
+A backend stores objects under "/" separated keys that mirror the layout of a local
+registry root (dataset/branch/version/file). LocalBackend stores them in a local
+directory, S3Backend in an S3 compatible object store (requires boto3). HTTPBackend
+reads a registry served by auto_track.server.
+
+Versions are written to a local root first and then uploaded with `upload_version`.
+`fetch_version` downloads a version into a local root acting as read-through cache,
+which is what AutoData does when it is given a storage backend.
+
+Usage:
+    storage = S3Backend("bucket", prefix="registry", endpoint_url="http://minio:9000")
+
+    @versioned_auto_save(local_root, storage=storage)
+    def compute(): ...
+
+    AutoData(cache_dir, storage=storage).get_data_from_registry("compute")
+"""
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import http.client
+import json
+import os
+from pathlib import Path
+import queue
+import threading
+from urllib.parse import quote, urlsplit
+import uuid
+
+from auto_track.chunks import CHUNKS_DIRECTORY, chunk_key, missing_chunks
+from auto_track.index import MANIFEST_NAME
+from auto_track.instrumentation import span
+
+
+@dataclass
+class ObjectInfo:
+    key: str
+    size: int
+    etag: str | None = None
+    modified: float | None = None
+
+
+class StorageBackend(ABC):
+    """
+    Interface of storage backends. Subclasses implement put, put_file, get_range,
+    stat, list_objects, list_dirs and delete, the remaining methods have generic
+    implementations.
+    """
+
+    max_workers: int = 8
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def put_file(self, key: str, path: Path) -> None:
+        raise NotImplementedError
+
+    def get(self, key: str) -> bytes:
+        return self.get_range(key, 0, None)
+
+    def get_file(self, key: str, path: Path) -> None:
+        """
+        Downloads an object to a local file, replacing the file atomically.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(self.get(key))
+        os.replace(tmp_path, path)
+
+    @abstractmethod
+    def get_range(self, key: str, start: int, end: int | None) -> bytes:
+        """
+        Reads the bytes [start, end) of an object, until the end if end is None.
+        """
+        raise NotImplementedError
+
+    def revalidate(self, key: str, data: bytes) -> bytes:
+        """
+        Returns the current content of an object of which data is a cached copy.
+        Backends supporting conditional requests avoid transferring unchanged data.
+        """
+        return self.get(key)
+
+    def get_ranges(self, key: str, ranges: list[tuple[int, int]]) -> list[bytes]:
+        """
+        Reads multiple byte ranges of an object concurrently.
+        """
+        if len(ranges) <= 1:
+            return [self.get_range(key, start, end) for start, end in ranges]
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            return list(pool.map(lambda r: self.get_range(key, *r), ranges))
+
+    @abstractmethod
+    def stat(self, key: str) -> ObjectInfo:
+        """
+        Raises:
+            FileNotFoundError: If the object does not exist
+        """
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.stat(key)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @abstractmethod
+    def list_objects(self, prefix: str = "") -> list[ObjectInfo]:
+        """
+        Lists all objects whose key starts with prefix.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_dirs(self, prefix: str = "") -> list[str]:
+        """
+        Lists the names of the "directories" directly below prefix, e.g. the branches
+        of a dataset for prefix "dataset/".
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class LocalBackend(StorageBackend):
+    """
+    Stores objects as files below a local directory.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put_file(self, key: str, path: Path) -> None:
+        with open(path, "rb") as f:
+            self.put(key, f.read())
+
+    def get_range(self, key: str, start: int, end: int | None) -> bytes:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start)
+
+    def stat(self, key: str) -> ObjectInfo:
+        st = self._path(key).stat()
+        return ObjectInfo(key=key, size=st.st_size, modified=st.st_mtime)
+
+    def list_objects(self, prefix: str = "") -> list[ObjectInfo]:
+        base = self._path(prefix.rsplit("/", 1)[0] if "/" in prefix else "")
+        if not base.is_dir():
+            return []
+        infos = []
+        for p in sorted(base.rglob("*")):
+            key = p.relative_to(self.root).as_posix()
+            if p.is_file() and key.startswith(prefix) and not p.name.endswith(".tmp"):
+                st = p.stat()
+                infos.append(ObjectInfo(key=key, size=st.st_size, modified=st.st_mtime))
+        return infos
+
+    def list_dirs(self, prefix: str = "") -> list[str]:
+        base = self._path(prefix)
+        if not base.is_dir():
+            return []
+        return sorted(
+            p.name for p in base.iterdir() if p.is_dir() and not p.name.startswith(".")
+        )
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+
+class S3Backend(StorageBackend):
+    """
+    Stores objects in an S3 compatible object store.
+
+    The boto3 client keeps a pool of up to max_pool_connections connections and is
+    shared by all threads. Files larger than multipart_threshold are uploaded and
+    downloaded in parts of multipart_chunksize bytes using max_workers threads.
+
+    Args:
+        bucket: Name of the bucket
+        prefix: Prefix of all keys, e.g. the name of the registry
+        endpoint_url: URL of the object store, None for AWS S3
+        max_pool_connections: Size of the connection pool
+        multipart_threshold: Size above which multipart transfers are used
+        multipart_chunksize: Size of the parts of multipart transfers
+        max_workers: Number of threads for multipart transfers and range reads
+        client: Existing boto3 S3 client to use
+        **client_kwargs: Additional arguments of boto3.client
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: str | None = None,
+        max_pool_connections: int = 32,
+        multipart_threshold: int = 8 * 1024 * 1024,
+        multipart_chunksize: int = 8 * 1024 * 1024,
+        max_workers: int = 8,
+        client=None,
+        **client_kwargs,
+    ) -> None:
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError as e:
+            raise ImportError(
+                "S3Backend requires boto3, install auto-track with the s3 extra."
+            ) from e
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.max_workers = max_workers
+        if client is None:
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                config=Config(max_pool_connections=max_pool_connections),
+                **client_kwargs,
+            )
+        self.client = client
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=max_workers,
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _strip(self, key: str) -> str:
+        return key[len(self.prefix) + 1 :] if self.prefix else key
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def put_file(self, key: str, path: Path) -> None:
+        self.client.upload_file(
+            str(path), self.bucket, self._key(key), Config=self.transfer_config
+        )
+
+    def get_file(self, key: str, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            self.client.download_file(
+                self.bucket, self._key(key), str(tmp_path), Config=self.transfer_config
+            )
+        except self.client.exceptions.ClientError as e:
+            tmp_path.unlink(missing_ok=True)
+            raise self._not_found(key, e)
+        os.replace(tmp_path, path)
+
+    def get_range(self, key: str, start: int, end: int | None) -> bytes:
+        kwargs = {}
+        if start != 0 or end is not None:
+            last = "" if end is None else str(end - 1)
+            kwargs["Range"] = f"bytes={start}-{last}"
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket, Key=self._key(key), **kwargs
+            )
+        except self.client.exceptions.ClientError as e:
+            raise self._not_found(key, e)
+        return response["Body"].read()
+
+    def stat(self, key: str) -> ObjectInfo:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.ClientError as e:
+            raise self._not_found(key, e)
+        return ObjectInfo(
+            key=key,
+            size=response["ContentLength"],
+            etag=response["ETag"].strip('"'),
+            modified=response["LastModified"].timestamp(),
+        )
+
+    def list_objects(self, prefix: str = "") -> list[ObjectInfo]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        infos = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix)):
+            for obj in page.get("Contents", []):
+                infos.append(
+                    ObjectInfo(
+                        key=self._strip(obj["Key"]),
+                        size=obj["Size"],
+                        etag=obj["ETag"].strip('"'),
+                        modified=obj["LastModified"].timestamp(),
+                    )
+                )
+        return infos
+
+    def list_dirs(self, prefix: str = "") -> list[str]:
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        full_prefix = (
+            self._key(prefix) if prefix else (f"{self.prefix}/" if self.prefix else "")
+        )
+        paginator = self.client.get_paginator("list_objects_v2")
+        dirs = []
+        for page in paginator.paginate(
+            Bucket=self.bucket, Prefix=full_prefix, Delimiter="/"
+        ):
+            for p in page.get("CommonPrefixes", []):
+                name = p["Prefix"][len(full_prefix) :].rstrip("/")
+                if not name.startswith("."):
+                    dirs.append(name)
+        return sorted(dirs)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    @staticmethod
+    def _not_found(key: str, error: Exception) -> Exception:
+        code = getattr(error, "response", {}).get("Error", {}).get("Code", "")
+        if code in ("404", "NoSuchKey", "NotFound"):
+            return FileNotFoundError(f"Object {key} not found")
+        return error
+
+
+class HTTPBackend(StorageBackend):
+    """
+    Reads a registry served by a RegistryServer (see auto_track.server), writing is
+    not supported.
+
+    Requests are sent over kept alive connections from a pool of up to
+    max_connections connections shared by all threads. Files larger than
+    range_size are downloaded as concurrent range requests of range_size bytes.
+    Cached manifests are revalidated with their checksum as ETag, so unchanged
+    versions only cost one request without body.
+
+    Args:
+        url: URL of the server, e.g. http://host:8150
+        max_connections: Maximum number of open connections
+        range_size: Size of the ranges large files are downloaded in
+        max_workers: Number of threads downloading ranges of a file
+        timeout: Timeout of socket operations in seconds
+    """
+
+    def __init__(
+        self,
+        url: str,
+        max_connections: int = 16,
+        range_size: int = 8 * 1024 * 1024,
+        max_workers: int = 8,
+        timeout: float = 60,
+    ) -> None:
+        parsed = urlsplit(url)
+        if parsed.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported URL scheme: {url}")
+        self.url = url.rstrip("/")
+        self.range_size = range_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._connection_class = (
+            http.client.HTTPSConnection
+            if parsed.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self._netloc = parsed.netloc
+        self._base = parsed.path.rstrip("/")
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._range_pool = ThreadPoolExecutor(max_workers)
+
+    def put(self, key: str, data: bytes) -> None:
+        raise PermissionError("HTTPBackend is read-only")
+
+    def put_file(self, key: str, path: Path) -> None:
+        raise PermissionError("HTTPBackend is read-only")
+
+    def delete(self, key: str) -> None:
+        raise PermissionError("HTTPBackend is read-only")
+
+    def get_range(self, key: str, start: int, end: int | None) -> bytes:
+        headers = {}
+        if start != 0 or end is not None:
+            last = "" if end is None else str(end - 1)
+            headers["Range"] = f"bytes={start}-{last}"
+        status, _, body = self._request("GET", self._path(key), headers, key=key)
+        if status == 416:
+            return b""
+        if status == 200 and headers:
+            # the server ignored the range
+            return body[start:end]
+        return body
+
+    def get_file(self, key: str, path: Path) -> None:
+        """
+        Downloads a file, large files as concurrent range requests.
+        """
+        size = self.stat(key).size
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+
+            def download(start: int) -> None:
+                data = self.get_range(key, start, min(start + self.range_size, size))
+                os.pwrite(fd, data, start)
+
+            list(self._range_pool.map(download, range(0, size, self.range_size)))
+        except BaseException:
+            os.close(fd)
+            tmp_path.unlink(missing_ok=True)
+            raise
+        os.close(fd)
+        os.replace(tmp_path, path)
+
+    def revalidate(self, key: str, data: bytes) -> bytes:
+        etag = hashlib.blake2b(data, digest_size=16).hexdigest()
+        status, _, body = self._request(
+            "GET", self._path(key), {"If-None-Match": f'"{etag}"'}, key=key
+        )
+        return data if status == 304 else body
+
+    def stat(self, key: str) -> ObjectInfo:
+        _, headers, _ = self._request("HEAD", self._path(key), key=key)
+        etag = headers.get("ETag", None)
+        return ObjectInfo(
+            key=key,
+            size=int(headers["Content-Length"]),
+            etag=None if etag is None else etag.strip('"'),
+        )
+
+    def list_objects(self, prefix: str = "") -> list[ObjectInfo]:
+        parts = prefix.split("/")
+        if len(parts) > 3:
+            try:
+                objects = self._get_json(f"/objects/{'/'.join(parts[:3])}/")
+            except FileNotFoundError:
+                return []
+            return [
+                ObjectInfo(key=o["key"], size=o["size"], etag=o["etag"])
+                for o in objects
+                if o["key"].startswith(prefix)
+            ]
+
+        # the server only lists files per version, so datasets, branches and
+        # versions matching the prefix are expanded first
+        parent, partial = "/".join(parts[:-1]), parts[-1]
+        infos = []
+        for name in self.list_dirs(f"{parent}/" if parent else ""):
+            if name.startswith(partial):
+                child = f"{parent}/{name}" if parent else name
+                infos += self.list_objects(f"{child}/")
+        return infos
+
+    def list_dirs(self, prefix: str = "") -> list[str]:
+        try:
+            return self._get_json(f"/index/{prefix}")
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _path(key: str) -> str:
+        if key.startswith(f"{CHUNKS_DIRECTORY}/"):
+            return f"/chunks/{key.rsplit('/', 1)[-1]}"
+        return f"/files/{key}"
+
+    def _get_json(self, path: str):
+        _, _, body = self._request("GET", path, key=path)
+        return json.loads(body)
+
+    def _request(
+        self, method: str, path: str, headers: dict | None = None, key: str = ""
+    ) -> tuple[int, http.client.HTTPMessage, bytes]:
+        with self._slots:
+            try:
+                connection = self._idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                connection = self._connect()
+                reused = False
+
+            try:
+                try:
+                    response = self._send(connection, method, path, headers)
+                except (http.client.RemoteDisconnected, ConnectionError):
+                    if not reused:
+                        raise
+                    # the server closed the idle connection in the meantime
+                    connection.close()
+                    connection = self._connect()
+                    response = self._send(connection, method, path, headers)
+                body = response.read()
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self._idle.put(connection)
+
+        if response.status == 404:
+            raise FileNotFoundError(f"Object {key} not found")
+        if response.status >= 400 and response.status != 416:
+            raise OSError(f"{method} {path} failed with status {response.status}")
+        return response.status, response.headers, body
+
+    def _connect(self) -> http.client.HTTPConnection:
+        return self._connection_class(self._netloc, timeout=self.timeout)
+
+    def _send(self, connection, method: str, path: str, headers: dict | None):
+        connection.request(method, self._base + quote(path), headers=headers or {})
+        return connection.getresponse()
+
+
+def upload_version(
+    root: Path, storage: StorageBackend, dataset: str, branch: str, version: str
+) -> int:
+    """
+    Uploads a version of a local registry to a storage backend. The manifest is
+    uploaded last, so readers only see completely uploaded versions.
+
+    Returns:
+        Number of uploaded bytes
+    """
+    version_path = Path(root) / dataset / branch / version
+    prefix = f"{dataset}/{branch}/{version}"
+
+    files = [
+        p
+        for p in sorted(version_path.rglob("*"))
+        if p.is_file() and p.name != MANIFEST_NAME and not p.name.endswith(".tmp")
+    ]
+
+    with span("storage.upload", path=prefix) as s:
+        with ThreadPoolExecutor(storage.max_workers) as pool:
+            list(
+                pool.map(
+                    lambda p: storage.put_file(
+                        f"{prefix}/{p.relative_to(version_path).as_posix()}", p
+                    ),
+                    files,
+                )
+            )
+        if (version_path / MANIFEST_NAME).is_file():
+            storage.put_file(f"{prefix}/{MANIFEST_NAME}", version_path / MANIFEST_NAME)
+            files.append(version_path / MANIFEST_NAME)
+
+        size = sum(p.stat().st_size for p in files)
+        s.set(files=len(files), bytes_written=size)
+    return size
+
+
+_fetch_locks: dict[Path, threading.Lock] = {}
+_fetch_locks_lock = threading.Lock()
+
+
+def fetch_version(
+    storage: StorageBackend, cache_root: Path, dataset: str, branch: str, version: str
+) -> Path:
+    """
+    Makes a version of a remote registry available in a local cache root.
+
+    The remote manifest is compared to the cached one. If they match and all files
+    are present the cached version is used, otherwise the files listed in the
+    manifest are downloaded concurrently and the manifest is written last.
+
+    Returns:
+        Path of the version in the cache root
+    """
+    prefix = f"{dataset}/{branch}/{version}"
+    version_path = Path(cache_root) / dataset / branch / version
+
+    with _fetch_locks_lock:
+        lock = _fetch_locks.setdefault(version_path, threading.Lock())
+
+    with lock, span("storage.fetch", path=prefix) as s:
+        local_manifest_path = version_path / MANIFEST_NAME
+        local_manifest = (
+            local_manifest_path.read_bytes() if local_manifest_path.is_file() else None
+        )
+        try:
+            if local_manifest is None:
+                remote_manifest = storage.get(f"{prefix}/{MANIFEST_NAME}")
+            else:
+                remote_manifest = storage.revalidate(
+                    f"{prefix}/{MANIFEST_NAME}", local_manifest
+                )
+        except FileNotFoundError:
+            remote_manifest = None
+
+        if remote_manifest is not None:
+            manifest = json.loads(remote_manifest)
+            files = manifest.get("files", {})
+            keys = [f"{prefix}/{rel}" for rel in files]
+            if local_manifest == remote_manifest and all(
+                (Path(cache_root) / key).is_file() for key in keys
+            ):
+                s.set(cache_hit=True)
+                return version_path
+            if local_manifest is not None and isinstance(files, dict):
+                # files with the same checksum as the cached ones are kept, files
+                # the version no longer has would be loaded as its outputs
+                cached = json.loads(local_manifest).get("files", {})
+                _remove_stale(version_path, [rel for rel in cached if rel not in files])
+                keys = [
+                    f"{prefix}/{rel}"
+                    for rel, entry in files.items()
+                    if not _is_cached(version_path / rel, entry, cached.get(rel, None))
+                ]
+        else:
+            # versions uploaded without manifest, fetch everything below the prefix
+            keys = [info.key for info in storage.list_objects(f"{prefix}/")]
+            if not keys:
+                raise FileNotFoundError(f"Version {prefix} not found in storage")
+
+        def download(keys: list[str]) -> None:
+            with ThreadPoolExecutor(storage.max_workers) as pool:
+                list(
+                    pool.map(
+                        lambda key: storage.get_file(key, Path(cache_root) / key), keys
+                    )
+                )
+
+        download(keys)
+        # chunked outputs only keep chunk lists in the version directory, their
+        # chunks are fetched into the chunk store of the cache root
+        chunk_keys = [chunk_key(d) for d in missing_chunks(cache_root, version_path)]
+        download(chunk_keys)
+        keys += chunk_keys
+
+        if remote_manifest is not None:
+            version_path.mkdir(parents=True, exist_ok=True)
+            tmp_path = version_path / f"{MANIFEST_NAME}.{uuid.uuid4().hex}.tmp"
+            tmp_path.write_bytes(remote_manifest)
+            os.replace(tmp_path, local_manifest_path)
+
+        if s:
+            size = sum((Path(cache_root) / key).stat().st_size for key in keys)
+            s.set(cache_hit=False, files=len(keys), bytes_read=size)
+    return version_path
+
+
+def _remove_stale(version_path: Path, stale: list[str]) -> None:
+    """
+    Removes cached files of a version and the directories they leave empty.
+    """
+    for rel in stale:
+        path = version_path / rel
+        path.unlink(missing_ok=True)
+        for parent in path.parents:
+            if parent == version_path or not parent.is_dir() or any(parent.iterdir()):
+                break
+            parent.rmdir()
+
+
+def _is_cached(path: Path, entry: dict, cached_entry: dict | None) -> bool:
+    return (
+        cached_entry is not None
+        and cached_entry.get("checksum", None) == entry.get("checksum", None)
+        and path.is_file()
+        and path.stat().st_size == entry.get("bytes", None)
+    )
@@ -0,0 +1,392 @@
+"""
+PyTorch datasets streaming the outputs of a tracked function from the registry.
+
+Item i of a version is the i-th row of each of its outputs, so a function returning
+(features, labels) yields (features[i], labels[i]). Arrays (.npy) and tensors (.pt)
+are memory mapped, lists of arrays or tensors (stored as one file per item) are
+loaded item by item, frames yield their rows as dictionaries. Sparse matrices are
+memory mapped as well and yield their rows as dense arrays.
+
+Usage:
+    dataset = RegistryDataset(root, "features", branch="main")
+    loader = DataLoader(dataset, batch_size=64, shuffle=True, num_workers=4)
+
+    stream = RegistryIterableDataset(root, "features", shuffle=True)
+    loader = DataLoader(stream, batch_size=64, num_workers=4)
+"""
+
+import os
+from pathlib import Path
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+
+from auto_track.auto_data import (
+    AutoData,
+    _load_sparse,
+    _read_json_lines,
+    output_paths,
+)
+from auto_track.chunks import load_chunked
+from auto_track.helpers import CHUNKS_SUFFIX, PARTS_SUFFIX, SPARSE_SUFFIX, loads_json
+from auto_track.instrumentation import span
+
+
+class _RegistryOutputs(object):
+    """
+    Opens the outputs of a version lazily and once per process, so datasets can be
+    sent to DataLoader workers without sharing file handles or memory maps.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        dataset: str,
+        branch: str = "main",
+        version: str = "latest",
+        storage=None,
+    ) -> None:
+        self.path = AutoData(root, storage=storage).get_version_path(
+            dataset, branch, version
+        )
+        self._outputs = None
+        self._pid = None
+        self._length = len(self.outputs[0]) if self.outputs else 0
+
+    @property
+    def outputs(self) -> list:
+        if self._outputs is None or self._pid != os.getpid():
+            self._outputs = [_open_output(p) for p in output_paths(self.path)]
+            self._pid = os.getpid()
+
+            lengths = {len(o) for o in self._outputs}
+            if len(lengths) > 1:
+                raise ValueError(
+                    f"Outputs of {self.path} have different lengths: {lengths}"
+                )
+        return self._outputs
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_outputs"] = None
+        state["_pid"] = None
+        return state
+
+    def _item(self, outputs: list, i: int):
+        items = tuple(o[i] for o in outputs)
+        return items[0] if len(items) == 1 else items
+
+
+class RegistryDataset(_RegistryOutputs, Dataset):
+    """
+    Map-style dataset with random access to the items of a tracked version. Use a
+    DistributedSampler to shard it across ranks.
+
+    Args:
+        root: Root directory of the data registry (local cache root with storage)
+        dataset: Name of the dataset
+        branch: Branch of the dataset
+        version: Version of the dataset, "latest" or a pattern like "1.*.*"
+        storage: Storage backend of a remote registry, see auto_track.storage
+    """
+
+    def __getitem__(self, i: int):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"Index {i} out of range for {len(self)} items")
+        return self._item(self.outputs, i)
+
+
+class RegistryIterableDataset(_RegistryOutputs, IterableDataset):
+    """
+    Iterable dataset streaming the items of a tracked version in shards of
+    consecutive items.
+
+    Shards are distributed round robin over all DataLoader workers of all ranks, so
+    every item is yielded exactly once per epoch. A background thread reads the next
+    `prefetch` shards while the items of the current shard are consumed.
+
+    Args:
+        root: Root directory of the data registry (local cache root with storage)
+        dataset: Name of the dataset
+        branch: Branch of the dataset
+        version: Version of the dataset, "latest" or a pattern like "1.*.*"
+        storage: Storage backend of a remote registry, see auto_track.storage
+        shard_size: Number of consecutive items read at once
+        prefetch: Number of shards read ahead, 0 disables the background thread
+        shuffle: Whether to shuffle the order of shards and of items within shards
+        seed: Seed of the shuffling, combined with the epoch (see set_epoch)
+        rank: Rank of this process, defaults to the torch.distributed rank
+        world_size: Number of ranks, defaults to the torch.distributed world size
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        dataset: str,
+        branch: str = "main",
+        version: str = "latest",
+        storage=None,
+        shard_size: int = 1024,
+        prefetch: int = 2,
+        shuffle: bool = False,
+        seed: int = 0,
+        rank: int | None = None,
+        world_size: int | None = None,
+    ) -> None:
+        super().__init__(root, dataset, branch, version, storage)
+        if shard_size < 1:
+            raise ValueError(f"shard_size must be positive, got {shard_size}")
+        self.shard_size = shard_size
+        self.prefetch = prefetch
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+        if rank is None or world_size is None:
+            distributed = torch.distributed.is_available() and (
+                torch.distributed.is_initialized()
+            )
+            if rank is None:
+                rank = torch.distributed.get_rank() if distributed else 0
+            if world_size is None:
+                world_size = torch.distributed.get_world_size() if distributed else 1
+        self.rank = rank
+        self.world_size = world_size
+
+    def set_epoch(self, epoch: int) -> None:
+        """
+        Sets the epoch used to shuffle, call before iterating in every epoch.
+        """
+        self.epoch = epoch
+
+    def shards(self) -> list[tuple[int, int]]:
+        """
+        (start, stop) ranges of the shards assigned to the current worker and rank.
+        """
+        shards = [
+            (start, min(start + self.shard_size, len(self)))
+            for start in range(0, len(self), self.shard_size)
+        ]
+        if self.shuffle:
+            rng = np.random.default_rng((self.seed, self.epoch))
+            shards = [shards[i] for i in rng.permutation(len(shards))]
+
+        worker = get_worker_info()
+        num_workers = 1 if worker is None else worker.num_workers
+        worker_id = 0 if worker is None else worker.id
+        consumer = self.rank * num_workers + worker_id
+        return shards[consumer :: self.world_size * num_workers]
+
+    def __iter__(self):
+        shards = self.shards()
+        rng = np.random.default_rng((self.seed, self.epoch, self.rank))
+
+        for start, stop, items in self._read_shards(shards):
+            order = range(stop - start)
+            if self.shuffle:
+                order = rng.permutation(stop - start)
+            for i in order:
+                yield self._item(items, i)
+
+    def _read_shards(self, shards: list[tuple[int, int]]):
+        if self.prefetch <= 0:
+            for start, stop in shards:
+                yield start, stop, self._read_shard(start, stop)
+            return
+
+        buffer = queue.Queue(maxsize=self.prefetch)
+        stop_event = threading.Event()
+
+        def put(item) -> bool:
+            while not stop_event.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for start, stop in shards:
+                    if not put((start, stop, self._read_shard(start, stop))):
+                        return
+                put(None)
+            except BaseException as e:
+                put(e)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while (item := buffer.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # the consumer may stop early, e.g. when a training loop breaks
+            stop_event.set()
+            thread.join()
+
+    def _read_shard(self, start: int, stop: int) -> list:
+        with span("load.shard", path=self.path, start=start, stop=stop):
+            return [_read_block(o, start, stop) for o in self.outputs]
+
+
+class _ItemFiles(object):
+    """
+    List output stored as one file per item (item_{i}.npy/.pt/.csv).
+    """
+
+    def __init__(self, paths: list[Path]) -> None:
+        self.paths = sorted(paths, key=lambda p: int(p.stem.split("_")[1]))
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, i: int):
+        return _load_file(self.paths[i])
+
+
+class _KeyedOutputs(object):
+    """
+    Dictionary output of arrays, tensors or frames, item i is {key: value[i]}.
+    """
+
+    def __init__(self, outputs: dict) -> None:
+        self.outputs = outputs
+        lengths = {len(o) for o in outputs.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Values of dictionary have different lengths: {lengths}")
+        self.length = lengths.pop() if lengths else 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, i: int) -> dict:
+        return {key: o[i] for key, o in self.outputs.items()}
+
+
+class _Rows(object):
+    """
+    Frame output, item i is the i-th row as dictionary.
+    """
+
+    def __init__(self, frame: pd.DataFrame) -> None:
+        self.frame = frame
+        self.columns = [str(c) for c in frame.columns]
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def __getitem__(self, i: int) -> dict:
+        return dict(zip(self.columns, self.frame.iloc[i].tolist()))
+
+
+class _SparseRows(object):
+    """
+    Sparse matrix output, item i is the i-th row as dense array.
+    """
+
+    def __init__(self, matrix) -> None:
+        self.matrix = matrix.tocsr()
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.matrix[[i]].toarray()[0]
+
+
+class _Chunks(object):
+    """
+    Appendable array or tensor output, indexed across its memory mapped parts.
+    """
+
+    def __init__(self, chunks: list) -> None:
+        self.chunks = chunks
+        self.offsets = np.cumsum([0] + [len(c) for c in chunks])
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def __getitem__(self, i: int):
+        chunk = int(np.searchsorted(self.offsets, i, side="right")) - 1
+        return self.chunks[chunk][i - self.offsets[chunk]]
+
+
+def _open_output(path: Path):
+    if path.suffix == PARTS_SUFFIX:
+        parts = sorted(p for p in path.iterdir() if p.name.startswith("part_"))
+        if parts and parts[0].suffix in (".npy", ".pt"):
+            return _Chunks([_open_file(p) for p in parts])
+        # tables and records are small enough to be concatenated in memory
+        data = AutoData(path.parent)._load_parts(path)
+        return _Rows(data) if isinstance(data, pd.DataFrame) else data
+    if path.suffix == SPARSE_SUFFIX:
+        return _SparseRows(_load_sparse(path, lazy=True))
+    if path.is_dir():
+        files = [p for p in sorted(path.iterdir()) if not p.name.startswith(".")]
+        if files and files[0].name.startswith("item_"):
+            return _ItemFiles(files)
+        return _KeyedOutputs({p.stem: _open_file(p) for p in files})
+    return _open_file(path)
+
+
+def _open_file(path: Path):
+    if path.suffix == ".npy":
+        return np.load(path, mmap_mode="r")
+    elif path.suffix == ".pt":
+        return torch.load(path, mmap=True)
+    elif path.suffix == ".csv":
+        return _Rows(pd.read_csv(path))
+    elif path.suffix == CHUNKS_SUFFIX:
+        return load_chunked(path)
+    elif path.suffix == ".jsonl":
+        return _read_json_lines(path)
+    elif path.suffix == ".json":
+        with open(path, "rb") as f:
+            obj = loads_json(f.read())
+        if not isinstance(obj, list):
+            raise ValueError(f"Only lists can be indexed, {path} stores {type(obj)}")
+        return obj
+    raise ValueError(f"Unsupported file type: {path.suffix}")
+
+
+def _load_file(path: Path):
+    if path.suffix == ".npy":
+        return np.load(path)
+    elif path.suffix == ".pt":
+        return torch.load(path)
+    elif path.suffix == ".csv":
+        return pd.read_csv(path)
+    raise ValueError(f"Unsupported file type: {path.suffix}")
+
+
+def _read_block(output, start: int, stop: int):
+    """
+    Reads the items [start, stop) of an output into memory with a single read where
+    possible. Items of the block are indexed relative to start.
+    """
+    if isinstance(output, np.ndarray):
+        return np.array(output[start:stop])
+    elif isinstance(output, torch.Tensor):
+        return output[start:stop].clone()
+    elif isinstance(output, _Rows):
+        return _Rows(output.frame.iloc[start:stop].reset_index(drop=True))
+    elif isinstance(output, _SparseRows):
+        # slicing rows of a CSR matrix only reads the data of the selected rows
+        return _SparseRows(output.matrix[start:stop])
+    elif isinstance(output, _KeyedOutputs):
+        return _KeyedOutputs(
+            {key: _read_block(o, start, stop) for key, o in output.outputs.items()}
+        )
+    return [output[i] for i in range(start, stop)]
@@ -1,66 +1,346 @@
+import asyncio
 from dataclasses import dataclass
+import difflib
 import functools
-import json
+import inspect
+import os
 from pathlib import Path
+import sys
+import time
 import uuid
 
 from loguru import logger
 
-from auto_track.helpers import save_object
+from auto_track.chunks import ChunkStore
+from auto_track.fingerprint import (
+    config_fingerprint,
+    input_fingerprint,
+    readable_config,
+)
+from auto_track.helpers import (
+    JsonDatabase,
+    append_object,
+    read_manifest,
+    save_object,
+    write_manifest,
+)
+from auto_track.index import append_index, file_entries, index_record, registry_lock
+from auto_track.instrumentation import span
+from auto_track.lineage import lineage_entries, record_read, track_reads
+
+
+INPUTS_CONFIG_KEY = "__inputs__"
+CHANGE_MSG_ENV = "AUTO_TRACK_CHANGE_MSG"
+NON_INTERACTIVE_ENV = "AUTO_TRACK_NON_INTERACTIVE"
 
 
 def versioned_auto_save(
-    root, dataset_name: str | None = None, output_names: tuple[str] | str | None = None
+    root,
+    dataset_name: str | None = None,
+    output_names: tuple[str] | str | None = None,
+    change_msg: str | None = None,
+    interactive: bool | None = None,
+    fingerprint_inputs: bool = False,
+    skip_existing: bool = False,
+    storage=None,
+    append: bool = False,
+    chunk_size: int | None = None,
 ):
     """
     Decorator to save the output of a function to a file.
 
     The output will be saved to a dicrectory with the same name as the function.
+    Next to the outputs, a manifest (.manifest.json) with the function, branch,
+    version, output names and input fingerprint is written.
+
+    Args:
+        root: Root directory of the data registry
+        dataset_name: Name of the dataset, defaults to the name of the function
+        output_names: Names of the outputs, defaults to output_{i}
+        change_msg: Change message recorded if the function version changes,
+            see get_function_version
+        interactive: Whether to prompt for change messages, see get_function_version
+        fingerprint_inputs: Whether to fingerprint the call arguments (except
+            at_config). Calls with different inputs are stored on separate branches
+            named "{at_branch or 'main'}-{fingerprint[:12]}".
+        skip_existing: If the outputs for the same inputs, config and function
+            version are already stored, load and return them instead of calling
+            the function. Only takes effect with fingerprint_inputs.
+        storage: Storage backend each written version is uploaded to after it was
+            committed locally, see auto_track.storage
+        append: Append the outputs to the outputs already stored for the same
+            branch and version instead of replacing them, see append_object.
+            AutoData returns the concatenation of all appended outputs.
+        chunk_size: Store array and tensor outputs of at least chunk_size bytes as
+            deduplicated chunks shared by all versions, see auto_track.chunks. Not
+            supported together with storage and append.
+
+    Branch and version of a call are only assigned once the function returned, so a
+    call that raises leaves the registry unchanged.
+
+    Coroutine functions (async def) are supported as well. The wrapper awaits the
+    coroutine on the event loop and resolves, loads and saves outputs in the default
+    executor of the loop, so storing large outputs does not block other tasks.
     """
 
+    if chunk_size is not None and (storage is not None or append):
+        raise ValueError("chunk_size can not be combined with storage or append")
+
     def inner(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            outputs = func(*args, **kwargs)
+        info = TrackInfo(
+            func=func,
+            root=root,
+            dataset=func.__name__ if dataset_name is None else dataset_name,
+            fingerprint_inputs=fingerprint_inputs,
+        )
+
+        def prepare(args: tuple, kwargs: dict, call) -> tuple:
+            """
+            Fingerprints the inputs of a call and looks up outputs stored for them.
+            Nothing is recorded, branch and version are only assigned once the
+            function returned, so a call that raises leaves no trace.
+
+            Returns:
+                Tuple of (branch config, input fingerprint, (branch name, version,
+                version path) of the stored outputs to return or None)
+            """
+            at_config, inputs = info.config(args, kwargs)
+            if not skip_existing or inputs is None:
+                return at_config, inputs, None
+
+            branch_name = lookup_data_branch(at_config, root, func.__name__)
+            version = lookup_function_version(func, root)
+            if branch_name is None or version is None:
+                return at_config, inputs, None
+
+            path = get_output_path(info.dataset, root) / branch_name / version
+            manifest = read_manifest(path)
+            if manifest is None or manifest.get("inputs", None) != inputs:
+                return at_config, inputs, None
+
+            logger.info(
+                f"Outputs of {func.__name__} for identical inputs are already "
+                f"stored at {path}."
+            )
+            call.set(branch=branch_name, version=version, cache_hit=True)
+            return at_config, inputs, (branch_name, version, path)
 
-            if dataset_name is None:
-                path = get_output_path(func.__name__, root)
-            else:
-                path = get_output_path(dataset_name, root)
+        def store(outputs, reads: list, at_config: dict | None, inputs, call) -> tuple:
+            """
+            Assigns branch and version of a call and saves its outputs.
 
-            at_config = kwargs.get("at_config", None)
+            Returns:
+                Tuple of (branch name, version)
+            """
+            dataset = info.dataset
             branch_name = get_data_branch(at_config, root, func.__name__)
-            version = get_function_version(func, root)
+            version = get_function_version(
+                func, root, change_msg=change_msg, interactive=interactive
+            )
+            call.set(branch=branch_name, version=version)
+            path = get_output_path(dataset, root) / branch_name / version
+
+            # writers share the registry lock, garbage collection holds it exclusively
+            with registry_lock(root):
+                previous = read_manifest(path) if append else None
+                chunks = None if chunk_size is None else ChunkStore(root, chunk_size)
+                names = save_outputs(
+                    outputs, path, output_names, append=append, chunks=chunks
+                )
+                # parts of appendable outputs are immutable, only new ones are hashed
+                files = file_entries(
+                    path, previous=None if previous is None else previous["files"]
+                )
+                manifest = {
+                    "function": func.__name__,
+                    "dataset": dataset,
+                    "branch": branch_name,
+                    "version": version,
+                    "created": time.time(),
+                    "outputs": names,
+                    "tuple": isinstance(outputs, tuple),
+                    "inputs": inputs,
+                    "lineage": lineage_entries(root, reads),
+                    "files": files,
+                    "bytes": sum(f["bytes"] for f in files.values()),
+                }
+                write_manifest(path, manifest)
+                append_index(
+                    root, index_record(manifest, dataset, branch_name, version)
+                )
+
+            if storage is not None:
+                from auto_track.storage import upload_version
 
-            path = path / branch_name / version
+                upload_version(root, storage, dataset, branch_name, version)
+            return branch_name, version
 
-            if isinstance(outputs, tuple):
-                if output_names is not None and len(output_names) != len(outputs):
-                    raise ValueError(
-                        f"Number of output names ({len(output_names)}) must match number of outputs ({len(outputs)})."
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                # registry lookups, loading and saving run in the default executor
+                # of the event loop, only the function itself runs on the loop
+                with span("track.call", func=func.__name__) as call:
+                    at_config, inputs, existing = await asyncio.to_thread(
+                        prepare, args, kwargs, call
                     )
-                for i, output in enumerate(outputs):
-                    if output_names is not None:
-                        save_object(output, path / f"{output_names[i]}")
-                    else:
-                        save_object(output, path / f"output_{i}")
-            else:
-                if output_names is not None:
-                    if isinstance(output_names, tuple):
-                        raise ValueError(
-                            "Output names must be a string for a function with a single return value."
-                        )
-                    save_object(outputs, path / output_names)
-                else:
-                    save_object(outputs, path / "output")
+                    if existing is not None:
+                        branch_name, version, path = existing
+                        record_read(root, info.dataset, branch_name, version)
+                        return await asyncio.to_thread(_load_existing, path)
 
+                    with span("track.execute"), track_reads() as reads:
+                        outputs = await func(*args, **kwargs)
+
+                    branch_name, version = await asyncio.to_thread(
+                        store, outputs, reads, at_config, inputs, call
+                    )
+
+                record_read(root, info.dataset, branch_name, version)
+                return outputs
+
+            async_wrapper.track_info = info
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span("track.call", func=func.__name__) as call:
+                at_config, inputs, existing = prepare(args, kwargs, call)
+                if existing is not None:
+                    branch_name, version, path = existing
+                    record_read(root, info.dataset, branch_name, version)
+                    return _load_existing(path)
+
+                with span("track.execute"), track_reads() as reads:
+                    outputs = func(*args, **kwargs)
+
+                branch_name, version = store(outputs, reads, at_config, inputs, call)
+
+            # outputs returned to an enclosing tracked call are consumed by it
+            record_read(root, info.dataset, branch_name, version)
             return outputs
 
+        wrapper.track_info = info
         return wrapper
 
     return inner
 
 
+@dataclass
+class TrackInfo:
+    """
+    Settings of a tracked function, available as `track_info` attribute of the
+    decorated function.
+    """
+
+    func: callable
+    root: Path
+    dataset: str
+    fingerprint_inputs: bool = False
+
+    def config(self, args: tuple, kwargs: dict) -> tuple[dict | None, str | None]:
+        """
+        Config the branch of a call is looked up with, see get_data_branch.
+
+        Returns:
+            Tuple of (branch config, input fingerprint or None)
+        """
+        at_config = kwargs.get("at_config", None)
+        inputs = None
+        if self.fingerprint_inputs:
+            with span("track.fingerprint"):
+                inputs = input_fingerprint(args, kwargs, exclude=("at_config",))
+            at_config = dict(at_config or {})
+            at_config["at_branch"] = (
+                f"{at_config.get('at_branch', 'main')}-{inputs[:12]}"
+            )
+            at_config[INPUTS_CONFIG_KEY] = inputs
+        return at_config, inputs
+
+    def branch(self, args: tuple, kwargs: dict) -> tuple[str, str | None]:
+        """
+        Branch the outputs of a call are stored on.
+
+        Returns:
+            Tuple of (branch name, input fingerprint or None)
+        """
+        at_config, inputs = self.config(args, kwargs)
+        return get_data_branch(at_config, self.root, self.func.__name__), inputs
+
+    def version(self) -> str | None:
+        """
+        Version the outputs of a call are stored as, None if calling the function
+        would create a new version.
+        """
+        return lookup_function_version(self.func, self.root)
+
+
+def save_outputs(
+    outputs,
+    path: Path,
+    output_names: tuple[str] | str | None = None,
+    append: bool = False,
+    chunks=None,
+) -> list[str]:
+    """
+    Saves the outputs of a tracked function to a version directory.
+
+    Args:
+        outputs: Return value of the function, tuples are saved as separate outputs
+        path: Path to the version directory
+        output_names: Names of the outputs, defaults to output_{i}
+        append: Append the outputs to the stored ones, see append_object
+        chunks: Chunk store large arrays and tensors are stored in, see save_object
+
+    Returns:
+        Names of the saved outputs in the order they were returned
+    """
+    if append:
+        save = append_object
+    else:
+        save = functools.partial(save_object, chunks=chunks)
+    if isinstance(outputs, tuple):
+        if output_names is not None and len(output_names) != len(outputs):
+            raise ValueError(
+                f"Number of output names ({len(output_names)}) must match number of outputs ({len(outputs)})."
+            )
+        names = [
+            output_names[i] if output_names is not None else f"output_{i}"
+            for i in range(len(outputs))
+        ]
+        for name, output in zip(names, outputs):
+            save(output, path / name)
+    else:
+        if output_names is not None:
+            if isinstance(output_names, tuple):
+                raise ValueError(
+                    "Output names must be a string for a function with a single return value."
+                )
+            names = [output_names]
+        else:
+            names = ["output"]
+        save(outputs, path / names[0])
+
+    return names
+
+
+def _load_existing(path: Path):
+    """
+    Loads the outputs stored in a version directory in the order they were returned.
+    """
+    from auto_track.auto_data import AutoData
+
+    dataset_path = path.parent.parent
+    outputs = AutoData(dataset_path.parent).get_data_from_registry(
+        dataset_path.name, path.parent.name, path.name
+    )
+    manifest = read_manifest(path)
+    if manifest.get("tuple", False) and not isinstance(outputs, tuple):
+        outputs = (outputs,)
+    return outputs
+
+
 def get_output_path(dataset_name: str, root: Path):
     """
     Get the path to save the output of a function
@@ -74,66 +354,93 @@ def get_data_branch(at_config: dict | None, root: Path, func_name: str) -> str:
         - Looks up the data_branches.json file in the auto-track root/.auto-track folder
         - If the data is not found, it will return the default branch name 'main'
 
-    Database format is "{"config": "as_string"}": "branch_name"
+    Configs are identified by their canonical fingerprint (see config_fingerprint), so
+    the order of keys does not matter.
+
+    Database format is {"func_name": {"fingerprint": {"branch": "branch_name", "config": {...}}}}
+    Entries of the older format {"func_name": {"{'config': 'as_string'}": "branch_name"}}
+    are migrated when they are looked up.
     """
-    if at_config is None:
-        return "main"
+    with span("track.branch", func=func_name) as s:
+        if at_config is None:
+            return "main"
 
-    db_path = root / ".auto-track" / "data_branches.json"
+        db_path = Path(root) / ".auto-track" / "data_branches.json"
+        query_branch_name = at_config.get("at_branch", None)
+        query_config = clean_query_config(at_config)
+        fingerprint = config_fingerprint(query_config)
 
-    # fallback if no data_branches.json file exists yet
-    if not db_path.is_file():
-        logger.warning(f"No data_branches.json file found at {db_path}. Creating file.")
-        db_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(db_path, "w") as f:
-            json.dump({}, f)
+        with JsonDatabase(db_path, read_only=True) as db:
+            db_entry = db.lookup.get(func_name, {}).get(fingerprint, None)
 
-    lookup = json.load(open(db_path, "r"))
-    func_db = lookup.get(func_name, None)
-    query_branch_name = at_config.get("at_branch", None)
-    query_config = clean_query_config(at_config)
+        if db_entry is None:
+            if not db_path.is_file():
+                logger.warning(
+                    f"No data_branches.json file found at {db_path}. Creating file."
+                )
+            # looked up again under the exclusive lock, so concurrent calls with the
+            # same config agree on one branch
+            with JsonDatabase(db_path) as db:
+                func_db = db.lookup.setdefault(func_name, {})
+                db_entry = func_db.get(fingerprint, None)
+
+                if db_entry is None and str(query_config) in func_db:
+                    # migrate entry stored in the legacy format
+                    db_entry = {
+                        "branch": func_db.pop(str(query_config)),
+                        "config": readable_config(query_config),
+                    }
+                    func_db[fingerprint] = db_entry
+
+                if db_entry is None:
+                    # no branch has been stored yet for this config
+                    if query_branch_name is None:
+                        query_branch_name = str(uuid.uuid4())
+                        logger.warning(
+                            f"No branch name specified in config for {func_name}. Generated branch name: {query_branch_name}"
+                        )
 
-    if func_db is None:
-        # no branches have been stored yet for this function
-        if query_branch_name is None:
-            query_branch_name = str(uuid.uuid4())
+                    func_db[fingerprint] = {
+                        "branch": query_branch_name,
+                        "config": readable_config(query_config),
+                    }
+                    s.set(cache_hit=False)
+                    return query_branch_name
+
+        # query branch exists in database
+        s.set(cache_hit=True)
+        db_branch_name = db_entry["branch"]
+        if query_branch_name is not None and db_branch_name != query_branch_name:
             logger.warning(
-                f"No branch name specified in config for {func_name}. Generated branch name: {query_branch_name}"
+                f"You named your config: {query_branch_name}. \n"
+                f"The same config is already stored in the branch: "
+                f"{db_branch_name}.  \nUsing branch name already in"
+                f" database for consistency ({db_branch_name})."
             )
+        return db_branch_name
 
-        lookup[func_name] = {str(query_config): query_branch_name}
-        with open(db_path, "w") as f:
-            json.dump(lookup, f)
-        return query_branch_name
 
-    else:
-        # branches have been stored for this function / func dict exists
-        db_branch_name = func_db.get(str(query_config), None)
+def lookup_data_branch(
+    at_config: dict | None, root: Path, func_name: str
+) -> str | None:
+    """
+    Looks up the branch of a config without assigning one, see get_data_branch.
 
-        if db_branch_name is None:
-            # no branch has been stored yet for this config
-            if query_branch_name is None:
-                query_branch_name = str(uuid.uuid4())
-                logger.warning(
-                    f"No branch name specified in config for {func_name}. Generated branch name: {query_branch_name}"
-                )
+    Returns:
+        Name of the branch, None if no branch was assigned to the config yet
+    """
+    if at_config is None:
+        return "main"
 
-            lookup[func_name][str(query_config)] = query_branch_name
-            with open(db_path, "w") as f:
-                json.dump(lookup, f)
-            return query_branch_name
-        else:
-            # query branch exists in database
-            if db_branch_name == query_branch_name:
-                return db_branch_name
-            else:
-                logger.warning(
-                    f"You named your config: {query_branch_name}. \n"
-                    f"The same config is already stored in the branch: "
-                    f"{db_branch_name}.  \nUsing branch name already in"
-                    f" database for consistency ({db_branch_name})."
-                )
-                return db_branch_name
+    query_config = clean_query_config(at_config)
+    db_path = Path(root) / ".auto-track" / "data_branches.json"
+    with JsonDatabase(db_path, read_only=True) as db:
+        func_db = db.lookup.get(func_name, {})
+        db_entry = func_db.get(config_fingerprint(query_config), None)
+        if db_entry is None:
+            # entry stored in the legacy format
+            return func_db.get(str(query_config), None)
+    return db_entry["branch"]
 
 
 def clean_query_config(config: dict) -> dict:
@@ -143,12 +450,29 @@ def clean_query_config(config: dict) -> dict:
     return {k: v for k, v in config.items() if not k.startswith("at_")}
 
 
-def get_function_version(func: callable, root: Path) -> str:
+def get_function_version(
+    func: callable,
+    root: Path,
+    change_msg: str | None = None,
+    interactive: bool | None = None,
+) -> str:
     """
     Get the version of a function
 
+    If the version changes, a change message is recorded. It is taken from (in order):
+        - the change_msg argument
+        - the AUTO_TRACK_CHANGE_MSG environment variable
+        - an input() prompt, if running interactively
+        - an automatically generated summary of the change including a docstring diff.
+          These versions are marked as pending annotation and can be annotated later
+          with `auto-track annotate`.
+
     Args:
         func: Function to get the version of
+        root: Root directory of the data registry
+        change_msg: Change message to record if the version changes
+        interactive: Whether to prompt for a change message. If None, prompts only if
+            stdin is a terminal and AUTO_TRACK_NON_INTERACTIVE is not set.
 
     Returns:
         Version of the function
@@ -161,21 +485,25 @@ def get_function_version(func: callable, root: Path) -> str:
             " of your functions generated data!"
         )
 
-    func_code = str(func.__code__.co_code)
-    func_constants = str(func.__code__.co_consts)
-    func_defaults_str = str(func.__defaults__)
-    func_patch = func_constants + func_defaults_str
+    func_code, func_patch = _code_keys(func)
+
+    with span("track.version", func=func.__name__) as s, FunctionDatabase(root) as db:
+        func_db = db.lookup.get(func.__name__, None)
 
-    with FunctionDatabase(root) as db:
-        if db.lookup.get(func.__name__, None) is None:
+        if func_db is None:
             logger.info("Function is not yet in database. Starting with version 0.0.0")
 
             db.lookup[func.__name__] = {
                 "__last_versions": [str(signature)],
+                "__next_major": 1,
                 str(signature): {
                     "__last_versions": [func_code],
+                    "__major": 0,
+                    "__next_minor": 1,
                     func_code: {
                         "__last_versions": [func_patch],
+                        "__minor": 0,
+                        "__next_patch": 1,
                         func_patch: {
                             "version": "0.0.0",
                             "docs": func.__doc__,
@@ -184,22 +512,18 @@ def get_function_version(func: callable, root: Path) -> str:
                     },
                 },
             }
+            s.set(cache_hit=False)
             return "0.0.0"
 
-        same_major = [
-            _signature
-            for _signature in db.lookup[func.__name__].keys()
-            if _signature != "__last_versions" and _signature == str(signature)
-        ]
+        if "__next_major" not in func_db:
+            build_version_index(func_db)
 
-        if len(same_major) > 1:
-            raise ValueError(
-                "Multiple functions with the same signature found in the database."
-            )
-        elif len(same_major) == 0:
-            last_version_signature = db.lookup[func.__name__]["__last_versions"][-1]
-            last_version_major = len(db.lookup[func.__name__]["__last_versions"]) - 1
-            new_version = f"{last_version_major + 1}.0.0"
+        signature_db = func_db.get(str(signature), None)
+
+        if signature_db is None:
+            last_version_signature = func_db["__last_versions"][-1]
+            major = func_db["__next_major"]
+            new_version = f"{major}.0.0"
 
             logger.info(
                 f"The signature of your function has changed! \n"
@@ -208,112 +532,82 @@ def get_function_version(func: callable, root: Path) -> str:
                 f"New version: {new_version}"
             )
 
-            change_msg = input(
-                "Describe the changes made for automatic documentation: "
+            msg, pending = resolve_change_msg(
+                func,
+                f"Signature changed from {last_version_signature} to {signature}",
+                _latest_entry(func_db).get("docs", None),
+                change_msg,
+                interactive,
             )
 
-            db.lookup[func.__name__][str(signature)] = {
+            func_db[str(signature)] = {
                 "__last_versions": [func_code],
+                "__major": major,
+                "__next_minor": 1,
                 func_code: {
                     "__last_versions": [func_patch],
+                    "__minor": 0,
+                    "__next_patch": 1,
                     func_patch: {
                         "version": new_version,
                         "docs": func.__doc__,
-                        "change_msg": change_msg,
+                        "change_msg": msg,
+                        "pending_annotation": pending,
                     },
                 },
             }
+            func_db["__last_versions"].append(str(signature))
+            func_db["__next_major"] = major + 1
 
-            if db.lookup[func.__name__].get("__last_versions", None) is None:
-                db.lookup[func.__name__]["__last_versions"] = [str(signature)]
-            else:
-                db.lookup[func.__name__]["__last_versions"].append(str(signature))
-
+            s.set(cache_hit=False)
             return new_version
-        else:
-            last_fn_signature = same_major[0]
 
-        same_minor = [
-            code
-            for code in db.lookup[func.__name__][last_fn_signature].keys()
-            if code == func_code and code != "__last_versions"
-        ]
+        major = signature_db["__major"]
+        code_db = signature_db.get(func_code, None)
 
-        if len(same_minor) > 1:
-            raise ValueError(
-                "Multiple function entries with the same code found in the database."
-            )
-        elif len(same_minor) == 0:
-            last_version_code = db.lookup[func.__name__][last_fn_signature][
-                "__last_versions"
-            ][-1]
-            last_version_minor = (
-                len(db.lookup[func.__name__][last_fn_signature]["__last_versions"]) - 1
-            )
-            last_version_major = db.lookup[func.__name__]["__last_versions"].index(
-                last_fn_signature
-            )
-            last_version_patch = (
-                len(
-                    db.lookup[func.__name__][last_fn_signature][last_version_code][
-                        "__last_versions"
-                    ]
-                )
-                - 1
-            )
+        if code_db is None:
+            last_code_db = signature_db[signature_db["__last_versions"][-1]]
+            minor = signature_db["__next_minor"]
+            new_version = f"{major}.{minor}.0"
 
             logger.info("The inner logic of your function has changed!")
             logger.info(
-                f"Updating version from {last_version_major}.{last_version_minor}.{last_version_patch} to {last_version_major}.{last_version_minor + 1}.0"
+                f"Updating version from {_latest_entry(last_code_db)['version']} to {new_version}"
             )
 
-            change_msg = input(
-                "Describe the changes made for automatic documentation: "
+            msg, pending = resolve_change_msg(
+                func,
+                "Function code changed",
+                _latest_entry(last_code_db).get("docs", None),
+                change_msg,
+                interactive,
             )
 
-            db.lookup[func.__name__][last_fn_signature][func_code] = {
+            signature_db[func_code] = {
                 "__last_versions": [func_patch],
+                "__minor": minor,
+                "__next_patch": 1,
                 func_patch: {
-                    "version": f"{last_version_major}.{last_version_minor + 1}.0",
+                    "version": new_version,
                     "docs": func.__doc__,
-                    "change_msg": change_msg,
+                    "change_msg": msg,
+                    "pending_annotation": pending,
                 },
             }
+            signature_db["__last_versions"].append(func_code)
+            signature_db["__next_minor"] = minor + 1
 
-            db.lookup[func.__name__][last_fn_signature]["__last_versions"].append(
-                func_code
-            )
+            s.set(cache_hit=False)
+            return new_version
 
-            return f"{last_version_major}.{last_version_minor + 1}.0"
-        else:
-            last_fn_code = same_minor[0]
-
-        same_patch = [
-            _patch
-            for _patch in db.lookup[func.__name__][last_fn_signature][
-                last_fn_code
-            ].keys()
-            if _patch == func_patch and _patch != "__last_versions"
-        ]
+        minor = code_db["__minor"]
+        entry = code_db.get(func_patch, None)
 
-        if len(same_patch) > 1:
-            raise ValueError(
-                "Multiple function entries with the same constants and defaults found in the database."
-            )
-        elif len(same_patch) == 0:
-            last_version_const_defaults = db.lookup[func.__name__][last_fn_signature][
-                last_fn_code
-            ]["__last_versions"][-1]
-            last_version_minor = db.lookup[func.__name__][last_fn_signature][
-                "__last_versions"
-            ].index(last_fn_code)
-            last_version_major = db.lookup[func.__name__]["__last_versions"].index(
-                last_fn_signature
-            )
-            last_version_patch = db.lookup[func.__name__][last_fn_signature][
-                last_fn_code
-            ][last_version_const_defaults]["version"][-1]
-            last_version_patch = int(last_version_patch)
+        if entry is None:
+            last_version_const_defaults = code_db["__last_versions"][-1]
+            last_entry = code_db[last_version_const_defaults]
+            patch = code_db["__next_patch"]
+            new_version = f"{major}.{minor}.{patch}"
 
             logger.info(
                 "The constants of your function have changed! \n"
@@ -321,64 +615,251 @@ def get_function_version(func: callable, root: Path) -> str:
                 f"New constants: {func_patch}"
             )
             logger.info(
-                f"Updating version from {last_version_major}.{last_version_minor}.{last_version_patch} to {last_version_major}.{last_version_minor}.{last_version_patch + 1}"
+                f"Updating version from {last_entry['version']} to {new_version}"
             )
 
-            change_msg = input(
-                "Describe the changes made for automatic documentation: "
+            msg, pending = resolve_change_msg(
+                func,
+                f"Constants or defaults changed from {last_version_const_defaults} to {func_patch}",
+                last_entry.get("docs", None),
+                change_msg,
+                interactive,
             )
 
-            db.lookup[func.__name__][last_fn_signature][last_fn_code][func_patch] = {
-                "version": f"{last_version_major}.{last_version_minor}.{last_version_patch + 1}",
+            code_db[func_patch] = {
+                "version": new_version,
                 "docs": func.__doc__,
-                "change_msg": change_msg,
+                "change_msg": msg,
+                "pending_annotation": pending,
             }
+            code_db["__last_versions"].append(func_patch)
+            code_db["__next_patch"] = patch + 1
 
-            db.lookup[func.__name__][last_fn_signature][last_fn_code][
-                "__last_versions"
-            ].append(func_patch)
+            s.set(cache_hit=False)
+            return new_version
 
-            return f"{last_version_major}.{last_version_minor}.{last_version_patch + 1}"
-        else:
-            logger.info("No version change detected")
-            return same_patch[0]["version"]
+        logger.info("No version change detected")
+        s.set(cache_hit=True)
+        return entry["version"]
 
 
-class FunctionDatabase(object):
-    def __init__(self, root) -> None:
-        path = root / ".auto-track" / "function_versions.json"
+def lookup_function_version(func: callable, root: Path) -> str | None:
+    """
+    Looks up the stored version of a function without recording a new one.
+
+    Returns:
+        Version of the function, None if the function changed since its last
+        recorded version or was never recorded
+    """
+    func_code, func_patch = _code_keys(func)
+    with FunctionDatabase(root, read_only=True) as db:
+        func_db = db.lookup.get(func.__name__, None)
+        if func_db is None:
+            return None
+        if "__next_major" not in func_db:
+            # legacy entries are indexed in memory only, see get_function_version
+            build_version_index(func_db)
+        entry = (
+            func_db.get(str(func.__annotations__), {})
+            .get(func_code, {})
+            .get(func_patch, None)
+        )
+    return None if entry is None else entry["version"]
+
+
+def _code_keys(func: callable) -> tuple[str, str]:
+    """
+    Keys of the code and of the constants and defaults of a function in the
+    function version database.
+    """
+    func_code = str(func.__code__.co_code)
+    func_constants = str(func.__code__.co_consts)
+    func_defaults_str = str(func.__defaults__)
+    return func_code, func_constants + func_defaults_str
+
+
+def build_version_index(func_db: dict) -> dict:
+    """
+    Adds the integer version counters used for O(1) version resolution to a function
+    entry of the function database that was written by an older version of auto-track.
+
+    Each signature stores its major version and the next free minor version, each code
+    entry stores its minor version and the next free patch version, and the function
+    stores the next free major version.
+
+    Args:
+        func_db: Entry of a single function in the function database, modified in place
+
+    Returns:
+        The modified function entry
+    """
+    next_major = 0
+    for signature in func_db["__last_versions"]:
+        signature_db = func_db[signature]
+        next_minor = 0
+        for code in signature_db["__last_versions"]:
+            code_db = signature_db[code]
+            versions = [
+                [int(v) for v in code_db[patch]["version"].split(".")]
+                for patch in code_db["__last_versions"]
+            ]
+            major, minor = versions[0][0], versions[0][1]
+            code_db["__minor"] = minor
+            code_db["__next_patch"] = max(v[2] for v in versions) + 1
+            signature_db["__major"] = major
+            next_minor = max(next_minor, minor + 1)
+        signature_db["__next_minor"] = next_minor
+        next_major = max(next_major, signature_db["__major"] + 1)
+    func_db["__next_major"] = next_major
+
+    return func_db
+
+
+def resolve_change_msg(
+    func: callable,
+    summary: str,
+    previous_docs: str | None,
+    change_msg: str | None = None,
+    interactive: bool | None = None,
+) -> tuple[str, bool]:
+    """
+    Resolves the change message for a version bump without blocking non-interactive runs.
+
+    Args:
+        func: Function whose version changed
+        summary: Automatically generated summary of the change
+        previous_docs: Docstring of the previous version
+        change_msg: Explicitly provided change message
+        interactive: Whether to prompt for a change message, see get_function_version
+
+    Returns:
+        Tuple of (change message, whether the message still needs to be annotated)
+    """
+    if change_msg is not None:
+        return change_msg, False
+
+    env_msg = os.environ.get(CHANGE_MSG_ENV, None)
+    if env_msg:
+        return env_msg, False
+
+    if interactive is None:
+        interactive = (
+            os.environ.get(NON_INTERACTIVE_ENV, "").lower() not in ("1", "true", "yes")
+            and sys.stdin is not None
+            and sys.stdin.isatty()
+        )
+
+    if interactive:
+        msg = input("Describe the changes made for automatic documentation: ")
+        return msg, False
+
+    msg = summary
+    docs_diff = _docs_diff(previous_docs, func.__doc__)
+    if docs_diff:
+        msg += f"\nDocstring changes:\n{docs_diff}"
+
+    logger.info(
+        f"Recorded automatic change message for {func.__name__}. "
+        "Use `auto-track annotate` to describe the change later."
+    )
+    return msg, True
 
-        if not path.is_file():
-            logger.warning(
-                f"No function_versions.json file found at {path}. Creating file."
-            )
-            path.parent.mkdir(parents=True, exist_ok=True)
-            with open(path, "w") as f:
-                json.dump({}, f)
 
-        self.path = path
-        self.lookup = None
+def _docs_diff(old: str | None, new: str | None) -> str:
+    """
+    Returns a compact line diff between two docstrings, empty if they are equal.
+    """
+    if old == new:
+        return ""
+
+    diff = difflib.unified_diff(
+        (old or "").strip().splitlines(),
+        (new or "").strip().splitlines(),
+        lineterm="",
+        n=0,
+    )
+    return "\n".join(
+        line
+        for line in diff
+        if not line.startswith(("---", "+++", "@@")) and line.strip("+- ")
+    )
+
+
+def _latest_entry(func_lookup: dict) -> dict:
+    """
+    Follows the __last_versions lists down to the most recently added version entry.
+    """
+    while "version" not in func_lookup:
+        func_lookup = func_lookup[func_lookup["__last_versions"][-1]]
+    return func_lookup
 
-    def __enter__(self):
-        with open(self.path, "r") as f:
-            self.lookup = json.load(f)
 
-        return self
+class FunctionDatabase(JsonDatabase):
+    """
+    Args:
+        root: Root directory of the data registry
+        read_only: Only read the database under a shared lock, see JsonDatabase
+    """
 
-    def __exit__(self, *args):
-        with open(self.path, "w") as f:
-            json.dump(self.lookup, f)
-        self.lookup = None
+    def __init__(self, root, read_only: bool = False) -> None:
+        path = Path(root) / ".auto-track" / "function_versions.json"
+        if not path.is_file() and not read_only:
+            logger.warning(
+                f"No function_versions.json file found at {path}. Creating file."
+            )
+        super().__init__(path, read_only=read_only)
 
     def get_func_versions(self, func_name: str) -> dict:
         return self._get_all_versions(self.lookup[func_name])
 
+    def get_version_entries(self, func_name: str) -> list[dict]:
+        """
+        Returns all version entries (version, docs, change_msg, ...) of a function.
+        """
+        return self._get_all_entries(self.lookup[func_name])
+
+    def get_pending_annotations(self, func_name: str | None = None) -> list[tuple]:
+        """
+        Returns all versions whose change message was generated automatically.
+
+        Returns:
+            List of (function name, version entry) tuples
+        """
+        func_names = list(self.lookup.keys()) if func_name is None else [func_name]
+        return [
+            (name, entry)
+            for name in func_names
+            for entry in self.get_version_entries(name)
+            if entry.get("pending_annotation", False)
+        ]
+
+    def annotate(self, func_name: str, version: str, change_msg: str) -> None:
+        """
+        Replaces the change message of a version and clears its pending state.
+        """
+        for entry in self.get_version_entries(func_name):
+            if entry["version"] == version:
+                entry["change_msg"] = change_msg
+                entry["pending_annotation"] = False
+                return
+        raise KeyError(f"No version {version} found for function {func_name}.")
+
+    def _get_all_entries(self, func_lookup: dict) -> list[dict]:
+        if "version" in func_lookup:
+            return [func_lookup]
+
+        entries = []
+        for key, value in func_lookup.items():
+            if not key.startswith("__") and isinstance(value, dict):
+                entries += self._get_all_entries(value)
+        return entries
+
     def _get_all_versions(self, func_lookup: dict) -> int:
         all_versions = []
 
         if isinstance(func_lookup, dict):
             for key, value in func_lookup.items():
-                if key != "__last_versions":
+                if not key.startswith("__"):
                     all_versions += self._get_all_versions(value)
                 if func_lookup.get("version", None) is not None:
                     return [func_lookup["version"]]
@@ -0,0 +1,262 @@
+"""
+Notifications about versions committed to a registry.
+
+Every committed version is appended to the index journal (see auto_track.index), so
+watching a registry means watching a single file instead of walking the directory
+tree. A watcher keeps an in-memory replay of the journal and only reads the records
+appended since it last looked.
+
+On Linux the watcher waits for changes of the journal with inotify and wakes up as
+soon as a local process commits a version. inotify does not see writes of other
+hosts on network file systems, so the journal is additionally checked with a single
+stat call every `poll_interval` seconds. Where inotify is not available only the
+stat polling is used.
+
+Usage:
+    watcher = RegistryWatcher(root, datasets=["features"])
+    for event in watcher:
+        print(event.kind, event.dataset, event.branch, event.version)
+
+    watcher.subscribe(lambda event: reload(event))
+    ...
+    watcher.close()
+"""
+
+import ctypes
+import ctypes.util
+from dataclasses import dataclass, field
+import os
+from pathlib import Path
+import select
+import struct
+import threading
+import time
+from typing import Callable
+
+from loguru import logger
+
+from auto_track.index import INDEX_NAME, RegistryIndex
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+@dataclass
+class RegistryEvent:
+    """
+    A change of the registry.
+
+    Attributes:
+        kind: "branch" for the first version of a new branch (followed by its
+            "version" event), "version" for a newly committed version, "update"
+            for a version that was written again (e.g. appended to) and "delete"
+            for a deleted version
+        dataset: Name of the dataset
+        branch: Branch of the dataset
+        version: Version of the dataset
+        record: Index record of the version, see index_record
+    """
+
+    kind: str
+    dataset: str
+    branch: str
+    version: str
+    record: dict = field(default_factory=dict, repr=False)
+
+
+class RegistryWatcher(object):
+    """
+    Args:
+        root: Root directory of the data registry
+        datasets: Only report changes of these datasets, defaults to all
+        poll_interval: Seconds between checks of the journal without notification
+        use_inotify: Whether to wait for changes with inotify, defaults to using it
+            where available
+        include_existing: Whether the first poll reports the versions that were
+            already stored when the watcher was created
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        datasets: list[str] | None = None,
+        poll_interval: float = 1.0,
+        use_inotify: bool | None = None,
+        include_existing: bool = False,
+    ) -> None:
+        self.root = Path(root)
+        self.datasets = None if datasets is None else set(datasets)
+        self.poll_interval = poll_interval
+        self.index = RegistryIndex(self.root)
+        self._branches = set()
+        self._closed = threading.Event()
+        self._thread = None
+
+        if not include_existing:
+            self.index.refresh()
+            self._branches = {key[:2] for key in self.index.versions}
+
+        self._inotify = None
+        if use_inotify is None or use_inotify:
+            self._inotify = _Inotify.create(self.root / ".auto-track")
+            if self._inotify is None and use_inotify:
+                raise RuntimeError("inotify is not available on this system")
+
+    def poll(self) -> list[RegistryEvent]:
+        """
+        Returns the changes since the last poll without waiting.
+        """
+        events = []
+        for op, record in self.index.refresh():
+            dataset, branch = record["dataset"], record["branch"]
+            if self.datasets is not None and dataset not in self.datasets:
+                continue
+            key = (dataset, branch, record["version"])
+            if op == "delete":
+                events.append(RegistryEvent("delete", *key, record))
+                continue
+            if (dataset, branch) not in self._branches:
+                self._branches.add((dataset, branch))
+                events.append(RegistryEvent("branch", *key, record))
+            kind = "update" if op == "update" else "version"
+            events.append(RegistryEvent(kind, *key, record))
+        return events
+
+    def wait(self, timeout: float | None = None) -> list[RegistryEvent]:
+        """
+        Blocks until the registry changed or the timeout expired.
+
+        Args:
+            timeout: Maximum number of seconds to wait, None waits until a change
+                or until the watcher is closed
+
+        Returns:
+            The changes, empty if the timeout expired or the watcher was closed
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._closed.is_set():
+            events = self.poll()
+            if events:
+                return events
+
+            interval = self.poll_interval
+            if deadline is not None:
+                interval = min(interval, deadline - time.monotonic())
+                if interval <= 0:
+                    return []
+            if self._inotify is not None:
+                self._inotify.wait(interval)
+            else:
+                self._closed.wait(interval)
+        return []
+
+    def __iter__(self):
+        while not self._closed.is_set():
+            yield from self.wait()
+
+    def subscribe(self, callback: Callable[[RegistryEvent], None]) -> None:
+        """
+        Calls callback with every change from a background thread until the
+        watcher is closed. Exceptions of the callback are logged.
+        """
+        if self._thread is not None:
+            raise ValueError("The watcher already has a subscriber")
+
+        def run():
+            for event in self:
+                try:
+                    callback(event)
+                except Exception:
+                    logger.exception(f"Callback failed for {event}")
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _Inotify(object):
+    """
+    Minimal inotify binding through libc, watching the metadata directory for
+    writes and replacements of the index journal.
+    """
+
+    def __init__(self, libc, fd: int) -> None:
+        self.libc = libc
+        self.fd = fd
+
+    @classmethod
+    def create(cls, directory: Path):
+        name = ctypes.util.find_library("c")
+        if name is None:
+            return None
+        try:
+            libc = ctypes.CDLL(name, use_errno=True)
+            libc.inotify_init1
+        except (OSError, AttributeError):
+            return None
+
+        if not directory.is_dir():
+            # nothing was committed yet, the stat polling notices the first version
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.debug(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+            return None
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            logger.debug(f"inotify_add_watch failed: {os.strerror(ctypes.get_errno())}")
+            os.close(fd)
+            return None
+        return cls(libc, fd)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits until the journal changed or the timeout expired.
+
+        Returns:
+            Whether the journal changed
+        """
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if not readable:
+                return False
+            if INDEX_NAME.encode() in self._read_names():
+                return True
+        return False
+
+    def _read_names(self) -> list[bytes]:
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names, offset = [], 0
+        while offset < len(buffer):
+            _, _, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            names.append(buffer[offset : offset + length].rstrip(b"\0"))
+            offset += length
+        return names
+
+    def close(self) -> None:
+        os.close(self.fd)
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from auto_track.async_data import AsyncAutoData
+from auto_track.helpers import read_manifest
+from auto_track.track import versioned_auto_save
+
+
+def test_async_tracked_function(tmp_path):
+    @versioned_auto_save(tmp_path, output_names=("x", "y"))
+    async def produce(at_config=None):
+        await asyncio.sleep(0)
+        return np.arange(4), {"a": 1}
+
+    @versioned_auto_save(tmp_path)
+    async def consume():
+        data = AsyncAutoData(tmp_path)
+        x = await data.get_data_from_registry("produce", "small", outputs="x")
+        return x * 2
+
+    async def main():
+        x, y = await produce(at_config={"at_branch": "small"})
+        return x, y, await consume()
+
+    x, y, doubled = asyncio.run(main())
+    assert y == {"a": 1}
+    np.testing.assert_array_equal(doubled, [0, 2, 4, 6])
+    assert read_manifest(tmp_path / "consume" / "main" / "0.0.0")["lineage"] == [
+        {"dataset": "produce", "branch": "small", "version": "0.0.0"}
+    ]
+
+
+def test_async_loading(tmp_path):
+    @versioned_auto_save(tmp_path)
+    def values(at_config=None):
+        return np.full(3, at_config["value"])
+
+    for value in range(3):
+        values(at_config={"at_branch": f"v{value}", "value": value})
+
+    async def main():
+        data = AsyncAutoData(tmp_path, max_concurrency=2)
+        loaded = await asyncio.gather(
+            *(data.get_data_from_registry("values", f"v{i}") for i in range(3))
+        )
+        stacked, index = await data.get_bulk_from_registry("values")
+        lazy = await data.get_data_from_registry("values", "v2", lazy=True)
+        return (
+            loaded,
+            stacked,
+            lazy,
+            await data.list_branches("values"),
+            await data.list_versions("values", "v1"),
+        )
+
+    loaded, stacked, lazy, branches, versions = asyncio.run(main())
+    assert [int(a[0]) for a in loaded] == [0, 1, 2]
+    assert isinstance(lazy, np.memmap) and not lazy.flags.writeable
+    assert stacked.shape == (3, 3)
+    assert branches == ["v0", "v1", "v2"]
+    assert versions == ["0.0.0"]
+
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(AsyncAutoData(tmp_path).get_data_from_registry("missing"))
+
+
+def test_concurrency_is_bounded(tmp_path, monkeypatch):
+    data = AsyncAutoData(tmp_path, max_concurrency=2)
+    running, peak = 0, 0
+    lock = threading.Lock()
+
+    def slow_load(*args, **kwargs):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+
+    monkeypatch.setattr(data.data, "get_data_from_registry", slow_load)
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        ticker = asyncio.create_task(tick())
+        await asyncio.gather(*(data.get_data_from_registry("x") for _ in range(6)))
+        ticker.cancel()
+        return ticks
+
+    # the event loop keeps running while loads are in progress
+    assert asyncio.run(main()) > 5
+    assert peak == 2
@@ -151,3 +151,220 @@ def test_full_integration_single_iterable_dict(tmp_path):
 
     assert np.array_equal(data["first"], np_1)
     assert np.array_equal(data["second"], np_2)
+
+
+def test_resolving_versions_numerically(tmp_path):
+    auto_data = AutoData(tmp_path)
+    available_versions = ["0.0.9", "0.0.10", "0.9.0", "0.10.2", "0.10.11"]
+
+    assert auto_data._resolve_version("latest", available_versions) == "0.10.11"
+    assert auto_data._resolve_version("0.*.*", available_versions) == "0.10.11"
+    assert auto_data._resolve_version("0.0.*", available_versions) == "0.0.10"
+    assert auto_data._resolve_version("0.0.9", available_versions) == "0.0.9"
+
+
+def test_loading_explicit_version(tmp_path):
+    @versioned_auto_save(tmp_path, dataset_name="test")
+    def save_data():
+        return np.arange(3)
+
+    save_data()
+
+    data = AutoData(tmp_path).get_data_from_registry("test", "main", "0.0.0")
+    assert np.array_equal(data, np.arange(3))
+
+
+def _sweep(root, n=4):
+    @versioned_auto_save(root=root, output_names=("weights", "metrics"))
+    def sweep(at_config=None):
+        lr = at_config["lr"]
+        weights = np.full((2, 3), lr, dtype=np.float32)
+        metrics = pd.DataFrame({"step": [0, 1], "loss": [lr, lr / 2]})
+        return weights, metrics
+
+    for i in range(n):
+        sweep(
+            at_config={
+                "at_branch": f"run-{i}",
+                "lr": float(i),
+                "model": {"depth": i % 2},
+            }
+        )
+
+
+def test_bulk_stacks_arrays(tmp_path):
+    _sweep(tmp_path)
+
+    stacked, index = AutoData(tmp_path).get_bulk_from_registry(
+        "sweep", output="weights"
+    )
+
+    assert stacked.shape == (4, 2, 3)
+    assert list(index["branch"]) == ["run-0", "run-1", "run-2", "run-3"]
+    assert list(index["version"]) == ["0.0.0"] * 4
+    np.testing.assert_array_equal(stacked[:, 0, 0], index["config.lr"])
+
+
+def test_bulk_concatenates_frames_with_filter(tmp_path):
+    _sweep(tmp_path)
+
+    frame = AutoData(tmp_path).get_bulk_from_registry(
+        "sweep", output="metrics", config_filter={"model.depth": 1}
+    )
+
+    assert list(frame.columns[:2]) == ["branch", "version"]
+    assert list(frame["branch"]) == ["run-1", "run-1", "run-3", "run-3"]
+    assert list(frame["loss"]) == [1.0, 0.5, 3.0, 1.5]
+    assert frame["step"].dtype == np.int64
+
+    frame = AutoData(tmp_path).get_bulk_from_registry(
+        "sweep",
+        branches=[("run-0", "0.0.0")],
+        output=1,
+        config_filter=lambda c: c["lr"] < 1,
+    )
+    assert list(frame["config.lr"]) == [0.0, 0.0]
+
+
+def test_bulk_requires_output_choice(tmp_path):
+    _sweep(tmp_path, n=1)
+
+    with pytest.raises(ValueError):
+        AutoData(tmp_path).get_bulk_from_registry("sweep")
+    with pytest.raises(FileNotFoundError):
+        AutoData(tmp_path).get_bulk_from_registry(
+            "sweep", output="weights", config_filter={"lr": 7.0}
+        )
+
+
+def test_bulk_configs_of_functions_sharing_branch_names(tmp_path):
+    @versioned_auto_save(root=tmp_path)
+    def raw(at_config=None):
+        return np.arange(at_config["n"])
+
+    @versioned_auto_save(root=tmp_path)
+    def features(at_config=None):
+        return np.full(3, at_config["scale"])
+
+    features(at_config={"at_branch": "small", "scale": 2.0})
+    raw(at_config={"at_branch": "small", "n": 10})
+
+    _, index = AutoData(tmp_path).get_bulk_from_registry("features", output=0)
+
+    assert "config.n" not in index.columns
+    assert list(index["config.scale"]) == [2.0]
+
+
+def test_partial_reads(tmp_path):
+    @versioned_auto_save(root=tmp_path, output_names=("array", "table", "parts"))
+    def large():
+        array = np.arange(100).reshape(50, 2)
+        table = pd.DataFrame(
+            {"a": range(10), "b": range(10, 20), "c": list("abcdefghij")}
+        )
+        parts = {"first_part": np.arange(5), "second": np.arange(5, 10)}
+        return array, table, parts
+
+    large()
+    auto_data = AutoData(tmp_path)
+
+    array = auto_data.get_data_from_registry(
+        "large", outputs="array", rows=slice(10, 12)
+    )
+    np.testing.assert_array_equal(array, [[20, 21], [22, 23]])
+    array = auto_data.get_data_from_registry("large", outputs=0, rows=[3, 1])
+    np.testing.assert_array_equal(array, [[6, 7], [2, 3]])
+
+    table = auto_data.get_data_from_registry(
+        "large", outputs="table", rows=slice(2, 4), columns=["a", "c"]
+    )
+    assert table.to_dict("list") == {"a": [2, 3], "c": ["c", "d"]}
+    table = auto_data.get_data_from_registry("large", outputs="table", rows=[7, 1, 7])
+    assert list(table["a"]) == [7, 1, 7]
+    table = auto_data.get_data_from_registry(
+        "large", outputs="table", rows=slice(-2, None)
+    )
+    assert list(table["a"]) == [8, 9]
+
+    parts = auto_data.get_data_from_registry(
+        "large", outputs="parts", keys=["first_part"], rows=slice(1, 3)
+    )
+    assert list(parts) == ["first_part"]
+    np.testing.assert_array_equal(parts["first_part"], [1, 2])
+
+    array, parts = auto_data.get_data_from_registry("large", outputs=["array", "parts"])
+    assert array.shape == (50, 2)
+    assert set(parts) == {"first_part", "second"}
+
+
+@pytest.mark.parametrize("fmt", ["csr", "csc", "coo"])
+def test_sparse_roundtrip(tmp_path, fmt):
+    sparse = pytest.importorskip("scipy.sparse")
+    matrix = sparse.random(50, 20, density=0.05, format=fmt, random_state=0)
+
+    @versioned_auto_save(root=tmp_path, output_names=("counts", "labels"))
+    def cells():
+        return matrix, np.arange(50)
+
+    cells()
+    assert (tmp_path / "cells" / "main" / "0.0.0" / "counts.sparse").is_dir()
+
+    data = AutoData(tmp_path)
+    counts, labels = data.get_data_from_registry("cells")
+    assert isinstance(counts, sparse.spmatrix) and counts.format == fmt
+    np.testing.assert_array_equal(counts.toarray(), matrix.toarray())
+
+    lazy = data.get_data_from_registry("cells", outputs="counts", lazy=True)
+    np.testing.assert_array_equal(lazy.toarray(), matrix.toarray())
+
+    for rows in (slice(10, 20), [3, 1, 40]):
+        subset = data.get_data_from_registry("cells", outputs="counts", rows=rows)
+        assert subset.format == fmt
+        np.testing.assert_array_equal(subset.toarray(), matrix.tocsr()[rows].toarray())
+
+
+def test_sparse_arrays_and_other_formats(tmp_path):
+    sparse = pytest.importorskip("scipy.sparse")
+    array = sparse.csr_array(np.eye(4))
+    lil = sparse.lil_matrix(np.eye(3))
+
+    @versioned_auto_save(root=tmp_path, output_names=("array", "lil"))
+    def matrices():
+        return array, lil
+
+    matrices()
+    loaded_array, loaded_lil = AutoData(tmp_path).get_data_from_registry("matrices")
+    assert isinstance(loaded_array, sparse.sparray)
+    np.testing.assert_array_equal(loaded_array.toarray(), np.eye(4))
+    # formats without component arrays are stored as CSR
+    assert loaded_lil.format == "csr"
+    np.testing.assert_array_equal(loaded_lil.toarray(), np.eye(3))
+
+
+def test_anndata_roundtrip(tmp_path):
+    anndata = pytest.importorskip("anndata")
+    sparse = pytest.importorskip("scipy.sparse")
+    adata = anndata.AnnData(
+        X=sparse.random(30, 10, density=0.1, format="csr", random_state=0),
+        obs=pd.DataFrame({"cell_type": [f"t{i % 3}" for i in range(30)]}).set_index(
+            pd.Index([f"c{i}" for i in range(30)])
+        ),
+    )
+
+    @versioned_auto_save(root=tmp_path)
+    def atlas():
+        return adata
+
+    atlas()
+    data = AutoData(tmp_path)
+    loaded = data.get_data_from_registry("atlas")
+    assert loaded.shape == (30, 10)
+    np.testing.assert_array_equal(loaded.X.toarray(), adata.X.toarray())
+
+    backed = data.get_data_from_registry("atlas", lazy=True)
+    assert backed.isbacked
+    backed.file.close()
+
+    subset = data.get_data_from_registry("atlas", rows=slice(5, 10))
+    assert list(subset.obs_names) == [f"c{i}" for i in range(5, 10)]
+    np.testing.assert_array_equal(subset.X.toarray(), adata.X[5:10].toarray())
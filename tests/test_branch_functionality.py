@@ -1,5 +1,9 @@
 import json
+import multiprocessing
 
+import numpy as np
+
+from auto_track.fingerprint import config_fingerprint
 from auto_track.track import get_data_branch
 
 
@@ -29,35 +33,110 @@ def test_with_stored_config(tmp_path):
 
 def test_without_stored_config(tmp_path):
     at_config = {"some_param": "some_value", "at_branch": "test_branch"}
+    db_path = tmp_path / ".auto-track" / "data_branches.json"
+
+    some_value = config_fingerprint({"some_param": "some_value"})
+    another_value = config_fingerprint({"some_param": "another_value"})
 
     assert get_data_branch(at_config, tmp_path, "test_func") == "test_branch"
-    assert (tmp_path / ".auto-track" / "data_branches.json").exists()
-    assert json.load(open(tmp_path / ".auto-track" / "data_branches.json", "r")) == {
-        "test_func": {"{'some_param': 'some_value'}": "test_branch"}
+    assert db_path.exists()
+    assert json.load(open(db_path, "r")) == {
+        "test_func": {
+            some_value: {
+                "branch": "test_branch",
+                "config": {"some_param": "some_value"},
+            }
+        }
     }
 
     at_config["at_branch"] = "some_branch"
     assert get_data_branch(at_config, tmp_path, "test_func") == "test_branch"
-    assert json.load(open(tmp_path / ".auto-track" / "data_branches.json", "r")) == {
-        "test_func": {"{'some_param': 'some_value'}": "test_branch"}
-    }
+    assert len(json.load(open(db_path, "r"))["test_func"]) == 1
 
     at_config["some_param"] = "another_value"
     assert get_data_branch(at_config, tmp_path, "test_func") == "some_branch"
-    assert json.load(open(tmp_path / ".auto-track" / "data_branches.json", "r")) == {
+    assert json.load(open(db_path, "r")) == {
         "test_func": {
-            "{'some_param': 'some_value'}": "test_branch",
-            "{'some_param': 'another_value'}": "some_branch",
+            some_value: {
+                "branch": "test_branch",
+                "config": {"some_param": "some_value"},
+            },
+            another_value: {
+                "branch": "some_branch",
+                "config": {"some_param": "another_value"},
+            },
         }
     }
 
     assert get_data_branch(None, tmp_path, "test_func") == "main"
 
     assert get_data_branch(at_config, tmp_path, "another_func") == "some_branch"
-    assert json.load(open(tmp_path / ".auto-track" / "data_branches.json", "r")) == {
+    assert json.load(open(db_path, "r"))["another_func"] == {
+        another_value: {
+            "branch": "some_branch",
+            "config": {"some_param": "another_value"},
+        }
+    }
+
+
+def test_config_order_does_not_create_branches(tmp_path):
+    first = {"a": 1, "b": {"c": [1, 2], "d": 2.0}, "at_branch": "first"}
+    second = {"at_branch": "second", "b": {"d": 2.0, "c": [1, 2]}, "a": 1}
+
+    assert get_data_branch(first, tmp_path, "test_func") == "first"
+    assert get_data_branch(second, tmp_path, "test_func") == "first"
+
+
+def test_legacy_entries_are_migrated(tmp_path):
+    at_config = {"some_param": "some_value", "at_branch": "test_branch"}
+    db_path = tmp_path / ".auto-track" / "data_branches.json"
+    db_path.parent.mkdir()
+
+    with open(db_path, "w") as f:
+        json.dump({"test_func": {"{'some_param': 'some_value'}": "legacy"}}, f)
+
+    assert get_data_branch(at_config, tmp_path, "test_func") == "legacy"
+    assert json.load(open(db_path, "r")) == {
         "test_func": {
-            "{'some_param': 'some_value'}": "test_branch",
-            "{'some_param': 'another_value'}": "some_branch",
-        },
-        "another_func": {"{'some_param': 'another_value'}": "some_branch"},
+            config_fingerprint({"some_param": "some_value"}): {
+                "branch": "legacy",
+                "config": {"some_param": "some_value"},
+            }
+        }
     }
+
+
+def test_array_configs(tmp_path):
+    weights = np.linspace(0, 1, 10_000)
+    changed = weights.copy()
+    changed[5_000] += 1e-9
+
+    assert get_data_branch({"w": weights}, tmp_path, "f") == get_data_branch(
+        {"w": weights.copy()}, tmp_path, "f"
+    )
+    assert get_data_branch({"w": weights}, tmp_path, "f") != get_data_branch(
+        {"w": changed}, tmp_path, "f"
+    )
+
+    stored = json.load(open(tmp_path / ".auto-track" / "data_branches.json", "r"))
+    configs = [entry["config"] for entry in stored["f"].values()]
+    assert configs[0]["w"]["__ndarray__"]["shape"] == [10_000]
+
+
+def _branch_of(root, value):
+    return get_data_branch({"value": value, "at_branch": f"b{value}"}, root, "f")
+
+
+def test_concurrent_branch_lookups(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(8) as pool:
+        branches = pool.starmap(_branch_of, [(tmp_path, i % 4) for i in range(32)])
+
+    assert branches == [f"b{i % 4}" for i in range(32)]
+    stored = json.load(open(tmp_path / ".auto-track" / "data_branches.json", "r"))
+    assert sorted(entry["branch"] for entry in stored["f"].values()) == [
+        "b0",
+        "b1",
+        "b2",
+        "b3",
+    ]
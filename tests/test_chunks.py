@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+import torch
+
+from auto_track.auto_data import AutoData
+from auto_track.chunks import ChunkStore, collect_chunks
+from auto_track.helpers import save_object, write_manifest
+from auto_track.retention import RetentionPolicy, collect_garbage
+from auto_track.track import versioned_auto_save
+
+CHUNK_SIZE = 4096
+
+
+def _chunk_files(root):
+    return sorted((root / ".auto-track" / "chunks").glob("*/*"))
+
+
+def test_chunked_outputs(tmp_path):
+    @versioned_auto_save(tmp_path, output_names=("x", "t", "small"), chunk_size=4096)
+    def large():
+        return (
+            np.arange(10000, dtype=np.float32).reshape(1000, 10),
+            torch.arange(2000, dtype=torch.float64),
+            np.arange(3),
+        )
+
+    large()
+    version_path = tmp_path / "large" / "main" / "0.0.0"
+    assert sorted(p.name for p in version_path.iterdir()) == [
+        ".manifest.json",
+        "small.npy",
+        "t.chunks",
+        "x.chunks",
+    ]
+
+    data = AutoData(tmp_path)
+    x, t, small = data.get_data_from_registry("large")
+    np.testing.assert_array_equal(x, np.arange(10000).reshape(1000, 10))
+    assert torch.equal(t, torch.arange(2000, dtype=torch.float64))
+    np.testing.assert_array_equal(small, np.arange(3))
+
+    rows = data.get_data_from_registry("large", outputs="x", rows=slice(100, 900))
+    np.testing.assert_array_equal(rows, x[100:900])
+    rows = data.get_data_from_registry("large", outputs="x", rows=[999, 0, 5])
+    np.testing.assert_array_equal(rows, x[[999, 0, 5]])
+
+
+def test_unchanged_chunks_are_stored_once(tmp_path):
+    store = ChunkStore(tmp_path, CHUNK_SIZE)
+    array = np.random.default_rng(0).random((64, 1024), dtype=np.float32)
+
+    store.save(array, tmp_path / "v1" / "x")
+    n_chunks = len(_chunk_files(tmp_path))
+
+    array[10, 5] = 1
+    store.save(array, tmp_path / "v2" / "x")
+    # only the chunk holding the changed value is stored again
+    assert len(_chunk_files(tmp_path)) == n_chunks + 1
+    np.testing.assert_array_equal(store.load(tmp_path / "v2" / "x.chunks"), array)
+
+    fortran = np.asfortranarray(np.arange(5000.0).reshape(50, 100))
+    store.save(fortran, tmp_path / "v2" / "f")
+    loaded = store.load(tmp_path / "v2" / "f.chunks", rows=[1, 2])
+    np.testing.assert_array_equal(loaded, fortran[[1, 2]])
+
+    with pytest.raises(ValueError):
+        ChunkStore(tmp_path, 100)
+
+
+def test_garbage_collection_of_chunks(tmp_path):
+    store = ChunkStore(tmp_path, CHUNK_SIZE)
+    for i in range(3):
+        path = tmp_path / "data" / "main" / f"0.0.{i}"
+        save_object(np.full(4096, i, dtype=np.float32), path / "output", chunks=store)
+        write_manifest(path, {"created": 100 + i, "outputs": ["output"], "bytes": 0})
+    assert collect_chunks(tmp_path) == (0, 0)
+
+    policy = RetentionPolicy(keep_last=1)
+    report = collect_garbage(tmp_path, policy)
+    # the first chunk, one chunk of repeated values (stored once) and the last
+    # partial chunk of each older version are not shared with the latest version
+    assert report.chunks_deleted == 6
+    assert len(_chunk_files(tmp_path)) == 9
+
+    report = collect_garbage(tmp_path, policy, dry_run=False)
+    assert report.chunks_deleted == 6
+    assert collect_chunks(tmp_path) == (0, 0)
+    loaded = AutoData(tmp_path).get_data_from_registry("data")
+    np.testing.assert_array_equal(loaded, np.full(4096, 2, dtype=np.float32))
@@ -0,0 +1,173 @@
+import json
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from auto_track.cli import main
+from auto_track.fingerprint import config_fingerprint
+from auto_track.index import read_index
+from auto_track.track import (
+    FunctionDatabase,
+    get_function_version,
+    versioned_auto_save,
+)
+
+
+def test_annotate(tmp_path, capsys):
+    def func(a: int) -> int:
+        return a + 1
+
+    get_function_version(func, tmp_path, interactive=False)
+
+    def func(a: int) -> int:
+        return a + 2
+
+    get_function_version(func, tmp_path, interactive=False)
+
+    assert main(["--root", str(tmp_path), "annotate", "--list"]) == 0
+    assert "func 0.0.1" in capsys.readouterr().out
+
+    assert (
+        main(["--root", str(tmp_path), "annotate", "func", "0.0.1", "-m", "Two"]) == 0
+    )
+
+    with FunctionDatabase(tmp_path) as db:
+        entries = {e["version"]: e for e in db.get_version_entries("func")}
+    assert entries["0.0.1"]["change_msg"] == "Two"
+    assert not entries["0.0.1"]["pending_annotation"]
+
+    assert main(["--root", str(tmp_path), "annotate"]) == 0
+    assert "No versions pending annotation." in capsys.readouterr().out
+
+
+def _populate(root):
+    @versioned_auto_save(root, dataset_name="data", change_msg="first")
+    def compute(at_config=None):
+        return np.arange(100), {"a": 1}
+
+    compute(at_config={"lr": 0.1, "layers": [1, 2], "at_branch": "small"})
+    compute(at_config={"lr": 0.2, "layers": [1, 2, 3], "at_branch": "large"})
+    compute()
+
+
+def test_list(tmp_path, capsys):
+    _populate(tmp_path)
+
+    assert main(["--root", str(tmp_path), "list"]) == 0
+    out = capsys.readouterr().out
+    assert "data" in out and " 3 " in out
+
+    assert main(["--root", str(tmp_path), "list", "data"]) == 0
+    out = capsys.readouterr().out
+    assert all(b in out for b in ("small", "large", "main"))
+
+    assert main(["--root", str(tmp_path), "list", "data", "small"]) == 0
+    assert "0.0.0" in capsys.readouterr().out
+
+    assert main(["--root", str(tmp_path), "list", "missing"]) == 1
+
+
+def test_history_and_diff(tmp_path, capsys):
+    _populate(tmp_path)
+
+    db_path = tmp_path / ".auto-track" / "function_versions.json"
+    mtime = db_path.stat().st_mtime_ns
+    assert main(["--root", str(tmp_path), "history", "compute"]) == 0
+    assert "Initial version" in capsys.readouterr().out
+    # read-only commands do not write the database back
+    assert db_path.stat().st_mtime_ns == mtime
+
+    empty = tmp_path / "empty"
+    assert main(["--root", str(empty), "history", "compute"]) == 1
+    assert main(["--root", str(empty), "annotate", "--list"]) == 0
+    assert not empty.exists()
+
+    assert main(["--root", str(tmp_path), "diff", "compute", "small", "large"]) == 0
+    out = capsys.readouterr().out
+    assert "lr:" in out and "0.1" in out and "0.2" in out
+    assert "layers:" in out
+
+    assert main(["--root", str(tmp_path), "diff", "compute", "small", "small"]) == 0
+    assert "identical" in capsys.readouterr().out
+
+
+def test_verify(tmp_path, capsys):
+    _populate(tmp_path)
+
+    assert main(["--root", str(tmp_path), "verify"]) == 0
+    assert "Verified 3 versions, 0 problems" in capsys.readouterr().out
+
+    tampered = tmp_path / "data" / "small" / "0.0.0" / "output_1.json"
+    tampered.write_text(tampered.read_text().replace("1", "2"))
+
+    assert main(["--root", str(tmp_path), "verify", "data"]) == 1
+    assert "checksum mismatch" in capsys.readouterr().out
+    assert main(["--root", str(tmp_path), "verify", "data", "large"]) == 0
+
+
+def test_gc_compact_and_reindex(tmp_path, capsys):
+    _populate(tmp_path)
+    index = tmp_path / ".auto-track" / "index.jsonl"
+
+    main(["--root", str(tmp_path), "tag", "data", "small", "0.0.0", "keep"])
+    args = ["--root", str(tmp_path), "gc", "--max-age", "0", "--no-keep-latest"]
+    assert main(args) == 0
+    assert "Would delete 2 versions" in capsys.readouterr().out
+
+    assert main(args + ["--apply"]) == 0
+    assert not (tmp_path / "data" / "large").exists()
+    assert len(read_index(tmp_path)) == 1
+    assert len(index.read_text().splitlines()) == 5
+
+    assert main(["--root", str(tmp_path), "compact"]) == 0
+    assert len(index.read_text().splitlines()) == 1
+
+    index.unlink()
+    assert main(["--root", str(tmp_path), "list"]) == 1
+    assert main(["--root", str(tmp_path), "reindex"]) == 0
+    assert list(read_index(tmp_path)) == [("data", "small", "0.0.0")]
+
+
+def test_missing_root(tmp_path, capsys):
+    root = tmp_path / "typo"
+
+    assert main(["--root", str(root), "gc", "--keep-last", "1", "--apply"]) == 1
+    assert main(["--root", str(root), "migrate"]) == 1
+    assert "does not exist" in capsys.readouterr().out
+    assert not root.exists()
+
+
+def test_migrate(tmp_path, capsys):
+    db_path = tmp_path / ".auto-track" / "data_branches.json"
+    db_path.parent.mkdir()
+    with open(db_path, "w") as f:
+        json.dump({"func": {"{'a': 1, 'b': [1, 2]}": "branch"}}, f)
+
+    assert main(["--root", str(tmp_path), "migrate"]) == 0
+    assert json.load(open(db_path)) == {
+        "func": {
+            config_fingerprint({"a": 1, "b": [1, 2]}): {
+                "branch": "branch",
+                "config": {"a": 1, "b": [1, 2]},
+            }
+        }
+    }
+
+
+def test_listing_does_not_import_torch(tmp_path):
+    _populate(tmp_path)
+
+    code = (
+        "import sys; from auto_track.cli import main; "
+        f"main(['--root', {str(tmp_path)!r}, 'list']); "
+        f"main(['--root', {str(tmp_path)!r}, 'verify']); "
+        "assert 'torch' not in sys.modules"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=pytest._test_path.parent,
+        capture_output=True,
+    )
+    assert result.returncode == 0, result.stderr.decode()
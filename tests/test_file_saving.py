@@ -8,6 +8,9 @@ from auto_track.helpers import (
     save_iterable_types,
     _python_internal_types_only,
     _get_nested_obj_dir,
+    dumps_json,
+    loads_json,
+    JSON_LINES_MIN_RECORDS,
 )
 
 
@@ -85,8 +88,70 @@ def test_save_iterable_types(tmp_path):
 def test__python_internal_types_only():
     assert _python_internal_types_only({"a": 1, "b": 2})
     assert not _python_internal_types_only({"a": 1, "b": np.array([1, 2, 3])})
+    assert not _python_internal_types_only({"a": [1, {"b": np.array([1])}]})
+    assert _python_internal_types_only({"a": [1, None, {"b": float("nan")}]})
+
+
+def test_nested_non_json_values_are_not_written(tmp_path):
+    with pytest.raises(ValueError):
+        save_iterable_types({"a": [1, {"b": object()}]}, tmp_path / "dict.json")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_json_roundtrip(tmp_path):
+    from auto_track.auto_data import AutoData
+
+    records = [{"step": i, "loss": 1 / (i + 1)} for i in range(JSON_LINES_MIN_RECORDS)]
+    metrics = {"nan": float("nan"), "big": 2**70, 1: "int key", "tuple": (1, 2)}
+    save_object(records, tmp_path / "records")
+    save_object(metrics, tmp_path / "metrics")
+
+    assert (tmp_path / "records.jsonl").is_file()
+    auto_data = AutoData(tmp_path)
+    assert auto_data._load_object(tmp_path / "records.jsonl") == records
+    assert auto_data._load_object(tmp_path / "records.jsonl", rows=slice(2, 4)) == (
+        records[2:4]
+    )
+
+    loaded = auto_data._load_object(tmp_path / "metrics.json")
+    assert np.isnan(loaded.pop("nan"))
+    assert loaded == {"big": 2**70, "1": "int key", "tuple": [1, 2]}
+
+
+def test_dumps_json_non_finite_floats():
+    orjson = pytest.importorskip("orjson")
+
+    # null written for None does not send documents to the standard library
+    document = {"a": None, "b": [1.5, None, "nan"]}
+    assert dumps_json(document) == orjson.dumps(document)
+
+    for value in (float("nan"), float("inf"), -float("inf")):
+        data = dumps_json({"a": None, "b": [1.5, value]})
+        assert data != orjson.dumps({"a": None, "b": [1.5, value]})
+        loaded = loads_json(data)["b"][1]
+        assert loaded == value or (np.isnan(loaded) and np.isnan(value))
 
 
 def test__get_nested_obj_dir(tmp_path):
     path = _get_nested_obj_dir(tmp_path / "dir", "a", "prefix_", ".suffix")
     assert path == tmp_path / "dir" / "prefix_a.suffix"
+
+
+def test_rerun_across_json_lines_threshold(tmp_path):
+    from auto_track.auto_data import AutoData
+    from auto_track.track import versioned_auto_save
+
+    n_records = [JSON_LINES_MIN_RECORDS - 1, JSON_LINES_MIN_RECORDS, 3]
+
+    @versioned_auto_save(tmp_path, output_names="records")
+    def records():
+        return [{"i": i} for i in range(n_records.pop(0))]
+
+    for expected in ([".json"], [".jsonl"], [".json"]):
+        records()
+        version_path = tmp_path / "records" / "main" / "0.0.0"
+        files = sorted(p.suffix for p in version_path.glob("records.*"))
+        assert files == expected
+    assert AutoData(tmp_path).get_data_from_registry("records") == [
+        {"i": i} for i in range(3)
+    ]
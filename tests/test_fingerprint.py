@@ -0,0 +1,175 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from auto_track import fingerprint
+from auto_track.fingerprint import (
+    clear_input_cache,
+    config_fingerprint,
+    data_fingerprint,
+    input_fingerprint,
+    readable_config,
+)
+
+
+@dataclass
+class Params:
+    lr: float
+    layers: list
+
+
+class Model:
+    def __init__(self, depth: int) -> None:
+        self.depth = depth
+
+
+def test_order_independence():
+    assert config_fingerprint({"a": 1, "b": 2}) == config_fingerprint({"b": 2, "a": 1})
+    assert config_fingerprint({"a": {"x": 1, "y": [1, 2]}}) == config_fingerprint(
+        {"a": {"y": [1, 2], "x": 1}}
+    )
+    assert config_fingerprint({1, 2, 3}) == config_fingerprint({3, 2, 1})
+    assert config_fingerprint([1, 2]) != config_fingerprint([2, 1])
+
+
+def test_type_awareness():
+    fingerprints = {
+        config_fingerprint(v) for v in [1, 1.0, "1", True, None, [1], (1,), b"1"]
+    }
+    assert len(fingerprints) == 8
+    assert config_fingerprint({"a": "b"}) != config_fingerprint({"ab": ""})
+    assert config_fingerprint(["a", "b"]) != config_fingerprint(["ab"])
+
+
+def test_numpy_values():
+    assert config_fingerprint(np.float64(0.5)) == config_fingerprint(0.5)
+    assert config_fingerprint(np.int32(3)) == config_fingerprint(3)
+
+    arr = np.arange(10_000, dtype=np.float32)
+    assert config_fingerprint(arr) == config_fingerprint(arr.copy())
+    assert config_fingerprint(arr) != config_fingerprint(arr.astype(np.float64))
+    assert config_fingerprint(arr) != config_fingerprint(arr.reshape(100, 100))
+    assert config_fingerprint(arr[::2]) == config_fingerprint(arr[::2].copy())
+
+    changed = arr.copy()
+    changed[5_000] = -1
+    assert config_fingerprint(arr) != config_fingerprint(changed)
+
+
+def test_dataclasses():
+    assert config_fingerprint(Params(0.1, [1, 2])) == config_fingerprint(
+        Params(0.1, [1, 2])
+    )
+    assert config_fingerprint(Params(0.1, [1, 2])) != config_fingerprint(
+        Params(0.2, [1, 2])
+    )
+    assert config_fingerprint(Params(0.1, [1, 2])) != config_fingerprint(
+        {"lr": 0.1, "layers": [1, 2]}
+    )
+
+
+def test_objects_without_stable_repr():
+    # the default repr contains the memory address of the object
+    assert config_fingerprint(Model(2)) == config_fingerprint(Model(2))
+    assert config_fingerprint(Model(2)) != config_fingerprint(Model(3))
+    assert config_fingerprint(Model) == config_fingerprint(Model)
+    assert config_fingerprint(np.mean) != config_fingerprint(np.sum)
+
+    with pytest.raises(TypeError):
+        config_fingerprint(object())
+    with pytest.raises(TypeError):
+        config_fingerprint(lambda x: x)
+
+
+def test_readable_config():
+    config = {
+        "lr": np.float64(0.1),
+        "small": np.arange(3),
+        "large": np.zeros(100),
+        "params": Params(0.1, [1]),
+    }
+    readable = readable_config(config)
+
+    assert readable["lr"] == 0.1
+    assert readable["small"] == [0, 1, 2]
+    assert readable["large"]["__ndarray__"]["shape"] == [100]
+    assert readable["params"] == {"__dataclass__": "Params", "lr": 0.1, "layers": [1]}
+
+
+def test_input_fingerprint():
+    arr = np.arange(100)
+    assert input_fingerprint((arr,), {"b": 1}) == input_fingerprint(
+        (arr.copy(),), {"b": 1}
+    )
+    assert input_fingerprint((arr,), {}) != input_fingerprint((arr + 1,), {})
+    assert input_fingerprint((), {"a": 1, "b": 2}) == input_fingerprint(
+        (), {"b": 2, "a": 1}
+    )
+    assert input_fingerprint(
+        (), {"a": 1, "at_config": {"x": 1}}, exclude=("at_config",)
+    ) == (input_fingerprint((), {"a": 1}, exclude=("at_config",)))
+
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    changed = df.copy()
+    changed.loc[1, "b"] = "q"
+    assert input_fingerprint((df,), {}) == input_fingerprint((df.copy(),), {})
+    assert input_fingerprint((df,), {}) != input_fingerprint((changed,), {})
+
+    tensor = torch.arange(10)
+    assert input_fingerprint((tensor,), {}) == input_fingerprint((tensor.clone(),), {})
+    assert input_fingerprint((tensor,), {}) != input_fingerprint((tensor.numpy(),), {})
+
+    half = torch.arange(10, dtype=torch.bfloat16)
+    assert data_fingerprint(half) == data_fingerprint(half.clone())
+    assert data_fingerprint(half) != data_fingerprint(half.reshape(2, 5))
+    assert data_fingerprint(half) != data_fingerprint(half.to(torch.float16))
+    assert data_fingerprint(half[0]) != data_fingerprint(half[1])
+
+
+def test_large_inputs_are_sampled_and_cached(monkeypatch):
+    monkeypatch.setattr(fingerprint, "SAMPLE_THRESHOLD", 1024)
+    clear_input_cache()
+
+    arr = np.random.default_rng(0).random(100_000)
+    arr.flags.writeable = False
+    digest = data_fingerprint(arr)
+    assert digest == data_fingerprint(arr.copy())
+    assert id(arr) in fingerprint._input_cache
+
+    changed = arr.copy()
+    changed[0] += 1
+    assert data_fingerprint(changed) != digest
+
+    arr_id = id(arr)
+    del arr
+    assert arr_id not in fingerprint._input_cache
+
+
+def test_modified_inputs_are_not_cached(monkeypatch):
+    monkeypatch.setattr(fingerprint, "SAMPLE_THRESHOLD", 1024)
+    clear_input_cache()
+
+    small = np.zeros(10)
+    digest = data_fingerprint(small)
+    small[0] = 1
+    assert data_fingerprint(small) != digest
+    assert id(small) not in fingerprint._input_cache
+
+    arr = np.zeros(100_000)
+    digest = data_fingerprint(arr)
+    arr[0] = 1
+    assert data_fingerprint(arr) != digest
+    assert id(arr) not in fingerprint._input_cache
+
+    tensor = torch.zeros(100_000)
+    digest = data_fingerprint(tensor)
+    assert id(tensor) in fingerprint._input_cache
+    tensor[0] = 1
+    assert data_fingerprint(tensor) != digest
+    tensor.add_(1)
+    expected = torch.ones(100_000)
+    expected[0] = 2
+    assert data_fingerprint(tensor) == data_fingerprint(expected)
@@ -61,3 +61,139 @@ def test_get_function_version(tmp_path, monkeypatch):
             "1.1.0",
             "1.1.1",
         ]
+
+
+def test_non_interactive_version_bump(tmp_path, monkeypatch):
+    def fail(_):
+        raise AssertionError("input() must not be called")
+
+    monkeypatch.setattr("builtins.input", fail)
+    monkeypatch.delenv("AUTO_TRACK_CHANGE_MSG", raising=False)
+
+    def func(a: int) -> int:
+        """Adds one."""
+        return a + 1
+
+    assert get_function_version(func, tmp_path, interactive=False) == "0.0.0"
+
+    def func(a: int) -> int:
+        """Adds two."""
+        return a + 2
+
+    assert get_function_version(func, tmp_path, interactive=False) == "0.0.1"
+
+    def func(a: int) -> int:
+        """Adds two."""
+        return a * 2
+
+    assert (
+        get_function_version(func, tmp_path, change_msg="Multiply", interactive=False)
+        == "0.1.0"
+    )
+
+    monkeypatch.setenv("AUTO_TRACK_CHANGE_MSG", "From the environment")
+
+    def func(a: int, b: int) -> int:
+        """Adds two."""
+        return a * b
+
+    assert get_function_version(func, tmp_path, interactive=False) == "1.0.0"
+
+    with FunctionDatabase(root=tmp_path) as db:
+        entries = {e["version"]: e for e in db.get_version_entries("func")}
+        pending = db.get_pending_annotations()
+
+    assert "Constants or defaults changed" in entries["0.0.1"]["change_msg"]
+    assert "-Adds one." in entries["0.0.1"]["change_msg"]
+    assert "+Adds two." in entries["0.0.1"]["change_msg"]
+    assert entries["0.1.0"]["change_msg"] == "Multiply"
+    assert entries["1.0.0"]["change_msg"] == "From the environment"
+    assert [(name, e["version"]) for name, e in pending] == [("func", "0.0.1")]
+
+    with FunctionDatabase(root=tmp_path) as db:
+        db.annotate("func", "0.0.1", "Add two instead of one")
+
+    with FunctionDatabase(root=tmp_path) as db:
+        assert db.get_pending_annotations() == []
+
+
+def test_non_interactive_from_environment(tmp_path, monkeypatch):
+    def fail(_):
+        raise AssertionError("input() must not be called")
+
+    monkeypatch.setattr("builtins.input", fail)
+    monkeypatch.setenv("AUTO_TRACK_NON_INTERACTIVE", "1")
+
+    def func(a: int) -> int:
+        return a + 1
+
+    assert get_function_version(func, tmp_path, interactive=None) == "0.0.0"
+
+    def func(a: int) -> int:
+        return a - 1
+
+    assert get_function_version(func, tmp_path, interactive=None) == "0.1.0"
+
+
+def test_patch_versions_above_nine(tmp_path):
+    versions = []
+    for i in range(12):
+        func = eval(f"lambda a: a + {i}")
+        versions.append(get_function_version(func, tmp_path, change_msg=str(i)))
+
+    assert versions == [f"0.0.{i}" for i in range(12)]
+
+    func = eval("lambda a: a * 11")
+    assert get_function_version(func, tmp_path, change_msg="mul") == "0.1.0"
+
+    func = eval("lambda a: a + 11")
+    assert get_function_version(func, tmp_path) == "0.0.11"
+
+
+def test_legacy_database_is_indexed(tmp_path):
+    def func(a: int) -> int:
+        return a + 1
+
+    func_code = str(func.__code__.co_code)
+    func_patch = str(func.__code__.co_consts) + str(func.__defaults__)
+    legacy = {
+        "func": {
+            "__last_versions": ["{}", str(func.__annotations__)],
+            "{}": {
+                "__last_versions": ["code"],
+                "code": {
+                    "__last_versions": ["p"],
+                    "p": {"version": "0.0.0", "docs": None, "change_msg": ""},
+                },
+            },
+            str(func.__annotations__): {
+                "__last_versions": ["code", func_code],
+                "code": {
+                    "__last_versions": ["p"],
+                    "p": {"version": "1.0.0", "docs": None, "change_msg": ""},
+                },
+                func_code: {
+                    "__last_versions": ["p", func_patch],
+                    "p": {"version": "1.1.0", "docs": None, "change_msg": ""},
+                    func_patch: {"version": "1.1.1", "docs": None, "change_msg": ""},
+                },
+            },
+        }
+    }
+    db_path = tmp_path / ".auto-track" / "function_versions.json"
+    db_path.parent.mkdir()
+    with open(db_path, "w") as f:
+        json.dump(legacy, f)
+
+    assert get_function_version(func, tmp_path) == "1.1.1"
+
+    with open(db_path, "r") as f:
+        lookup = json.load(f)
+    assert lookup["func"]["__next_major"] == 2
+    assert lookup["func"][str(func.__annotations__)]["__next_minor"] == 2
+    assert lookup["func"][str(func.__annotations__)][func_code]["__next_patch"] == 2
+
+    def func(a: int) -> int:
+        return a + 2
+
+    assert get_function_version(func, tmp_path, change_msg="two") == "1.1.2"
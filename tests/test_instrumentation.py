@@ -0,0 +1,104 @@
+import json
+
+import numpy as np
+
+from auto_track.auto_data import AutoData
+from auto_track.instrumentation import (
+    JsonLinesSink,
+    SummarySink,
+    add_sink,
+    clear_sinks,
+    enabled,
+    instrument,
+    span,
+)
+from auto_track.track import versioned_auto_save
+
+
+def test_disabled_span_is_noop():
+    clear_sinks()
+    assert not enabled()
+
+    with span("some.step") as s:
+        s.set(a=1)
+        s.add(bytes_written=10)
+    assert not s
+
+
+def test_events_for_decorator_and_loader(tmp_path):
+    events = []
+
+    @versioned_auto_save(tmp_path, dataset_name="test")
+    def save_data():
+        return np.arange(10), {"key": "value"}
+
+    with instrument(events.append):
+        save_data()
+        AutoData(tmp_path).get_data_from_registry("test")
+
+    names = [e.name for e in events]
+    for name in [
+        "track.execute",
+        "track.branch",
+        "track.version",
+        "save.object",
+        "track.call",
+        "load.resolve_version",
+        "load.object",
+        "load.registry",
+    ]:
+        assert name in names
+
+    saves = [e for e in events if e.name == "save.object"]
+    assert len(saves) == 2
+    assert all(e.func == "save_data" for e in saves)
+    assert all(e.bytes_written > 0 and e.files == 1 for e in saves)
+
+    loads = [e for e in events if e.name == "load.object"]
+    assert sum(e.bytes_read for e in loads) == sum(e.bytes_written for e in saves)
+
+    call = [e for e in events if e.name == "track.call"][0]
+    assert call.extra == {"branch": "main", "version": "0.0.0"}
+
+    version = [e for e in events if e.name == "track.version"][0]
+    assert version.cache_hit is False
+
+    assert not enabled()
+
+
+def test_summary_and_json_lines_sinks(tmp_path):
+    summary = SummarySink()
+    trace = tmp_path / "trace" / "trace.jsonl"
+
+    @versioned_auto_save(tmp_path, output_names="values")
+    def compute(at_config=None):
+        return np.ones(4)
+
+    with instrument(summary, JsonLinesSink(trace)):
+        compute(at_config={"a": 1, "at_branch": "b"})
+        compute(at_config={"a": 1, "at_branch": "b"})
+
+    stats = summary.summary()["compute"]
+    assert stats["track.call"]["count"] == 2
+    assert stats["track.branch"]["cache_hits"] == 1
+    assert stats["save.object"]["files"] == 2
+    assert "track.execute" in summary.report()
+
+    lines = [json.loads(line) for line in open(trace)]
+    assert len(lines) == sum(s["count"] for s in stats.values())
+    assert {line["name"] for line in lines} >= {"track.call", "save.object"}
+
+
+def test_failing_sink_does_not_break_tracking(tmp_path):
+    def broken(event):
+        raise RuntimeError("sink failure")
+
+    @versioned_auto_save(tmp_path)
+    def compute():
+        return [1, 2, 3]
+
+    add_sink(broken)
+    try:
+        assert compute() == [1, 2, 3]
+    finally:
+        clear_sinks()
@@ -0,0 +1,123 @@
+from pathlib import Path
+import shutil
+import tempfile
+
+import numpy as np
+import pytest
+
+from auto_track.auto_data import AutoData
+from auto_track.helpers import read_manifest
+from auto_track.pipeline import Pipeline
+from auto_track.track import versioned_auto_save
+
+# steps run in worker processes have to be importable, so they are defined at module
+# level on a registry that is emptied before every test
+ROOT = Path(tempfile.mkdtemp(prefix="auto-track-pipeline-"))
+
+
+@versioned_auto_save(ROOT)
+def raw():
+    return np.arange(10)
+
+
+@versioned_auto_save(ROOT)
+def other_raw():
+    return np.ones(3)
+
+
+@versioned_auto_save(ROOT)
+def features(at_config=None):
+    data = AutoData(ROOT).get_data_from_registry("raw")
+    return data * at_config["scale"]
+
+
+@versioned_auto_save(ROOT)
+def report():
+    feats = AutoData(ROOT).get_data_from_registry("features", "scaled")
+    return {"total": float(feats.sum())}
+
+
+@pytest.fixture
+def pipeline():
+    shutil.rmtree(ROOT, ignore_errors=True)
+    ROOT.mkdir()
+
+    pipeline = Pipeline(max_workers=2)
+    pipeline.add(raw)
+    pipeline.add(other_raw)
+    pipeline.add(features, at_config={"at_branch": "scaled", "scale": 2}, after=["raw"])
+    pipeline.add(report, after=["features"])
+    return pipeline
+
+
+def test_status_assigns_no_branches(pipeline):
+    status = pipeline.status()
+    assert {s.reason for s in status.values()} == {"never run"}
+    assert status["features"].branch is None
+    assert not (ROOT / ".auto-track" / "data_branches.json").exists()
+
+    pipeline.run()
+    assert pipeline.status()["features"].branch == "scaled"
+
+
+def test_lineage_is_recorded(pipeline):
+    pipeline.run()
+
+    manifest = read_manifest(ROOT / "report" / "main" / "0.0.0")
+    assert manifest["lineage"] == [
+        {"dataset": "features", "branch": "scaled", "version": "0.0.0"}
+    ]
+    manifest = read_manifest(ROOT / "features" / "scaled" / "0.0.0")
+    assert manifest["lineage"] == [
+        {"dataset": "raw", "branch": "main", "version": "0.0.0"}
+    ]
+
+
+def test_only_stale_steps_rerun(pipeline):
+    pipeline.run()
+    # from now on report is ordered after features by the lineage of its last run
+    pipeline.steps["report"].after = ()
+    pipeline.run()
+    assert not any(s.stale for s in pipeline.status().values())
+
+    raw()
+    status = pipeline.status("report")
+    assert list(status) == ["raw", "features", "report"]
+    assert not status["raw"].stale
+    assert status["features"].reason == "upstream step raw was written after features"
+    assert status["report"].reason == "upstream step features is stale"
+
+    created = read_manifest(ROOT / "other_raw" / "main" / "0.0.0")["created"]
+    pipeline.run("report")
+    assert not any(s.stale for s in pipeline.status().values())
+    assert read_manifest(ROOT / "other_raw" / "main" / "0.0.0")["created"] == created
+
+
+def test_sequential_run_and_validation(tmp_path):
+    calls = []
+
+    @versioned_auto_save(tmp_path)
+    def first():
+        calls.append("first")
+        return [1]
+
+    @versioned_auto_save(tmp_path)
+    def second():
+        calls.append("second")
+        return AutoData(tmp_path).get_data_from_registry("first")
+
+    pipeline = Pipeline(processes=False)
+    pipeline.add(second, after=["first"])
+    pipeline.add(first)
+    pipeline.run()
+    pipeline.run()
+    assert calls == ["first", "second"]
+
+    with pytest.raises(ValueError):
+        pipeline.add(first)
+    with pytest.raises(ValueError):
+        pipeline.add(lambda: None)
+
+    pipeline.steps["first"].after = ("second",)
+    with pytest.raises(ValueError):
+        pipeline.run()
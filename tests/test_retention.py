@@ -0,0 +1,121 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from auto_track.auto_data import AutoData
+from auto_track.helpers import read_manifest, save_object, write_manifest
+from auto_track.retention import (
+    RetentionPolicy,
+    collect_garbage,
+    scan_versions,
+    tag_version,
+)
+from auto_track.track import get_data_branch
+
+
+def _store(root, dataset, branch, version, created, size=10, function=None):
+    path = root / dataset / branch / version
+    save_object(np.zeros(size, dtype=np.uint8), path / "output")
+    write_manifest(
+        path,
+        {
+            "function": function or dataset,
+            "created": created,
+            "outputs": ["output"],
+            "bytes": size,
+        },
+    )
+    return path
+
+
+def _stored(root):
+    return sorted(f"{v.dataset}/{v.branch}/{v.version}" for v in scan_versions(root))
+
+
+def test_keep_last_dry_run_and_delete(tmp_path):
+    for i in range(5):
+        _store(tmp_path, "data", "main", f"0.0.{i}", created=100 + i)
+    _store(tmp_path, "data", "other", "0.0.0", created=100)
+
+    report = collect_garbage(tmp_path, RetentionPolicy(keep_last=2))
+    assert report.dry_run
+    assert sorted(v.version for v in report.deleted) == ["0.0.0", "0.0.1", "0.0.2"]
+    assert report.bytes_freed == 30
+    assert "Would delete 3 versions" in str(report)
+    assert len(_stored(tmp_path)) == 6
+
+    collect_garbage(tmp_path, RetentionPolicy(keep_last=2), dry_run=False)
+    assert _stored(tmp_path) == [
+        "data/main/0.0.3",
+        "data/main/0.0.4",
+        "data/other/0.0.0",
+    ]
+    assert not any((tmp_path / ".auto-track" / "trash").iterdir())
+
+
+def test_tags_age_and_size(tmp_path):
+    now = time.time()
+    for i in range(4):
+        _store(tmp_path, "data", "main", f"0.0.{i}", created=now - 1000 + i, size=100)
+    tag_version(tmp_path, "data", "main", "0.0.0", "paper")
+    assert read_manifest(tmp_path / "data" / "main" / "0.0.0")["tags"] == ["paper"]
+
+    report = collect_garbage(tmp_path, RetentionPolicy(tagged_only=True))
+    assert sorted(v.version for v in report.deleted) == ["0.0.1", "0.0.2"]
+
+    report = collect_garbage(tmp_path, RetentionPolicy(max_age=500))
+    assert sorted(v.version for v in report.deleted) == ["0.0.1", "0.0.2"]
+
+    report = collect_garbage(tmp_path, RetentionPolicy(max_bytes=250))
+    assert sorted(v.version for v in report.deleted) == ["0.0.1", "0.0.2"]
+
+    report = collect_garbage(tmp_path, RetentionPolicy(max_bytes=350))
+    assert sorted(v.version for v in report.deleted) == ["0.0.1"]
+
+    report = collect_garbage(tmp_path, RetentionPolicy(max_age=0, keep_latest=False))
+    assert sorted(v.version for v in report.deleted) == ["0.0.1", "0.0.2", "0.0.3"]
+
+
+def test_referenced_versions_are_kept(tmp_path):
+    old = _store(tmp_path, "data", "main", "0.0.0", created=1)
+    new = _store(tmp_path, "data", "main", "0.0.1", created=2)
+    _store(tmp_path, "data", "main", "0.0.2", created=3)
+
+    os.symlink(old / "output.npy", new / "shared.npy")
+
+    report = collect_garbage(tmp_path, RetentionPolicy(keep_last=2), dry_run=False)
+    assert report.deleted == []
+    assert [v.reason for v in report.kept if v.version == "0.0.0"] == [
+        "referenced by a kept version"
+    ]
+    assert old.exists()
+
+
+def test_in_progress_versions_are_skipped(tmp_path):
+    _store(tmp_path, "data", "main", "0.0.0", created=1)
+    _store(tmp_path, "data", "main", "0.0.1", created=2)
+    save_object(np.zeros(3), tmp_path / "data" / "main" / "0.0.2" / "output")
+
+    assert _stored(tmp_path) == ["data/main/0.0.0", "data/main/0.0.1"]
+    collect_garbage(tmp_path, RetentionPolicy(keep_last=0), dry_run=False)
+    assert (tmp_path / "data" / "main" / "0.0.2").exists()
+
+
+def test_removed_branches_are_pruned(tmp_path):
+    branch = get_data_branch({"a": 1, "at_branch": "gone"}, tmp_path, "func")
+    kept = get_data_branch({"a": 2, "at_branch": "kept"}, tmp_path, "func")
+    _store(tmp_path, "data", branch, "0.0.0", created=1, function="func")
+    _store(tmp_path, "data", kept, "0.0.0", created=time.time(), function="func")
+
+    policy = RetentionPolicy(max_age=100, keep_latest=False)
+    collect_garbage(tmp_path, policy, dry_run=False)
+
+    assert not (tmp_path / "data" / "gone").exists()
+    db = json.load(open(tmp_path / ".auto-track" / "data_branches.json"))
+    assert [e["branch"] for e in db["func"].values()] == ["kept"]
+
+    # AutoData ignores the trash and works after collection
+    _store(tmp_path, "data", "main", "0.0.0", created=time.time())
+    assert AutoData(tmp_path).get_data_from_registry("data").shape == (10,)
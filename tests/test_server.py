@@ -0,0 +1,144 @@
+import http.client
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from auto_track.auto_data import AutoData
+from auto_track.server import RegistryServer
+from auto_track.storage import HTTPBackend
+from auto_track.track import versioned_auto_save
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "registry"
+
+    @versioned_auto_save(root, output_names=("x", "frame"))
+    def produce(at_config=None):
+        return (
+            np.arange(100_000, dtype=np.int64),
+            pd.DataFrame({"a": [1, 2, 3]}),
+        )
+
+    produce()
+    produce(at_config={"at_branch": "other"})
+    with RegistryServer(root) as server:
+        yield server
+
+
+def _get(server, path, headers=None, method="GET"):
+    host, port = server.server_address[:2]
+    connection = http.client.HTTPConnection(host, port)
+    connection.request(method, path, headers=headers or {})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response, body
+
+
+def test_listing_and_file_serving(server):
+    response, body = _get(server, "/index/")
+    assert json.loads(body) == ["produce"]
+    assert json.loads(_get(server, "/index/produce/")[1]) == ["main", "other"]
+    assert json.loads(_get(server, "/index/produce/main/")[1]) == ["0.0.0"]
+    assert _get(server, "/index/missing/")[0].status == 404
+
+    objects = json.loads(_get(server, "/objects/produce/main/0.0.0/")[1])
+    keys = sorted(o["key"] for o in objects)
+    assert keys == [
+        "produce/main/0.0.0/.manifest.json",
+        "produce/main/0.0.0/frame.csv",
+        "produce/main/0.0.0/x.npy",
+    ]
+
+    path = "/files/produce/main/0.0.0/x.npy"
+    response, body = _get(server, path)
+    assert response.status == 200
+    assert body == (server.root / "produce/main/0.0.0/x.npy").read_bytes()
+    etag = response.headers["ETag"]
+
+    response, part = _get(server, path, {"Range": "bytes=10-19"})
+    assert response.status == 206
+    assert part == body[10:20]
+    assert response.headers["Content-Range"] == f"bytes 10-19/{len(body)}"
+    assert _get(server, path, {"Range": "bytes=-5"})[1] == body[-5:]
+    assert _get(server, path, {"Range": f"bytes={len(body)}-"})[0].status == 416
+
+    response, body = _get(server, path, {"If-None-Match": etag})
+    assert response.status == 304 and body == b""
+    response, body = _get(server, path, method="HEAD")
+    assert response.headers["Content-Length"] == str(len(_get(server, path)[1]))
+
+    # metadata and files outside of manifests are never served
+    for path in (
+        "/files/.auto-track/index.jsonl",
+        "/files/produce/main/0.0.0/../../../.auto-track/index.jsonl",
+        "/files/produce/main/0.0.0/missing.npy",
+    ):
+        assert _get(server, path)[0].status == 404
+
+
+def test_remote_auto_data(server, tmp_path):
+    storage = HTTPBackend(server.url, range_size=64 * 1024, max_connections=4)
+    data = AutoData(tmp_path / "cache", storage=storage)
+
+    x, frame = data.get_data_from_registry("produce", "other")
+    np.testing.assert_array_equal(x, np.arange(100_000))
+    assert frame["a"].tolist() == [1, 2, 3]
+    assert [o.key.rsplit("/", 1)[1] for o in storage.list_objects("produce/ma")] == [
+        "frame.csv",
+        "x.npy",
+        ".manifest.json",
+    ]
+
+    downloads = []
+    get_file = storage.get_file
+    storage.get_file = lambda key, path: downloads.append(key) or get_file(key, path)
+
+    # the cached version is revalidated without downloading it again
+    data.get_data_from_registry("produce", "other")
+    assert downloads == []
+
+    # after a version changed only files with a new checksum are downloaded
+    manifest_path = (
+        tmp_path / "cache" / "produce" / "other" / "0.0.0" / ".manifest.json"
+    )
+    manifest = json.loads(manifest_path.read_text())
+    manifest["files"]["x.npy"]["checksum"] = "outdated"
+    manifest_path.write_text(json.dumps(manifest))
+    data.get_data_from_registry("produce", "other")
+    assert downloads == ["produce/other/0.0.0/x.npy"]
+
+    with pytest.raises(PermissionError):
+        storage.put("produce/x", b"")
+    with pytest.raises(FileNotFoundError):
+        data.get_data_from_registry("missing")
+
+
+def test_remote_chunked_outputs(tmp_path):
+    root = tmp_path / "registry"
+
+    @versioned_auto_save(root, output_names="x", chunk_size=4096)
+    def chunked():
+        return np.arange(10_000, dtype=np.int64)
+
+    chunked()
+    assert (root / "chunked" / "main" / "0.0.0" / "x.chunks").is_file()
+
+    with RegistryServer(root) as server:
+        digest = json.loads((root / "chunked/main/0.0.0/x.chunks").read_text())[
+            "chunks"
+        ][0]
+        response, body = _get(server, f"/chunks/{digest}")
+        assert response.status == 200 and len(body) == 4096
+        assert _get(server, "/chunks/..%2F..%2Findex.jsonl")[0].status == 404
+
+        data = AutoData(tmp_path / "cache", storage=HTTPBackend(server.url))
+        np.testing.assert_array_equal(
+            data.get_data_from_registry("chunked"), np.arange(10_000)
+        )
+        np.testing.assert_array_equal(
+            data.get_data_from_registry("chunked", rows=slice(5, 8)), [5, 6, 7]
+        )
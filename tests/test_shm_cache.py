@@ -0,0 +1,87 @@
+import gc
+import multiprocessing
+
+import numpy as np
+import pytest
+import torch
+
+from auto_track.auto_data import AutoData
+from auto_track.shm_cache import SharedArrayCache
+from auto_track.track import versioned_auto_save
+
+
+def _load_sum(root, directory):
+    cache = SharedArrayCache(budget=10**8, directory=directory)
+    return float(
+        AutoData(root, shared_cache=cache)
+        .get_data_from_registry("emb", outputs="emb")
+        .sum()
+    )
+
+
+@pytest.fixture
+def root(tmp_path):
+    @versioned_auto_save(root=tmp_path / "registry", output_names=("emb", "weights"))
+    def emb():
+        return np.arange(1000, dtype=np.float64).reshape(100, 10), torch.ones(4, 4)
+
+    emb()
+    return tmp_path / "registry"
+
+
+def test_loads_share_segments(root, tmp_path):
+    cache = SharedArrayCache(budget=10**8, directory=tmp_path / "shm")
+    auto_data = AutoData(root, shared_cache=cache)
+
+    emb, weights = auto_data.get_data_from_registry("emb")
+    again = auto_data.get_data_from_registry("emb", outputs="emb")
+
+    assert emb.filename == again.filename
+    assert not emb.flags.writeable
+    assert weights.sum().item() == 16
+    assert cache.stats().segments == 2
+    assert cache.stats().in_use == 2
+
+    np.testing.assert_array_equal(
+        auto_data.get_data_from_registry("emb", outputs="emb", rows=[1]), emb[[1]]
+    )
+
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(2) as pool:
+        sums = pool.starmap(_load_sum, [(root, tmp_path / "shm")] * 2)
+    assert sums == [float(emb.sum())] * 2
+    assert cache.stats().segments == 2
+
+
+def test_eviction_under_budget(root, tmp_path):
+    array_size = (root / "emb" / "main" / "0.0.0" / "emb.npy").stat().st_size
+    cache = SharedArrayCache(budget=array_size + 100, directory=tmp_path / "shm")
+    auto_data = AutoData(root, shared_cache=cache)
+
+    emb = auto_data.get_data_from_registry("emb", outputs="emb")
+    # the tensor does not fit next to the array in use and is loaded privately
+    weights = auto_data.get_data_from_registry("emb", outputs="weights")
+    assert cache.stats().segments == 1
+    assert weights.sum().item() == 16
+
+    del emb
+    gc.collect()
+    assert cache.stats().in_use == 0
+
+    auto_data.get_data_from_registry("emb", outputs="weights")
+    assert cache.stats().segments == 1
+    assert cache.clear() == 1
+
+
+def test_cached_tensors_are_copy_on_write(root, tmp_path):
+    cache = SharedArrayCache(budget=10**8, directory=tmp_path / "shm")
+    auto_data = AutoData(root, shared_cache=cache)
+
+    weights = auto_data.get_data_from_registry("emb", outputs="weights")
+    weights.add_(1)
+    assert weights.sum().item() == 32
+
+    # the in-place operation only changed the private copy of this process
+    again = auto_data.get_data_from_registry("emb", outputs="weights")
+    assert again.sum().item() == 16
+    assert cache.stats().segments == 1
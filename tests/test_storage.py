@@ -0,0 +1,167 @@
+import json
+import os
+import socket
+
+import numpy as np
+import pytest
+
+from auto_track.auto_data import AutoData
+from auto_track.index import MANIFEST_NAME
+from auto_track.storage import (
+    LocalBackend,
+    S3Backend,
+    StorageBackend,
+    fetch_version,
+    upload_version,
+)
+from auto_track.track import versioned_auto_save
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    pytest.importorskip("boto3")
+    server = pytest.importorskip("moto.server")
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+    moto = server.ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    moto.start()
+    yield f"http://127.0.0.1:{port}"
+    moto.stop()
+
+
+@pytest.fixture
+def s3(s3_endpoint, request):
+    bucket = request.node.originalname.replace("_", "-")
+    storage = S3Backend(
+        bucket,
+        prefix="registry",
+        endpoint_url=s3_endpoint,
+        multipart_threshold=5 * 1024 * 1024,
+        multipart_chunksize=5 * 1024 * 1024,
+    )
+    storage.client.create_bucket(Bucket=bucket)
+    return storage
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        return LocalBackend(tmp_path / "remote")
+    return request.getfixturevalue("s3")
+
+
+def test_backend_operations(storage):
+    storage.put("ds/main/0.0.0/a.json", b"[1, 2, 3]")
+    storage.put("ds/main/0.0.1/a.json", b"[4]")
+    storage.put("ds/other/0.0.0/a.json", b"{}")
+
+    assert storage.get("ds/main/0.0.0/a.json") == b"[1, 2, 3]"
+    assert storage.get_range("ds/main/0.0.0/a.json", 1, 5) == b"1, 2"
+    assert storage.get_range("ds/main/0.0.0/a.json", 4, None) == b"2, 3]"
+    assert storage.get_ranges("ds/main/0.0.0/a.json", [(0, 1), (7, 9)]) == [
+        b"[",
+        b"3]",
+    ]
+    assert storage.stat("ds/main/0.0.0/a.json").size == 9
+    assert [i.key for i in storage.list_objects("ds/main/")] == [
+        "ds/main/0.0.0/a.json",
+        "ds/main/0.0.1/a.json",
+    ]
+    assert storage.list_dirs("ds/") == ["main", "other"]
+    assert storage.list_dirs("ds/main/") == ["0.0.0", "0.0.1"]
+
+    storage.delete("ds/other/0.0.0/a.json")
+    assert not storage.exists("ds/other/0.0.0/a.json")
+    with pytest.raises(FileNotFoundError):
+        storage.stat("ds/other/0.0.0/a.json")
+    with pytest.raises(FileNotFoundError):
+        storage.get("ds/other/0.0.0/a.json")
+
+
+def test_incomplete_backend():
+    class ReadOnlyBackend(StorageBackend):
+        def get_range(self, key, start, end):
+            return b""
+
+    with pytest.raises(TypeError, match="list_dirs"):
+        ReadOnlyBackend()
+
+
+def test_multipart_upload(s3, tmp_path):
+    data = np.random.default_rng(0).bytes(11 * 1024 * 1024)
+    (tmp_path / "large.bin").write_bytes(data)
+
+    s3.put_file("large.bin", tmp_path / "large.bin")
+
+    # multipart uploads have etags of the form "<digest>-<number of parts>"
+    assert s3.stat("large.bin").etag.endswith("-3")
+    s3.get_file("large.bin", tmp_path / "downloaded.bin")
+    assert (tmp_path / "downloaded.bin").read_bytes() == data
+    start = 6 * 1024 * 1024
+    assert s3.get_range("large.bin", start, start + 10) == data[start : start + 10]
+
+
+def test_registry_roundtrip(storage, tmp_path):
+    writer_root = tmp_path / "writer"
+
+    @versioned_auto_save(root=writer_root, output_names=("x", "y"), storage=storage)
+    def shared():
+        return np.arange(5), {"a": 1}
+
+    shared()
+    assert storage.exists(f"shared/main/0.0.0/{MANIFEST_NAME}")
+
+    cache_root = tmp_path / "cache"
+    x, y = AutoData(cache_root, storage=storage).get_data_from_registry("shared")
+    np.testing.assert_array_equal(x, np.arange(5))
+    assert y == {"a": 1}
+    assert (cache_root / "shared" / "main" / "0.0.0" / "x.npy").is_file()
+
+
+def test_fetch_uses_cache(tmp_path):
+    root = tmp_path / "root"
+    (root / "ds" / "main" / "0.0.0").mkdir(parents=True)
+    (root / "ds" / "main" / "0.0.0" / "out.json").write_text("[1]")
+    storage = LocalBackend(tmp_path / "remote")
+    upload_version(root, storage, "ds", "main", "0.0.0")
+
+    cache_root = tmp_path / "cache"
+    path = fetch_version(storage, cache_root, "ds", "main", "0.0.0")
+    assert (path / "out.json").read_text() == "[1]"
+
+    # versions without manifest are fetched again, versions with one only if the
+    # remote manifest changed
+    storage.put("ds/main/0.0.0/out.json", b"[2]")
+    fetch_version(storage, cache_root, "ds", "main", "0.0.0")
+    assert (path / "out.json").read_text() == "[2]"
+
+    storage.put(f"ds/main/0.0.0/{MANIFEST_NAME}", b'{"files": {"out.json": {}}}')
+    fetch_version(storage, cache_root, "ds", "main", "0.0.0")
+    storage.put("ds/main/0.0.0/out.json", b"[3]")
+    fetch_version(storage, cache_root, "ds", "main", "0.0.0")
+    assert (path / "out.json").read_text() == "[2]"
+
+
+def test_fetch_removes_stale_files(tmp_path):
+    storage = LocalBackend(tmp_path / "remote")
+    manifest = {"files": {"a.json": {"checksum": "1"}, "b.json": {"checksum": "2"}}}
+    storage.put("ds/main/0.0.0/a.json", b"[1]")
+    storage.put("ds/main/0.0.0/b.json", b"[2]")
+    storage.put(f"ds/main/0.0.0/{MANIFEST_NAME}", json.dumps(manifest).encode())
+
+    cache_root = tmp_path / "cache"
+    path = fetch_version(storage, cache_root, "ds", "main", "0.0.0")
+    assert sorted(p.name for p in path.iterdir()) == [MANIFEST_NAME, "a.json", "b.json"]
+
+    # the version was written again without b.json
+    del manifest["files"]["b.json"]
+    storage.put(f"ds/main/0.0.0/{MANIFEST_NAME}", json.dumps(manifest).encode())
+    fetch_version(storage, cache_root, "ds", "main", "0.0.0")
+    assert sorted(p.name for p in path.iterdir()) == [MANIFEST_NAME, "a.json"]
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+from torch.utils.data import DataLoader
+
+from auto_track.torch_data import RegistryDataset, RegistryIterableDataset
+from auto_track.track import versioned_auto_save
+
+
+@pytest.fixture
+def root(tmp_path):
+    @versioned_auto_save(root=tmp_path, output_names=("x", "y", "frame", "parts"))
+    def samples():
+        return (
+            np.arange(20, dtype=np.float32).reshape(10, 2),
+            torch.arange(10),
+            pd.DataFrame({"a": range(10), "b": [f"s{i}" for i in range(10)]}),
+            [np.full(3, i) for i in range(10)],
+        )
+
+    samples()
+    return tmp_path
+
+
+def test_map_dataset(root):
+    dataset = RegistryDataset(root, "samples")
+
+    assert len(dataset) == 10
+    x, y, row, part = dataset[3]
+    np.testing.assert_array_equal(x, [6, 7])
+    assert y.item() == 3
+    assert row == {"a": 3, "b": "s3"}
+    np.testing.assert_array_equal(part, [3, 3, 3])
+    with pytest.raises(IndexError):
+        dataset[10]
+
+
+def test_map_dataset_with_workers(root):
+    loader = DataLoader(
+        RegistryDataset(root, "samples"), batch_size=4, num_workers=2, shuffle=True
+    )
+    ys = torch.cat([batch[1] for batch in loader])
+    assert sorted(ys.tolist()) == list(range(10))
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_iterable_dataset(root, prefetch):
+    dataset = RegistryIterableDataset(root, "samples", shard_size=3, prefetch=prefetch)
+
+    items = list(dataset)
+    assert [int(y) for _, y, _, _ in items] == list(range(10))
+    assert items[9][2] == {"a": 9, "b": "s9"}
+
+
+def test_iterable_dataset_sharding(root):
+    seen = []
+    for rank in range(2):
+        dataset = RegistryIterableDataset(
+            root, "samples", shard_size=2, shuffle=True, rank=rank, world_size=2
+        )
+        loader = DataLoader(dataset, batch_size=None, num_workers=2)
+        seen += [int(y) for _, y, _, _ in loader]
+
+    assert sorted(seen) == list(range(10))
+
+
+def test_iterable_dataset_stops_prefetching(root):
+    dataset = RegistryIterableDataset(root, "samples", shard_size=1, prefetch=1)
+
+    for i, _ in enumerate(dataset):
+        if i == 2:
+            break
+    # iterating again works after the prefetch thread was stopped
+    assert len(list(dataset)) == 10
+
+
+def test_appended_outputs(tmp_path):
+    @versioned_auto_save(root=tmp_path, output_names="x", append=True)
+    def grow(step):
+        return np.full((3, 2), step)
+
+    for step in range(3):
+        grow(step)
+
+    dataset = RegistryDataset(tmp_path, "grow")
+    assert len(dataset) == 9
+    assert dataset[4].tolist() == [1, 1]
+    items = [int(x[0]) for x in RegistryIterableDataset(tmp_path, "grow")]
+    assert items == [0, 0, 0, 1, 1, 1, 2, 2, 2]
+
+
+def test_sparse_outputs(tmp_path):
+    sparse = pytest.importorskip("scipy.sparse")
+    matrix = sparse.random(10, 4, density=0.3, format="csr", random_state=0)
+
+    @versioned_auto_save(root=tmp_path, output_names="counts")
+    def counts():
+        return matrix
+
+    counts()
+    dense = matrix.toarray()
+    np.testing.assert_array_equal(RegistryDataset(tmp_path, "counts")[7], dense[7])
+    rows = list(RegistryIterableDataset(tmp_path, "counts", shard_size=3))
+    np.testing.assert_array_equal(np.stack(rows), dense)
@@ -1,6 +1,12 @@
 import os
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+import pytest
+
+from auto_track.auto_data import AutoData
+from auto_track.helpers import read_manifest
 from auto_track.track import versioned_auto_save, get_output_path
 
 
@@ -32,3 +38,105 @@ def test_multiple_outputs(tmpdir):
 def test_get_output_path(tmpdir):
     path = get_output_path("test_func", tmpdir)
     assert path == tmpdir / "test_func"
+
+
+def test_input_fingerprinting(tmp_path):
+    calls = []
+
+    @versioned_auto_save(root=tmp_path, fingerprint_inputs=True, skip_existing=True)
+    def scale(values, factor=2):
+        calls.append(factor)
+        return values * factor, {"factor": factor}
+
+    first = np.arange(5)
+    second = np.arange(5) + 10
+
+    out_first = scale(first)
+    out_second = scale(second)
+    assert len(calls) == 2
+
+    branches = sorted(p.name for p in (tmp_path / "scale").iterdir())
+    assert len(branches) == 2
+    assert all(b.startswith("main-") for b in branches)
+
+    manifest = read_manifest(tmp_path / "scale" / branches[0] / "0.0.0")
+    assert manifest["outputs"] == ["output_0", "output_1"]
+    assert len(manifest["inputs"]) == 32
+
+    reloaded = scale(first.copy())
+    assert len(calls) == 2
+    assert np.array_equal(reloaded[0], out_first[0])
+    assert reloaded[1] == out_first[1]
+
+    scale(second, factor=3)
+    assert len(calls) == 3
+    assert len(list((tmp_path / "scale").iterdir())) == 3
+    assert np.array_equal(out_second[0], second * 2)
+
+    # arguments modified in place are fingerprinted again
+    first[0] = 1
+    modified = scale(first)
+    assert len(calls) == 4
+    assert np.array_equal(modified[0], first * 2)
+
+
+def test_output_order_is_preserved(tmp_path):
+    @versioned_auto_save(root=tmp_path, output_names=("zeta", "alpha"))
+    def ordered():
+        return [1], [2]
+
+    ordered()
+    data = AutoData(tmp_path).get_data_from_registry("ordered")
+    assert data == ([1], [2])
+
+
+def test_append_mode(tmp_path):
+    @versioned_auto_save(
+        root=tmp_path, output_names=("embeddings", "metrics", "log"), append=True
+    )
+    def grow(step):
+        embeddings = np.full((2, 3), step, dtype=np.float32)
+        metrics = pd.DataFrame({"step": [step], "loss": [1.0 / (step + 1)]})
+        return embeddings, metrics, [{"step": step}]
+
+    for step in range(3):
+        grow(step)
+
+    path = tmp_path / "grow" / "main" / "0.0.0"
+    assert len(list((path / "embeddings.parts").iterdir())) == 3
+    assert len(read_manifest(path)["files"]) == 9
+
+    auto_data = AutoData(tmp_path)
+    embeddings, metrics, log = auto_data.get_data_from_registry("grow")
+    assert embeddings.shape == (6, 3)
+    np.testing.assert_array_equal(embeddings[:, 0], [0, 0, 1, 1, 2, 2])
+    assert list(metrics["step"]) == [0, 1, 2]
+    assert log == [{"step": 0}, {"step": 1}, {"step": 2}]
+
+    window = auto_data.get_data_from_registry(
+        "grow", outputs="embeddings", rows=slice(3, 5)
+    )
+    np.testing.assert_array_equal(window[:, 0], [1, 2])
+
+
+def test_append_mode_rejects_incompatible_outputs(tmp_path):
+    @versioned_auto_save(root=tmp_path, output_names="values", append=True)
+    def values(n):
+        return np.zeros((1, n))
+
+    values(2)
+    with pytest.raises(ValueError):
+        values(3)
+
+
+def test_failed_calls_record_nothing(tmp_path):
+    @versioned_auto_save(root=tmp_path)
+    def failing(at_config=None):
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError):
+        failing(at_config={"lr": 0.1, "at_branch": "small"})
+
+    assert not (tmp_path / "failing").exists()
+    assert not (tmp_path / ".auto-track" / "function_versions.json").exists()
+    assert not (tmp_path / ".auto-track" / "data_branches.json").exists()
@@ -0,0 +1,116 @@
+import threading
+
+import numpy as np
+import pytest
+
+from auto_track.auto_data import AutoData
+from auto_track.index import RegistryIndex, compact_index
+from auto_track.track import versioned_auto_save
+from auto_track.watch import RegistryWatcher
+
+
+@pytest.fixture
+def produce(tmp_path):
+    @versioned_auto_save(tmp_path, output_names="x")
+    def produce(at_config=None):
+        return np.arange(3)
+
+    produce()
+    return produce
+
+
+def test_registry_index_refresh(tmp_path, produce):
+    index = RegistryIndex(tmp_path)
+    assert [op for op, _ in index.refresh()] == ["add"]
+    assert index.refresh() == []
+
+    produce(at_config={"at_branch": "other"})
+    changes = index.refresh()
+    assert [(op, r["branch"]) for op, r in changes] == [("add", "other")]
+
+    # a rewritten journal is replayed and compared with the known versions
+    compact_index(tmp_path)
+    assert index.refresh() == []
+    assert set(index.versions) == {
+        ("produce", "main", "0.0.0"),
+        ("produce", "other", "0.0.0"),
+    }
+
+
+def test_unindexed_versions_are_listed(tmp_path, produce):
+    # a version written without an index record, e.g. before the journal existed
+    unindexed = tmp_path / "produce" / "legacy" / "0.0.0"
+    unindexed.mkdir(parents=True)
+    np.save(unindexed / "x.npy", np.arange(2))
+
+    data = AutoData(tmp_path)
+    np.testing.assert_array_equal(data.get_data_from_registry("produce"), np.arange(3))
+    np.testing.assert_array_equal(
+        data.get_data_from_registry("produce", "legacy"), np.arange(2)
+    )
+
+
+def test_versions_are_resolved_from_the_index(tmp_path, produce):
+    # a version that is still being written has no index record yet
+    (tmp_path / "produce" / "main" / "0.0.1").mkdir()
+
+    data = AutoData(tmp_path)
+    assert data.get_version_path("produce").name == "0.0.0"
+    with pytest.raises(FileNotFoundError):
+        data.get_version_path("produce", "missing")
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher_reports_new_versions(tmp_path, produce, use_inotify):
+    watcher = RegistryWatcher(tmp_path, poll_interval=0.05, use_inotify=use_inotify)
+    assert watcher.poll() == []
+
+    produce(at_config={"at_branch": "new"})
+    events = watcher.wait(timeout=5)
+    assert [(e.kind, e.branch) for e in events] == [
+        ("branch", "new"),
+        ("version", "new"),
+    ]
+
+    produce()
+    assert [e.kind for e in watcher.wait(timeout=5)] == ["update"]
+    assert watcher.wait(timeout=0.1) == []
+    watcher.close()
+
+
+def test_subscribe(tmp_path, produce):
+    received = []
+    done = threading.Event()
+
+    def callback(event):
+        received.append(event)
+        done.set()
+
+    with RegistryWatcher(tmp_path, datasets=["other"], poll_interval=0.05) as watcher:
+        watcher.subscribe(callback)
+
+        @versioned_auto_save(tmp_path)
+        def other():
+            return [1]
+
+        produce(at_config={"at_branch": "ignored"})
+        other()
+        assert done.wait(timeout=5)
+
+    assert [(e.kind, e.dataset) for e in received] == [
+        ("branch", "other"),
+        ("version", "other"),
+    ]
+
+
+def test_auto_data_lists_incrementally(tmp_path, produce):
+    data = AutoData(tmp_path)
+    assert data._list_versions("produce", {"main"}) == {"main": ["0.0.0"]}
+    offset = data.index.offset
+
+    produce(at_config={"at_branch": "b"})
+    assert data._list_versions("produce", {"main", "b"}) == {
+        "main": ["0.0.0"],
+        "b": ["0.0.0"],
+    }
+    assert data.index.offset > offset